@@ -0,0 +1,111 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare the per bar cost of the :class:`~monkq.assets.account.FutureAccount`
+unrealised pnl and position margin computed from all the positions on every
+query with the running totals kept by the account.
+
+Every bar moves the price of a part of the instruments and queries the
+available balance a few times, as the statistic and the margins of the
+cross positions do.
+
+Run it from the repository root with ``python -m benchmarks.bench_account``.
+"""
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from monkq.assets.account import FutureAccount
+from monkq.assets.instrument import FutureInstrument
+from monkq.assets.order import FutureLimitOrder
+from monkq.assets.positions import FuturePosition
+from monkq.assets.trade import Trade
+from monkq.utils.id import gen_unique_id
+
+BARS = 500
+QUERIES = 5
+
+
+class StubExchange():
+    def __init__(self, running: bool) -> None:
+        self.running = running
+        self.bar = 0
+        self.prices: Dict[str, float] = {}
+
+    def last_price(self, instrument: Any) -> float:
+        return self.prices[instrument.symbol]
+
+    def price_version(self) -> Optional[int]:
+        return self.bar if self.running else None
+
+    def orders_version(self) -> Optional[int]:
+        return 0 if self.running else None
+
+    def get_open_orders(self, account: Any) -> List[Any]:
+        return []
+
+    def positions_changed(self, account: Any) -> None:
+        pass
+
+
+def run(running: bool, positions: int, moved: float) -> float:
+    random.seed(0)
+    exchange = StubExchange(running)
+    account = FutureAccount(exchange=exchange, position_cls=FuturePosition,  # type:ignore
+                            wallet_balance=10 ** 9)
+    instruments = [FutureInstrument(exchange=exchange, symbol=str(i), taker_fee=0.00075,  # type:ignore
+                                    init_margin_rate=0.01, maint_margin_rate=0.005)
+                   for i in range(positions)]
+    for instrument in instruments:
+        exchange.prices[instrument.symbol] = 100.
+        quantity = random.choice((-1, 1)) * random.randint(1, 100)
+        order = FutureLimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument,
+                                 quantity=quantity, price=100.)
+        account.deal(Trade(order=order, exec_price=100., exec_quantity=quantity, trade_id=gen_unique_id()))
+
+    elapsed = 0.
+    for bar in range(BARS):
+        for instrument in random.sample(instruments, int(positions * moved)):
+            exchange.prices[instrument.symbol] = 100. + random.uniform(-5, 5)
+        exchange.bar = bar
+        start = time.perf_counter()
+        for _ in range(QUERIES):
+            account.available_balance
+        elapsed += time.perf_counter() - start
+    return elapsed / BARS
+
+
+def main() -> None:
+    print("{:>9} {:>6} {:>18} {:>16} {:>10}".format(
+        "positions", "moved", "recompute(us/bar)", "running(us/bar)", "speedup"))
+    for positions in (10, 100, 1000):
+        for moved in (0.1, 1.):
+            recompute = run(False, positions, moved)
+            running = run(True, positions, moved)
+            print("{:>9} {:>6.0%} {:>18.1f} {:>16.1f} {:>9.1f}x".format(
+                positions, moved, recompute * 1e6, running * 1e6, recompute / running))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare splitting a day of trades by symbol with a boolean mask for every
+symbol and with :func:`monkq.exchange.bitmex.data.utils.classify_df`.
+
+Run it from the repository root with ``python -m benchmarks.bench_classify``.
+"""
+import time
+from typing import Any, Callable, Dict, Tuple
+
+import numpy
+import pandas
+from monkq.exchange.bitmex.data.utils import classify_df
+
+ROWS = 2000000
+SYMBOLS = 150
+
+
+def classify_by_masks(df: pandas.DataFrame, column: str) -> Dict[Any, pandas.DataFrame]:
+    """
+    The `classify_df` before, a full scan of the frame for every symbol.
+    """
+    out = {}
+    for one in df[column].unique():
+        new = df[df[column] == one]
+        del new[column]
+        out[one] = new
+    return out
+
+
+def timeit(func: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    rng = numpy.random.RandomState(0)
+    symbols = numpy.array(['SYM{}'.format(i) for i in range(SYMBOLS)], dtype=object)
+    # a few symbols have most of the trades like on bitmex
+    weights = 1 / numpy.arange(1, SYMBOLS + 1)
+    index = pandas.date_range('2018-12-05', periods=ROWS, freq='40ms', tz='utc')
+    df = pandas.DataFrame({
+        'symbol': symbols[rng.choice(SYMBOLS, ROWS, p=weights / weights.sum())],
+        'side': rng.randint(1, 3, ROWS).astype(numpy.float64),
+        'size': rng.randint(1, 10000, ROWS).astype(numpy.float64),
+        'price': rng.uniform(3000, 4000, ROWS),
+        'tickDirection': rng.randint(1, 5, ROWS).astype(numpy.float64),
+        'grossValue': rng.uniform(0, 10 ** 8, ROWS),
+        'homeNotional': rng.uniform(0, 1, ROWS),
+        'foreignNotional': rng.uniform(0, 10000, ROWS),
+    }, index=index)
+    df.index.name = 'timestamp'
+
+    before, before_time = timeit(lambda: classify_by_masks(df, 'symbol'))
+    after, after_time = timeit(lambda: classify_df(df, 'symbol'))
+    assert list(before) == list(after)
+    for symbol in before:
+        pandas.testing.assert_frame_equal(before[symbol], after[symbol])
+    print("{} rows, {} symbols".format(ROWS, SYMBOLS))
+    print("masks:       {:.3f}s".format(before_time))
+    print("classify_df: {:.3f}s".format(after_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare the memory and the pickling time of the trades kept as
+:class:`~monkq.assets.trade.Trade` objects and in a
+:class:`~monkq.journal.TradeJournal`.
+
+Run it from the repository root with ``python -m benchmarks.bench_journal``.
+"""
+import pickle
+import time
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+
+from monkq.assets.instrument import Instrument
+from monkq.assets.order import LimitOrder
+from monkq.assets.trade import Trade
+from monkq.journal import TradeJournal
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import utc_datetime
+
+TRADES = 200000
+
+
+class StubAccount():
+    pass
+
+
+def make_trades(count: int) -> List[Trade]:
+    instruments = [Instrument(exchange=None, symbol='SYM{}'.format(i), taker_fee=0.00075) for i in range(10)]
+    account = StubAccount()
+    now = utc_datetime(2018, 1, 1)
+    trades = []
+    for i in range(count):
+        order = LimitOrder(account=account, order_id=gen_unique_id(), instrument=instruments[i % 10],
+                           quantity=1, price=100)
+        trade = Trade(order, 100, 1, gen_unique_id(), now)
+        order.trades.append(trade)
+        trades.append(trade)
+    return trades
+
+
+def measure(build: Callable[[], Any]) -> Tuple[Any, int]:
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def journal_of(trades: List[Trade]) -> TradeJournal:
+    journal = TradeJournal()
+    for trade in trades:
+        journal.append(trade, 0)
+    return journal
+
+
+def timeit(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    trades, objects_size = measure(lambda: make_trades(TRADES))
+    journal, journal_size = measure(lambda: journal_of(trades))
+    objects_time = timeit(lambda: pickle.dumps(trades, pickle.HIGHEST_PROTOCOL))
+    journal_time = timeit(lambda: pickle.dumps(journal, pickle.HIGHEST_PROTOCOL))
+    print("{} trades".format(TRADES))
+    print("{:>10} {:>14} {:>12}".format("", "bytes/trade", "pickle(s)"))
+    print("{:>10} {:>14.0f} {:>12.4f}".format("objects", objects_size / TRADES, objects_time))
+    print("{:>10} {:>14.0f} {:>12.4f}".format("journal", journal_size / TRADES, journal_time))
+
+
+if __name__ == '__main__':
+    main()
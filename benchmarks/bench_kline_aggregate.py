@@ -0,0 +1,102 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare making the 1 minute klines from chunks of trades by concatenating
+the trades of the unfinished day to the next chunk and resampling them with
+:func:`monkq.exchange.bitmex.data.utils.trades_to_1m_kline`, and with the
+streaming :class:`monkq.exchange.bitmex.data.utils.KlineAggregator`.
+
+Run it from the repository root with ``python -m benchmarks.bench_kline_aggregate``.
+"""
+import time
+from typing import Any, Callable, Iterator, List, Tuple
+
+import numpy
+import pandas
+from monkq.exchange.bitmex.data.utils import (
+    KlineAggregator, trades_to_1m_kline,
+)
+
+ROWS = 10000000
+DAYS = 60
+CHUNK_SIZE = 1000000
+
+
+def chunks(df: pandas.DataFrame) -> Iterator[pandas.DataFrame]:
+    for start in range(0, len(df), CHUNK_SIZE):
+        yield df.iloc[start:start + CHUNK_SIZE]
+
+
+def resample_chunks(df: pandas.DataFrame) -> List[pandas.DataFrame]:
+    """
+    `BitMexKlineTransform` before, the trades after the last midnight of a
+    chunk wait in a cache for the next chunk.
+    """
+    out = []
+    cache = None
+    for chunk in chunks(df):
+        last_date = chunk.index[-1].floor('D')
+        process = chunk.loc[chunk.index < last_date]
+        if cache is not None:
+            process = pandas.concat([cache, process], copy=False)
+        if len(process):
+            out.append(trades_to_1m_kline(process))
+        cache = chunk.loc[chunk.index >= last_date]
+    out.append(trades_to_1m_kline(cache))
+    return out
+
+
+def aggregate_chunks(df: pandas.DataFrame) -> List[pandas.DataFrame]:
+    aggregator = KlineAggregator()
+    out = [aggregator.update(chunk) for chunk in chunks(df)]
+    out.append(aggregator.close())
+    return out
+
+
+def timeit(func: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    rng = numpy.random.RandomState(0)
+    start = pandas.Timestamp('2018-12-05').value
+    timestamps = numpy.sort(rng.randint(0, DAYS * 24 * 3600 * 1000, ROWS)) * 10 ** 6 + start
+    df = pandas.DataFrame({
+        'price': rng.uniform(3000, 4000, ROWS),
+        'homeNotional': rng.uniform(0, 1, ROWS),
+        'foreignNotional': rng.uniform(0, 10000, ROWS),
+    }, index=pandas.DatetimeIndex(timestamps).tz_localize('utc'))
+
+    before, before_time = timeit(lambda: resample_chunks(df))
+    after, after_time = timeit(lambda: aggregate_chunks(df))
+    pandas.testing.assert_frame_equal(pandas.concat(before), pandas.concat(after), check_names=False)
+    print("{} trades in {} days, chunks of {}".format(ROWS, DAYS, CHUNK_SIZE))
+    print("concat and resample: {:.3f}s".format(before_time))
+    print("KlineAggregator:     {:.3f}s".format(after_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare the cost of opening a kline table from ``kline.hdf`` with
+:class:`~monkq.klinearray.LazyKlineArrayStore` and from the memory mapped
+arrays with :class:`~monkq.klinearray.MemmapKlineStore`.
+
+Run it from the repository root with ``python -m benchmarks.bench_kline_store``.
+"""
+import os
+import tempfile
+import time
+import warnings
+from typing import Callable
+
+import numpy
+import pandas
+from monkq.klinearray import (
+    KLINE_COLUMNS, LazyKlineArrayStore, MemmapKlineStore, convert_kline_hdf,
+)
+
+MINUTES_PER_YEAR = 365 * 24 * 60
+
+
+def write_kline_hdf(path: str, years: int) -> None:
+    length = MINUTES_PER_YEAR * years
+    frame = pandas.DataFrame(numpy.random.uniform(1, 1000, size=(length, len(KLINE_COLUMNS))),
+                             columns=KLINE_COLUMNS,
+                             index=pandas.date_range(start='2016-01-01', periods=length, freq='T', tz='UTC'))
+    frame.to_hdf(path, 'XBTUSD', mode='w', complib='blosc:blosclz', complevel=9, format='table')
+
+
+def timeit(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    print("{:>6} {:>12} {:>12} {:>10}".format("years", "hdf(s)", "memmap(s)", "speedup"))
+    with tempfile.TemporaryDirectory() as tem_dir, warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        hdf_path = os.path.join(tem_dir, 'kline.hdf')
+        mmap_dir = os.path.join(tem_dir, 'kline_mmap')
+        for years in (1, 3):
+            write_kline_hdf(hdf_path, years)
+            convert_kline_hdf(hdf_path, mmap_dir)
+            old = timeit(lambda: LazyKlineArrayStore(hdf_path).get_array('XBTUSD'))
+            new = timeit(lambda: MemmapKlineStore(mmap_dir).get_array('XBTUSD'))
+            print("{:>6} {:>12.4f} {:>12.4f} {:>9.0f}x".format(years, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main()
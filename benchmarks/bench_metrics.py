@@ -0,0 +1,68 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Time the performance summary of a ten year equity curve collected every
+minute.
+
+Run it from the repository root with ``python -m benchmarks.bench_metrics``.
+"""
+import time
+
+import numpy
+import pandas
+from monkq.analyse import metrics
+
+YEARS = 10
+TRADES = 100000
+SYMBOLS = 50
+
+
+def main() -> None:
+    rng = numpy.random.RandomState(0)
+    index = pandas.date_range('2010-01-01', periods=YEARS * 365 * 24 * 60, freq='1min', tz='utc')
+    capital = pandas.Series(10000 * numpy.exp(numpy.cumsum(rng.normal(0, 1e-4, len(index)))), index=index)
+    trades = pandas.DataFrame({
+        'trade_datetime': index[numpy.sort(rng.randint(0, len(index), TRADES))],
+        'symbol': numpy.array(['SYM{}'.format(i) for i in range(SYMBOLS)])[rng.randint(0, SYMBOLS, TRADES)],
+        'exec_quantity': rng.choice([-1., 1.], TRADES),
+        'exec_price': rng.uniform(90, 110, TRADES),
+    })
+
+    start = time.perf_counter()
+    summary = metrics.summary(capital, trades)
+    summary_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rets = metrics.returns(capital)
+    metrics.rolling_sharpe_ratio(rets, '30D', 365 * 24 * 60)
+    rolling_time = time.perf_counter() - start
+
+    print("{} minutes, {} trades".format(len(capital), TRADES))
+    print(summary.to_string())
+    print("summary: {:.4f}s".format(summary_time))
+    print("30D rolling sharpe ratio: {:.4f}s".format(rolling_time))
+
+
+if __name__ == '__main__':
+    main()
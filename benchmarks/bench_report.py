@@ -0,0 +1,98 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare opening a report and reading the prices of its trades for the
+pickled, the HDF and the parquet reports.
+
+Run it from the repository root with ``python -m benchmarks.bench_report``.
+The parquet report needs pyarrow.
+"""
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Callable, Tuple
+
+import numpy
+from monkq.config import Setting
+from monkq.journal import TradeJournal
+from monkq.report import load_report, report_writer
+
+from .bench_journal import journal_of, make_trades
+
+CHUNK = 100000
+CHUNKS = 20
+
+
+def timeit(func: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def write_pickle(path: str, chunk: TradeJournal) -> None:
+    journal = TradeJournal()
+    journal.__setstate__({'rows': numpy.concatenate([chunk.rows] * CHUNKS), 'strings': chunk.strings})
+    with open(path, 'wb') as f:
+        pickle.dump({'daily_capital': [], 'orders': [], 'trades': journal, 'settings': Setting()}, f)
+
+
+def write_stream(path: str, chunk: TradeJournal) -> None:
+    writer = report_writer(path)
+    writer.write_settings(Setting())
+    df = chunk.to_frame()
+    for i in range(CHUNKS):
+        writer.append('trades', df)
+
+
+def size_of(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, dirs, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def main() -> None:
+    chunk = journal_of(make_trades(CHUNK))
+    print("{} trades".format(CHUNK * CHUNKS))
+    print("{:>10} {:>10} {:>10} {:>12} {:>12}".format("", "MB", "open(s)", "prices(s)", "all(s)"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, ext, write in (('pickle', '.pkl', write_pickle), ('hdf', '.hdf', write_stream),
+                                 ('parquet', '.parquet', write_stream)):
+            path = os.path.join(tmp, 'result' + ext)
+            try:
+                write(path, chunk)
+            except ImportError as e:
+                print("{:>10} {}".format(name, e))
+                continue
+            report, open_time = timeit(lambda: load_report(path))
+            prices, prices_time = timeit(lambda: report.trades(['exec_price']))
+            trades, all_time = timeit(lambda: report.trades())
+            assert len(prices) == len(trades) == CHUNK * CHUNKS
+            print("{:>10} {:>10.1f} {:>10.4f} {:>12.4f} {:>12.4f}".format(
+                name, size_of(path) / 2 ** 20, open_time, prices_time, all_time))
+
+
+if __name__ == '__main__':
+    main()
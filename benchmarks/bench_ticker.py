@@ -0,0 +1,73 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare the cost of the backtest outer loop driven by
+:class:`~monkq.ticker.FrequencyTicker` and :class:`~monkq.ticker.BarClock`.
+
+Run it from the repository root with ``python -m benchmarks.bench_ticker``.
+"""
+import time
+import warnings
+from typing import Callable
+
+from dateutil.relativedelta import relativedelta
+from monkq.config import Setting
+from monkq.context import Context
+from monkq.ticker import BarClock, FrequencyTicker
+from monkq.utils.timefunc import utc_datetime
+
+START = utc_datetime(2018, 1, 1)
+
+
+def frequency_ticker_loop(context: Context, months: int) -> None:
+    ticker = FrequencyTicker(START, START + relativedelta(months=months), '1m')
+    for current_time in ticker.timer():
+        context.now = current_time
+
+
+def bar_clock_loop(context: Context, months: int) -> None:
+    ticker = BarClock(START, START + relativedelta(months=months), '1m')
+    for current_ns in ticker.timer_ns():
+        context.now_ns = current_ns
+
+
+def timeit(func: Callable[[Context, int], None], context: Context, months: int) -> float:
+    start = time.perf_counter()
+    func(context, months)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        context = Context(Setting())
+    print("{:>8} {:>18} {:>12} {:>8}".format("months", "FrequencyTicker(s)", "BarClock(s)", "speedup"))
+    for months in (1, 6, 12):
+        old = timeit(frequency_ticker_loop, context, months)
+        new = timeit(bar_clock_loop, context, months)
+        print("{:>8} {:>18.3f} {:>12.3f} {:>7.1f}x".format(months, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main()
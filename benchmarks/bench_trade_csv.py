@@ -0,0 +1,116 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare parsing a daily trade file of bitmex with the per row converters
+of pandas and with :func:`monkq.exchange.bitmex.data.utils.read_trade_tar`.
+
+Run it from the repository root with ``python -m benchmarks.bench_trade_csv``.
+"""
+import gzip
+import io
+import os
+import tempfile
+import time
+from typing import Any, Callable, Tuple
+
+import numpy
+import pandas
+from monkq.exchange.bitmex.data.utils import (
+    SIDE_VALUES, TICK_DIRECTION_VALUES, TIMESTAMP_FORMAT, read_trade_tar,
+)
+
+ROWS = 1000000
+
+SYMBOLS = ['XBTUSD', 'ETHUSD', 'XBTZ18', 'XBTH19', 'ADAZ18', 'BCHZ18', 'EOSZ18', 'LTCZ18', 'TRXZ18', 'XRPZ18']
+
+HEADER = "timestamp,symbol,side,size,price,tickDirection,trdMatchID,grossValue,homeNotional,foreignNotional\n"
+
+
+def write_day(path: str) -> None:
+    rng = numpy.random.RandomState(0)
+    times = numpy.datetime64('2018-12-05') + numpy.sort(rng.randint(0, 86400 * 10 ** 9, ROWS)).astype(
+        'timedelta64[ns]')
+    frame = pandas.DataFrame({
+        'timestamp': numpy.char.replace(numpy.datetime_as_string(times, unit='ns'), 'T', 'D'),
+        'symbol': numpy.array(SYMBOLS)[rng.randint(0, len(SYMBOLS), ROWS)],
+        'side': numpy.array(list(SIDE_VALUES))[rng.randint(0, len(SIDE_VALUES), ROWS)],
+        'size': rng.randint(1, 10000, ROWS),
+        'price': rng.uniform(3000, 4000, ROWS).round(1),
+        'tickDirection': numpy.array(list(TICK_DIRECTION_VALUES))[rng.randint(0, len(TICK_DIRECTION_VALUES), ROWS)],
+        'trdMatchID': '498350a3-8c03-affd-cf87-e6d8a90b70e5',
+        'grossValue': rng.randint(1, 10 ** 8, ROWS),
+        'homeNotional': rng.uniform(0, 1, ROWS),
+        'foreignNotional': rng.uniform(0, 10000, ROWS),
+    })
+    text = io.StringIO()
+    frame.to_csv(text, index=False, header=False)
+    with gzip.open(path, 'wt') as f:
+        f.write(HEADER)
+        f.write(text.getvalue())
+
+
+def read_with_converters(path: str) -> pandas.DataFrame:
+    """
+    The parsing of `read_trade_tar` before, every side and tick direction
+    goes through a Python call.
+    """
+    def side(value: str) -> float:
+        return numpy.float64(SIDE_VALUES.get(value, 3))
+
+    def tick_direction(value: str) -> float:
+        return numpy.float64(TICK_DIRECTION_VALUES.get(value, 5))
+
+    def date_parse(value: Any) -> pandas.Timestamp:
+        return pandas.to_datetime(value, format=TIMESTAMP_FORMAT, utc=True)
+
+    return pandas.read_csv(path, compression='gzip', parse_dates=[0], infer_datetime_format=True,
+                           usecols=["timestamp", "side", "size", "price", "tickDirection", "grossValue",
+                                    "homeNotional", "foreignNotional", "symbol"],
+                           dtype={'timestamp': object, 'symbol': str, 'size': numpy.float64,
+                                  'price': numpy.float64, 'grossValue': numpy.float64,
+                                  'homeNotional': numpy.float64, 'foreignNotional': numpy.float64},
+                           converters={'side': side, 'tickDirection': tick_direction},
+                           engine='c', low_memory=True, date_parser=date_parse)
+
+
+def timeit(func: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, '20181205.csv.gz')
+        write_day(path)
+        before, before_time = timeit(lambda: read_with_converters(path))
+        after, after_time = timeit(lambda: read_trade_tar(path))
+    pandas.testing.assert_frame_equal(before, after[before.columns])
+    print("{} rows".format(ROWS))
+    print("converters:     {:.3f}s".format(before_time))
+    print("read_trade_tar: {:.3f}s".format(after_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Compare the per bar matching cost of :class:`~monkq.tradecounter.TradeCounter`
+and :class:`~monkq.tradecounter.BatchTradeCounter` with a growing number of
+resting limit orders spread over several instruments.
+
+The orders rest within 100 of the price. Narrow bars cross only a few of
+them, wide bars most of them, the filled orders are replaced by new ones so
+the book size stays the same.
+
+Run it from the repository root with ``python -m benchmarks.bench_tradecounter``.
+"""
+import random
+import time
+from typing import Any, Type
+
+import numpy
+from monkq.assets.order import LimitOrder
+from monkq.klinearray import HIGH, KLINE_COLUMNS, LOW
+from monkq.tradecounter import BatchTradeCounter, TradeCounter
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import utc_datetime
+
+INSTRUMENTS = 20
+BARS = 500
+
+
+class StubInstrument():
+    def __init__(self, symbol: str) -> None:
+        self.symbol = symbol
+
+
+class StubExchange():
+    def __init__(self) -> None:
+        self.bar = numpy.zeros(len(KLINE_COLUMNS))
+
+    def last_bar(self, instrument: Any) -> numpy.ndarray:
+        return self.bar
+
+    def last_price(self, instrument: Any) -> float:
+        return self.bar[LOW]
+
+
+class StubAccount():
+    def __init__(self, exchange: StubExchange) -> None:
+        self.exchange = exchange
+
+    def deal(self, trade: Any) -> None:
+        pass
+
+
+class StubStatistic():
+    def collect_order(self, order: Any, cancelled: bool = False) -> None:
+        pass
+
+    def collect_trade(self, trade: Any) -> None:
+        pass
+
+
+def submit(counter: TradeCounter, account: StubAccount, instrument: StubInstrument) -> None:
+    # buys below and sells above the bar range, a few of them are crossed by each bar
+    buy = random.random() < 0.5
+    price = 1000 - random.uniform(0, 100) if buy else 1000 + random.uniform(0, 100)
+    counter.submit_order(LimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument,
+                                    quantity=1 if buy else -1, price=price))
+
+
+def run(counter_cls: Type[TradeCounter], orders: int, spread: float) -> float:
+    random.seed(0)
+    exchange = StubExchange()
+    account = StubAccount(exchange)
+    instruments = [StubInstrument(str(i)) for i in range(INSTRUMENTS)]
+    counter = counter_cls(StubStatistic())  # type:ignore
+    for i in range(orders):
+        submit(counter, account, instruments[i % INSTRUMENTS])
+
+    now = utc_datetime(2018, 1, 1)
+    elapsed = 0.
+    for _ in range(BARS):
+        exchange.bar[LOW] = 1000 - random.uniform(0, spread)
+        exchange.bar[HIGH] = 1000 + random.uniform(0, spread)
+        start = time.perf_counter()
+        counter.match(now)
+        elapsed += time.perf_counter() - start
+        for i in range(orders - len(counter.open_orders())):
+            submit(counter, account, instruments[i % INSTRUMENTS])
+    return elapsed / BARS
+
+
+def main() -> None:
+    print("{:>7} {:>7} {:>14} {:>14} {:>10}".format("bar", "orders", "heap(us/bar)", "batch(us/bar)", "speedup"))
+    for name, spread in (("narrow", 3), ("wide", 100)):
+        for orders in (10, 100, 1000):
+            heap = run(TradeCounter, orders, spread)
+            batch = run(BatchTradeCounter, orders, spread)
+            print("{:>7} {:>7} {:>14.1f} {:>14.1f} {:>9.1f}x".format(name, orders, heap * 1e6, batch * 1e6,
+                                                                     heap / batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -32,10 +32,14 @@ import monkq
 from logbook import StreamHandler
 from monkq.data import DataProcessor
 from monkq.exception import CommandError
-from monkq.exchange.bitmex.data.download import BitMexDownloader
+from monkq.exchange.bitmex.const import KLINE_FILE_NAME, KLINE_MMAP_DIR
+from monkq.exchange.bitmex.data.download import (
+    BitMexDownloader, DownloadManifest,
+)
 from monkq.exchange.bitmex.data.kline import (
     BitMexKlineTransform, KlineFullFill,
 )
+from monkq.klinearray import MemmapKlineStore, convert_kline_hdf
 from monkq.utils.filefunc import assure_dir, make_writable
 from monkq.utils.i18n import _
 
@@ -52,22 +56,59 @@ def cmd_main(ctx: click.Context) -> None:
 
 @cmd_main.command()
 @click.help_option()
-@click.option('--kind', default='trade', type=click.Choice(['quote', 'trade', 'instruments', 'kline']))
-@click.option('--mode', default='hdf', type=click.Choice(['csv', 'tar', 'hdf']), help='Define the download mode')
+@click.option('--kind', default='trade', type=click.Choice(['quote', 'trade', 'instruments', 'kline', 'funding']))
+@click.option('--mode', default='hdf', type=click.Choice(['csv', 'tar', 'hdf']),
+              help='Define the download mode, only the tar mode resumes the broken downloads')
 @click.option('--dst_dir', default=os.path.expanduser('~/.monk/data'), type=str)
+@click.option('--workers', '-w', default=1, type=int,
+              help='The number of days downloaded and parsed at the same time in the hdf mode, '
+                   'or the number of symbols turned to klines at the same time')
 @click.pass_context
-def download(ctx: click.Context, kind: str, mode: str, dst_dir: str) -> None:
+def download(ctx: click.Context, kind: str, mode: str, dst_dir: str, workers: int) -> None:
     if kind == 'kline':
-        kline_transform = BitMexKlineTransform(dst_dir, dst_dir)
+        kline_transform = BitMexKlineTransform(dst_dir, dst_dir, workers)
         kline_transform.do_all()
-        kline_fullfill = KlineFullFill(dst_dir)
+        kline_fullfill = KlineFullFill(dst_dir, workers)
         kline_fullfill.do_all()
+        mmap_dir = os.path.join(dst_dir, KLINE_MMAP_DIR)
+        if MemmapKlineStore.available(mmap_dir):
+            convert_kline_hdf(os.path.join(dst_dir, KLINE_FILE_NAME), mmap_dir)
     else:
         assure_dir(dst_dir)
-        b = BitMexDownloader(kind, mode, dst_dir)
+        b = BitMexDownloader(kind, mode, dst_dir, workers)
         b.do_all()
 
 
+@cmd_main.command()
+@click.help_option()
+@click.option('--dst_dir', default=os.path.expanduser('~/.monk/data'), type=str)
+@click.pass_context
+def verify(ctx: click.Context, dst_dir: str) -> None:
+    """
+    Check the files downloaded in the tar mode against their manifest.
+    """
+    manifest = DownloadManifest(dst_dir)
+    broken = manifest.verify()
+    for filename in broken:
+        click.echo(_("{} is missing or broken").format(filename))
+    if broken:
+        raise CommandError(_("{} of the {} downloaded files are broken, remove them and download them again").format(
+            len(broken), len(manifest.files)))
+    click.echo(_("All the {} downloaded files are verified").format(len(manifest.files)))
+
+
+@cmd_main.command()
+@click.help_option()
+@click.option('--data_dir', default=os.path.expanduser('~/.monk/data'), type=str)
+@click.pass_context
+def cachekline(ctx: click.Context, data_dir: str) -> None:
+    kline_file = os.path.join(data_dir, KLINE_FILE_NAME)
+    if not os.path.exists(kline_file):
+        raise CommandError(_("There is no kline data in {}, download the kline data first").format(data_dir))
+    tables = convert_kline_hdf(kline_file, os.path.join(data_dir, KLINE_MMAP_DIR))
+    click.echo(_("Converted {} kline tables").format(len(tables)))
+
+
 @cmd_main.command()
 @click.help_option()
 @click.option('--name', '-n', type=str)
@@ -22,7 +22,6 @@
 # SOFTWARE.
 #
 import datetime
-import pickle
 from importlib import import_module
 from typing import Any, List, Optional, Tuple, Type
 
@@ -32,10 +31,13 @@ import pandas
 from matplotlib.axes import Axes
 from matplotlib.dates import date2num
 from matplotlib.figure import Figure
+from monkq.analyse import metrics
+from monkq.report import load_report
 from monkq.utils.dataframe import (
     kline_1m_to_freq, kline_indicator, kline_time_window, plot_indicator,
     plot_kline_candlestick, plot_volume,
 )
+from monkq.utils.i18n import _
 
 DATA_LOADER_CLASS = "DataLoader"
 
@@ -44,9 +46,8 @@ AVAILABLE_COLORS = ('b', 'g', 'r', 'c', 'm', 'y', 'k', 'w')
 
 class Analyser():
     def __init__(self, result_file: str):
-        with open(result_file, 'rb') as f:
-            self.result_data = pickle.load(f)
-        self.settings = self.result_data['settings']
+        self.report = load_report(result_file)
+        self.settings = self.report.settings
         self.start_datetime = getattr(self.settings, 'START_TIME')
         self.end_datetime = getattr(self.settings, 'END_TIME')
 
@@ -67,17 +68,41 @@ class Analyser():
     @property
     def trades(self) -> pandas.DataFrame:
         if self._trade_df is None:
-            trades = []
-            for trade in self.result_data['trades']:
-                trades.append(trade.to_dict())
-            self._trade_df = pandas.DataFrame(trades)
+            self._trade_df = self.report.trades()
             self._trade_df.set_index('trade_datetime', inplace=True)
         return self._trade_df
 
+    @property
+    def orders(self) -> pandas.DataFrame:
+        if self._order_df is None:
+            orders = self.report.orders()
+            # the orders table has a row for every change of an order
+            self._order_df = orders[~orders['order_id'].duplicated(keep='last')].reset_index(drop=True)
+        return self._order_df
+
+    def table(self, name: str, columns: Optional[List[str]] = None) -> pandas.DataFrame:
+        """
+        Read one of the `capital`, `orders` and `trades` tables of the
+        report with only the columns given. The columns of a parquet or HDF
+        report which are not asked are not read.
+        """
+        if name not in ('capital', 'orders', 'trades'):
+            raise ValueError(_("There is no table {} in the report").format(name))
+        return getattr(self.report, name)(columns)
+
+    def summary(self, risk_free: float = 0.) -> pandas.Series:
+        """
+        The performance metrics of the total capital of the accounts, see
+        :func:`monkq.analyse.metrics.summary`.
+        """
+        capital = self.accounts_info.sum(axis=1)
+        # the capital is collected once more at the end of the run
+        capital = capital[~capital.index.duplicated(keep='last')]
+        trades = self.table('trades', ['trade_datetime', 'symbol', 'exec_quantity', 'exec_price'])
+        return metrics.summary(capital, trades, risk_free)
+
     def _account_to_df(self) -> pandas.DataFrame:
-        df = pandas.DataFrame(self.result_data['daily_capital'])
-        df.set_index('timestamp', inplace=True)
-        return df
+        return self.report.capital()
 
     def setup_data_loader(self) -> None:
         exchange_settings = getattr(self.settings, 'EXCHANGES')
@@ -0,0 +1,238 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Performance metrics of a backtest computed over the capital and the trade
+tables of the report.
+
+The capital is a :class:`pandas.Series` of the total capital indexed by
+the collect times, like a column of :attr:`Analyser.accounts_info`. The
+returns are the returns between two collects.
+"""
+import math
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy
+import pandas
+
+# the crypto currency markets trade every day of the year
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+WINDOW_T = Union[int, str]
+
+
+def periods_per_year(index: pandas.DatetimeIndex) -> float:
+    """
+    The number of collects in a year, by the median time between them.
+    """
+    if len(index) < 2:
+        return math.nan
+    step = numpy.median(numpy.diff(index.asi8)) / 1e9
+    return SECONDS_PER_YEAR / step if step else math.nan
+
+
+def returns(capital: pandas.Series) -> pandas.Series:
+    values = capital.values.astype(numpy.float64)
+    return pandas.Series(values[1:] / values[:-1] - 1, index=capital.index[1:])
+
+
+def total_return(capital: pandas.Series) -> float:
+    return capital.iloc[-1] / capital.iloc[0] - 1
+
+
+def annual_return(capital: pandas.Series, periods: Optional[float] = None) -> float:
+    if periods is None:
+        periods = periods_per_year(capital.index)
+    years = (len(capital) - 1) / periods
+    return (1 + total_return(capital)) ** (1 / years) - 1
+
+
+def volatility(rets: pandas.Series, periods: float) -> float:
+    return rets.values.std(ddof=1) * math.sqrt(periods)
+
+
+def sharpe_ratio(rets: pandas.Series, periods: float, risk_free: float = 0.) -> float:
+    """
+    :param risk_free: the risk free return of one period.
+    """
+    excess = rets.values - risk_free
+    std = excess.std(ddof=1)
+    return excess.mean() / std * math.sqrt(periods) if std else math.nan
+
+
+def _downside_deviation(excess: numpy.ndarray) -> float:
+    return math.sqrt(numpy.square(numpy.minimum(excess, 0)).mean())
+
+
+def sortino_ratio(rets: pandas.Series, periods: float, risk_free: float = 0.) -> float:
+    excess = rets.values - risk_free
+    downside = _downside_deviation(excess)
+    return excess.mean() / downside * math.sqrt(periods) if downside else math.nan
+
+
+def drawdown(capital: pandas.Series) -> pandas.Series:
+    """
+    The loss of the capital from its highest capital before.
+    """
+    values = capital.values.astype(numpy.float64)
+    return pandas.Series(1 - values / numpy.maximum.accumulate(values), index=capital.index)
+
+
+def max_drawdown(capital: pandas.Series) -> float:
+    return drawdown(capital).values.max()
+
+
+def period_win_rate(rets: pandas.Series) -> float:
+    """
+    The share of the periods between two collects with a gain in the
+    periods with the capital changed, not a rate of the trades.
+    """
+    changed = rets.values[rets.values != 0]
+    return (changed > 0).mean() if len(changed) else math.nan
+
+
+def closed_pnl(trades: pandas.DataFrame) -> pandas.Series:
+    """
+    The pnl of every trade closing a position or a part of it, indexed like
+    the trades. The positions are rebuilt from the trades of the table at
+    their average open price as :class:`~monkq.assets.account.FutureAccount`
+    does, the pnl is before the commission.
+    """
+    trades = trades.iloc[numpy.argsort(trades['trade_datetime'].values, kind='mergesort')]
+    # symbol -> (quantity, open price)
+    positions: Dict[str, Tuple[float, float]] = {}
+    closed: List[int] = []
+    pnls: List[float] = []
+    for row, (symbol, quantity, price) in enumerate(zip(trades['symbol'].values, trades['exec_quantity'].values,
+                                                        trades['exec_price'].values)):
+        held, open_price = positions.get(symbol, (0., 0.))
+        after = held + quantity
+        if math.isclose(held, 0, abs_tol=1e-9) or held * quantity > 0:
+            open_price = (held * open_price + quantity * price) / after
+        else:
+            closed.append(row)
+            pnls.append(math.copysign(min(abs(quantity), abs(held)), held) * (price - open_price))
+            if math.isclose(after, 0, abs_tol=1e-9):
+                after, open_price = 0., 0.
+            elif after * held < 0:
+                # the rest of the trade opens the opposite position
+                open_price = price
+        positions[symbol] = (after, open_price)
+    return pandas.Series(pnls, index=trades.index[closed], dtype=numpy.float64)
+
+
+def win_rate(trades: pandas.DataFrame) -> float:
+    """
+    The share of the trades with a gain in the trades closing a position,
+    see :func:`closed_pnl`.
+    """
+    pnl = closed_pnl(trades).values
+    return (pnl > 0).mean() if len(pnl) else math.nan
+
+
+def turnover(trades: pandas.DataFrame, capital: pandas.Series) -> float:
+    """
+    The value traded in a year over the mean capital. The value of a trade
+    is `exec_quantity * exec_price`, which is in the capital currency only
+    for the linear instruments.
+    """
+    years = (capital.index[-1] - capital.index[0]).total_seconds() / SECONDS_PER_YEAR
+    traded = numpy.abs(trades['exec_quantity'].values * trades['exec_price'].values).sum()
+    return traded / capital.values.mean() / years if years else math.nan
+
+
+def exposure(trades: pandas.DataFrame, start: pandas.Timestamp, end: pandas.Timestamp) -> float:
+    """
+    The share of the time from `start` to `end` with any position open.
+    The positions are rebuilt from the trades of the table.
+    """
+    if end <= start:
+        return math.nan
+    if trades.empty:
+        return 0.
+    trades = trades.iloc[numpy.argsort(trades['trade_datetime'].values, kind='mergesort')]
+    quantity = trades['exec_quantity'].values
+    after = trades.groupby('symbol', sort=False)['exec_quantity'].cumsum().values
+    before = after - quantity
+    opened = ~numpy.isclose(after, 0)
+    # the number of the symbols with a position after every trade
+    open_symbols = numpy.cumsum(opened.astype(numpy.int64) - (~numpy.isclose(before, 0)).astype(numpy.int64))
+    times = pandas.DatetimeIndex(trades['trade_datetime']).asi8
+    times = numpy.clip(numpy.append(times, pandas.Timestamp(end).value), pandas.Timestamp(start).value, None)
+    held = numpy.diff(times)[open_symbols > 0].sum()
+    return held / (pandas.Timestamp(end).value - pandas.Timestamp(start).value)
+
+
+def rolling_volatility(rets: pandas.Series, window: WINDOW_T, periods: float) -> pandas.Series:
+    """
+    :param window: a number of periods or a pandas offset like `30D`.
+    """
+    return rets.rolling(window).std() * math.sqrt(periods)
+
+
+def rolling_sharpe_ratio(rets: pandas.Series, window: WINDOW_T, periods: float,
+                         risk_free: float = 0.) -> pandas.Series:
+    rolling = (rets - risk_free).rolling(window)
+    return rolling.mean() / rolling.std() * math.sqrt(periods)
+
+
+def rolling_sortino_ratio(rets: pandas.Series, window: WINDOW_T, periods: float,
+                          risk_free: float = 0.) -> pandas.Series:
+    excess = rets - risk_free
+    downside = numpy.sqrt(numpy.square(excess.clip(upper=0)).rolling(window).mean())
+    return excess.rolling(window).mean() / downside * math.sqrt(periods)
+
+
+def rolling_drawdown(capital: pandas.Series, window: WINDOW_T) -> pandas.Series:
+    """
+    The loss of the capital from its highest capital in the window.
+    """
+    return 1 - capital / capital.rolling(window, min_periods=1).max()
+
+
+def summary(capital: pandas.Series, trades: Optional[pandas.DataFrame] = None,
+            risk_free: float = 0.) -> pandas.Series:
+    """
+    All the metrics of a capital curve, and the ones of the trades if the
+    table with the `trade_datetime`, `symbol`, `exec_quantity` and
+    `exec_price` columns is given.
+    """
+    periods = periods_per_year(capital.index)
+    rets = returns(capital)
+    metrics = {
+        'start_capital': capital.iloc[0],
+        'end_capital': capital.iloc[-1],
+        'total_return': total_return(capital),
+        'annual_return': annual_return(capital, periods),
+        'volatility': volatility(rets, periods),
+        'sharpe_ratio': sharpe_ratio(rets, periods, risk_free),
+        'sortino_ratio': sortino_ratio(rets, periods, risk_free),
+        'max_drawdown': max_drawdown(capital),
+        'period_win_rate': period_win_rate(rets),
+    }
+    if trades is not None:
+        metrics['trades'] = len(trades)
+        metrics['win_rate'] = win_rate(trades)
+        metrics['turnover'] = turnover(trades, capital)
+        metrics['exposure'] = exposure(trades, capital.index[0], capital.index[-1])
+    return pandas.Series(metrics)
@@ -23,7 +23,9 @@
 #
 from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Dict, List, Type
+from typing import (
+    Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Type,
+)
 
 from monkq.assets.const import DIRECTION, POSITION_EFFECT, SIDE
 from monkq.assets.instrument import FutureInstrument
@@ -54,6 +56,13 @@ class BaseAccount():
     def deal(self, trade: Trade) -> None:
         raise NotImplementedError()
 
+    def positions_changed(self, position: Optional[BasePosition] = None) -> None:
+        """
+        Called by the positions when their margin settings change outside
+        of a trade, without a position when all of them may have changed.
+        """
+        pass
+
     @property
     def total_capital(self) -> float:
         return self.wallet_balance
@@ -86,14 +95,101 @@ class RealFutureAccount(BaseAccount):
 
 @dataclass()
 class FutureAccount(BaseAccount):
+    """
+    The unrealised pnl and the position margin are running totals over the
+    positions. Every position keeps the values it adds to them with the
+    last price they are valued at, a position is valued again only when it
+    changes or when its price moves at a new price version of the exchange.
+
+    The order margin nets the opposite orders against the position, so it is
+    not additive per order. It is computed once and kept until the open
+    orders version given by the exchange or the positions change.
+
+    An exchange returning `None` versions gets them computed on every query.
+    """
     position_cls: Type[BasePosition] = FuturePosition
+    _positions_version: int = field(default=0, init=False, repr=False)
+    _aggregates: Dict[str, Tuple[Hashable, float]] = field(default_factory=dict, init=False, repr=False)
+    _price_version: Optional[Hashable] = field(default=None, init=False, repr=False)
+    # instrument -> (last price, unrealised pnl, position margin) of the position
+    _position_values: Dict[Any, Tuple[float, float, float]] = field(default_factory=dict, init=False, repr=False)
+    # the instruments whose position changed since they were valued
+    _changed_positions: Set[Any] = field(default_factory=set, init=False, repr=False)
+    _unrealised_pnl_total: float = field(default=0., init=False, repr=False)
+    _position_margin_total: float = field(default=0., init=False, repr=False)
+
+    def positions_changed(self, position: Optional[BasePosition] = None) -> None:
+        self._positions_version += 1
+        if position is None:
+            self._changed_positions.update(self.positions.keys())
+        else:
+            self._changed_positions.add(position.instrument)
+        self.exchange.positions_changed(self)
+
+    def _aggregate(self, name: str, key: Optional[Hashable], compute: Callable[[], float]) -> float:
+        if key is None:
+            return compute()
+        cached = self._aggregates.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = compute()
+        self._aggregates[name] = (key, value)
+        return value
+
+    def _order_key(self) -> Optional[Hashable]:
+        orders_version = self.exchange.orders_version()
+        if orders_version is None:
+            return None
+        # the leverage of an isolated position moves with the price
+        if any(getattr(position, 'isolated', False) for position in self.positions.values()):
+            price_version = self.exchange.price_version()
+            if price_version is None:
+                return None
+        else:
+            price_version = None
+        return orders_version, self._positions_version, price_version
+
+    def _update_position_totals(self) -> None:
+        price_version = self.exchange.price_version()
+        changed = self._changed_positions
+        if price_version != self._price_version:
+            self._price_version = price_version
+            changed.update(instrument for instrument, values in self._position_values.items()
+                           if instrument.last_price != values[0])
+        if not changed:
+            return
+        for instrument in changed:
+            old = self._position_values.pop(instrument, None)
+            if old is not None:
+                self._unrealised_pnl_total -= old[1]
+                self._position_margin_total -= old[2]
+            position = self.positions[instrument]
+            if not position.quantity and not position.position_margin:
+                continue
+            values = (instrument.last_price, position.unrealised_pnl, position.position_margin)
+            self._position_values[instrument] = values
+            self._unrealised_pnl_total += values[1]
+            self._position_margin_total += values[2]
+        changed.clear()
+        if not self._position_values:
+            # no rounding error is left behind by the closed positions
+            self._unrealised_pnl_total = self._position_margin_total = 0.
 
     @property
     def position_margin(self) -> float:
+        if self.exchange.price_version() is None:
+            return self._position_margin()
+        self._update_position_totals()
+        return self._position_margin_total
+
+    def _position_margin(self) -> float:
         return sum([position.position_margin for instrument, position in self.positions.items()])
 
     @property
     def order_margin(self) -> float:
+        return self._aggregate('order_margin', self._order_key(), self._total_order_margin)
+
+    def _total_order_margin(self) -> float:
         """
         Not that simple
         :return:
@@ -161,6 +257,12 @@ class FutureAccount(BaseAccount):
 
     @property
     def unrealised_pnl(self) -> float:
+        if self.exchange.price_version() is None:
+            return self._unrealised_pnl()
+        self._update_position_totals()
+        return self._unrealised_pnl_total
+
+    def _unrealised_pnl(self) -> float:
         return sum([position.unrealised_pnl for instrument, position in self.positions.items()])
 
     @property
@@ -195,3 +297,13 @@ class FutureAccount(BaseAccount):
 
         self.wallet_balance -= trade.commission
         position.deal(trade)
+        self.positions_changed(position)
+
+    def __setstate__(self, state: dict) -> None:
+        super(FutureAccount, self).__setstate__(state)
+        self._positions_version = 0
+        self._aggregates = {}
+        self._price_version = None
+        self._position_values = {}
+        self._changed_positions = set(self.positions.keys())
+        self._unrealised_pnl_total = self._position_margin_total = 0.
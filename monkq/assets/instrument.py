@@ -139,7 +139,7 @@ class PutOptionInstrument(FutureInstrument):
 class PerpetualInstrument(FutureInstrument):
     @property
     def funding_rate(self) -> float:
-        return 0
+        return self.exchange.funding_rate(self) if self.exchange is not None else 0
 
 
 @dataclasses.dataclass(frozen=True)
@@ -273,6 +273,7 @@ class IsolatedPosition(FutureBasePosition):
             raise MarginNotEnoughError()
         else:
             self._maint_margin = value
+            self.account.positions_changed(self)
 
     @property
     def position_margin(self) -> float:
@@ -317,6 +318,7 @@ class FutureCrossIsolatePosition(IsolatedPosition, CrossPosition):
     def maint_margin(self, value: float) -> None:
         IsolatedPosition.maint_margin.fset(self, value)  # type: ignore
         self.isolated = True
+        self.account.positions_changed(self)
 
     @property
     def position_margin(self) -> float:
@@ -340,6 +342,7 @@ class FutureCrossIsolatePosition(IsolatedPosition, CrossPosition):
 
     def set_cross(self) -> None:
         self.isolated = False
+        self.account.positions_changed(self)
 
     @property
     def is_isolated(self) -> bool:
@@ -22,6 +22,8 @@ STRATEGY = "monkq.base_strategy.BaseStrategy"
 
 DATA_DIR = os.path.expanduser("~/.monk/data")
 
+DATA_WARMUP = 1440  # 1m bars loaded before START_TIME, None to load all the data
+
 EXCHANGES = {  # type: ignore
     'bitmex': {
         'ENGINE': 'monkq.exchange.bitmex.default_sim_exchange',
@@ -38,6 +40,8 @@ ACCOUNTS = [
     }
 ]
 
+TICKER = "monkq.ticker.FrequencyTicker"
+
 TRADE_COUNTER = "monkq.tradecounter.TradeCounter"
 
 STATISTIC = "monkq.stat.Statistic"
@@ -45,3 +49,5 @@ STATISTIC = "monkq.stat.Statistic"
 COLLECT_FREQ = "4H"
 
 REPORT_FILE = 'result.pkl'
+
+REPORT_FLUSH_FREQ = "1D"
@@ -24,7 +24,7 @@
 import datetime
 import inspect
 from importlib import import_module
-from typing import Dict, Type, TypeVar, Union
+from typing import Dict, Optional, Type, TypeVar, Union
 
 from monkq.assets.account import BaseAccount
 from monkq.base_strategy import BaseStrategy
@@ -35,6 +35,7 @@ from monkq.exchange.base import BaseExchange  # noqa: F401 pragma: no cover
 from monkq.exchange.base import BaseSimExchange  # noqa: F401 pragma: no cover
 from monkq.stat import Statistic
 from monkq.tradecounter import TradeCounter
+from monkq.utils.timefunc import datetime_to_ns, ns_to_datetime
 
 T_LOAD_ITEM = TypeVar("T_LOAD_ITEM")
 
@@ -46,12 +47,35 @@ class Context:
         self.settings = settings
         self.exchanges: Dict[str, EXCHANGE_T] = {}
         self.accounts: Dict[str, BaseAccount] = {}
-        self.now: datetime.datetime = settings.START_TIME  # type:ignore
+        self._now: Optional[datetime.datetime] = None
+        self._now_ns: int = 0
+        self.now = settings.START_TIME  # type:ignore
 
         self.strategy: BaseStrategy
         self.stat: Statistic
         self.trade_counter: TradeCounter
 
+    @property
+    def now(self) -> datetime.datetime:
+        if self._now is None:
+            self._now = ns_to_datetime(self._now_ns)
+        return self._now
+
+    @now.setter
+    def now(self, value: datetime.datetime) -> None:
+        self._now = value
+        self._now_ns = datetime_to_ns(value)
+
+    @property
+    def now_ns(self) -> int:
+        return self._now_ns
+
+    @now_ns.setter
+    def now_ns(self, value: int) -> None:
+        # the datetime is only materialized when somebody asks for `now`
+        self._now_ns = value
+        self._now = None
+
     def setup_context(self) -> None:
         self.load_statistic()
         self.load_trade_counter()
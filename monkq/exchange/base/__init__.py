@@ -22,9 +22,11 @@
 # SOFTWARE.
 #
 from typing import (
-    TYPE_CHECKING, Any, Generic, Iterable, List, Optional, TypeVar, ValuesView,
+    TYPE_CHECKING, Any, Generic, Hashable, Iterable, List, Optional, TypeVar,
+    ValuesView,
 )
 
+import numpy
 import pandas
 
 from .info import ExchangeInfo
@@ -59,6 +61,13 @@ class BaseExchange(Generic[ACCOUNT_T]):
         """
         raise NotImplementedError()
 
+    def funding_rate(self, instrument: Any) -> float:
+        """
+        The next funding rate of a perpetual contract, 0 if the exchange
+        has no funding history.
+        """
+        return 0.
+
     async def place_limit_order(self, account: ACCOUNT_T, instrument: Any,
                                 price: float, quantity: float, text: str) -> str:
         """
@@ -124,11 +133,57 @@ class BaseSimExchange(BaseExchange):
     def last_price(self, instrument: Any) -> float:
         raise NotImplementedError()
 
+    def last_bar(self, instrument: Any) -> Optional[numpy.ndarray]:
+        """
+        The 1 minute bar of now as ``open, high, low, close, volume,
+        turnover``, `None` if there is no such bar.
+        """
+        raise NotImplementedError()
+
     def match_open_orders(self) -> None:
         raise NotImplementedError()
 
+    def positions_changed(self, account: Any) -> None:
+        """
+        Called by the accounts of the exchange when their positions change.
+        """
+        pass
+
+    def orders_version(self) -> Optional[Hashable]:
+        """
+        A value changing whenever an open order is submitted, cancelled or
+        traded. The accounts keep their order margin until it changes,
+        `None` makes them compute it on every query.
+        """
+        return None
+
+    def price_version(self) -> Optional[Hashable]:
+        """
+        A value changing whenever the last prices may change. The accounts
+        value again the positions whose price moved when it changes, `None`
+        makes them compute their unrealised pnl and position margin on
+        every query.
+        """
+        return None
+
     def get_open_orders(self, account: Any) -> Iterable["ORDER_T"]:
         raise NotImplementedError()
 
     def all_data(self, instrument: Any) -> pandas.DataFrame:
         raise NotImplementedError()
+
+    def get_kline_array(self, instrument: Any, count: int = 100) -> numpy.ndarray:
+        raise NotImplementedError()
+
+    def preload(self) -> None:
+        """
+        Load the data needed by the backtest ahead.
+        """
+        pass
+
+    def share_data(self, other: "BaseSimExchange") -> None:
+        """
+        Use the data loaded by another exchange of the same settings instead
+        of loading it again.
+        """
+        pass
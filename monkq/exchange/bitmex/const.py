@@ -32,10 +32,25 @@ BITMEX_WEBSOCKET_URL = "wss://www.bitmex.com/realtime"
 BITMEX_TESTNET_API_URL = "https://testnet.bitmex.com/api/v1/"
 BITMEX_TESTNET_WEBSOCKET_URL = "wss://testnet.bitmex.com/realtime"
 SYMBOL_LINK = urljoin(BITMEX_API_URL, "instrument?count=500")
+FUNDING_LINK = urljoin(BITMEX_API_URL, "funding?count={count}&start={start}&startTime={start_time}&endTime={end_time}")
+FUNDING_PAGE_SIZE = 500
+# seconds between the requests of the rate limited REST API
+FUNDING_REQUEST_INTERVAL = 2
+FUNDING_MAX_RETRY = 5
 TARFILETYPE = '.csv.gz'
 INSTRUMENT_FILENAME = 'instruments.json'
+MANIFEST_FILE_NAME = 'manifest.json'
+PART_FILE_SUFFIX = '.part'
+# seconds to connect and between the bytes received of a download request
+DOWNLOAD_TIMEOUT = 30
+# times a download ended before its size is resumed in the same process
+DOWNLOAD_MAX_RESUME = 3
 START_DATE = utc_datetime(2014, 11, 22)  # bitmex open date
 
 TRADE_FILE_NAME = 'trade.hdf'
 QUOTE_FILE_NAME = 'quote.hdf'
+FUNDING_FILE_NAME = 'funding.hdf'
 KLINE_FILE_NAME = 'kline.hdf'
+# seconds the kline writer waits for the workers before checking them
+KLINE_WORKER_POLL_INTERVAL = 1
+KLINE_MMAP_DIR = 'kline_mmap'
@@ -23,16 +23,24 @@
 #
 import csv
 import datetime
+import gzip
 import io
+import json
 import os
 import shutil
+import time
 import zlib
-from typing import IO, Generator, Iterator, List, Set, Type
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    IO, Deque, Dict, Generator, Iterator, List, Optional, Set, Tuple, Type,
+    Union,
+)
 
 import pandas
 import requests
 from dateutil.relativedelta import relativedelta
-from dateutil.rrule import DAILY, rrule
+from dateutil.rrule import DAILY, MONTHLY, rrule
 from logbook import Logger
 from monkq.config.global_settings import (
     HDF_FILE_COMPRESS_LEVEL, HDF_FILE_COMPRESS_LIB,
@@ -40,11 +48,14 @@ from monkq.config.global_settings import (
 from monkq.data import DataProcessor, DownloadProcess, Point, ProcessPoints
 from monkq.exception import DataDownloadError
 from monkq.exchange.bitmex.const import (
-    INSTRUMENT_FILENAME, QUOTE_FILE_NAME, QUOTE_LINK, START_DATE, SYMBOL_LINK,
-    TARFILETYPE, TRADE_FILE_NAME, TRADE_LINK,
+    DOWNLOAD_MAX_RESUME, DOWNLOAD_TIMEOUT, FUNDING_FILE_NAME, FUNDING_LINK,
+    FUNDING_MAX_RETRY, FUNDING_PAGE_SIZE, FUNDING_REQUEST_INTERVAL,
+    INSTRUMENT_FILENAME, MANIFEST_FILE_NAME, PART_FILE_SUFFIX, QUOTE_FILE_NAME,
+    QUOTE_LINK, START_DATE, SYMBOL_LINK, TARFILETYPE, TRADE_FILE_NAME,
+    TRADE_LINK,
 )
 from monkq.utils.csv import CsvFileDefaultDict, CsvZipDefaultDict
-from monkq.utils.filefunc import assure_dir
+from monkq.utils.filefunc import assure_dir, file_sha256
 from monkq.utils.i18n import _
 from monkq.utils.timefunc import utc_datetime
 from pytz import utc
@@ -88,12 +99,36 @@ class BitMexProcessPoints(ProcessPoints):
             yield DatePoint(date, self.link.format(date.strftime("%Y%m%d")), self.dst_dir)
 
 
+class BitMexFundingPoints(BitMexProcessPoints):
+    """
+    The funding history comes from the REST API, which is rate limited, so
+    every point asks for a whole month of it instead of a day.
+    """
+
+    def __iter__(self) -> Iterator[DatePoint]:
+        last = self.end + relativedelta(days=+1)
+        for date in rrule(freq=MONTHLY, dtstart=self.start, until=self.end):
+            end = min(date + relativedelta(months=+1), last)
+            yield DatePoint(date, self.link.format(start_time=date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                                   end_time=end.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                                   count=FUNDING_PAGE_SIZE, start='{start}'),
+                            self.dst_dir)
+
+
 class BitMexDownloader(DataProcessor):
-    def __init__(self, kind: str, mode: str, dst_dir: str):
+    """
+    :param workers: the number of days downloaded and parsed at the same
+        time in the hdf mode of the trades and the quotes. The days are
+        still written one by one in the date order, so a failed download
+        resumes from the first day not written.
+    """
+
+    def __init__(self, kind: str, mode: str, dst_dir: str, workers: int = 1):
         logger.info(_('Start downloading the data'))
         self.mode = mode
         self.kind = kind
         self.dst_dir = dst_dir
+        self.workers = workers
         self.init_kind(mode, kind)
         self.init_mode(dst_dir)
         self.Streamer: Type[DownloadProcess]
@@ -122,6 +157,9 @@ class BitMexDownloader(DataProcessor):
         elif kind == 'instruments':
             self.link = SYMBOL_LINK
             self.Streamer = SymbolsStreamRequest
+        elif kind == 'funding':
+            self.link = FUNDING_LINK
+            self.Streamer = HDFFundingStream
         else:
             raise ValueError()
 
@@ -130,6 +168,8 @@ class BitMexDownloader(DataProcessor):
         self.start = self.Streamer.get_start(dst_dir)
 
     def process_points(self) -> BitMexProcessPoints:
+        if self.kind == 'funding':
+            return BitMexFundingPoints(self.start, self.end, self.link, self.dst_dir)
         return BitMexProcessPoints(self.start, self.end, self.link, self.dst_dir)
 
     def process_one_point(self, point: DatePoint) -> None:
@@ -138,10 +178,53 @@ class BitMexDownloader(DataProcessor):
         qstream.process()
         logger.info(_('Finished downloading {} data on {}').format(self.kind, point.value.isoformat()))
 
+    def do_all(self) -> None:
+        if self.workers > 1 and issubclass(self.Streamer, _HDFStream):
+            self.do_all_parallel()
+            self.last()
+        else:
+            super(BitMexDownloader, self).do_all()
+
+    @staticmethod
+    def _fetch_and_parse(stream: "_HDFStream", parsers: ProcessPoolExecutor) -> Dict[str, pandas.DataFrame]:
+        raw = stream.fetch()
+        return parsers.submit(parse_day, stream.kind, raw).result()
+
+    def do_all_parallel(self) -> None:
+        """
+        The days are fetched by a pool of threads and parsed by a pool of
+        processes, at most twice the workers of days ahead of the day being
+        written.
+        """
+        points = iter(self.process_points())
+        pending: Deque[Tuple[_HDFStream, Future]] = deque()
+        with ThreadPoolExecutor(self.workers) as fetchers, ProcessPoolExecutor(self.workers) as parsers:
+            while True:
+                while len(pending) < self.workers * 2:
+                    point = next(points, None)
+                    if point is None:
+                        break
+                    stream = self.Streamer(point=point)
+                    assert isinstance(stream, _HDFStream)
+                    pending.append((stream, fetchers.submit(self._fetch_and_parse, stream, parsers)))
+                if not pending:
+                    break
+                stream, future = pending.popleft()
+                try:
+                    stream.write_parsed(future)
+                except DataDownloadError:
+                    logger.info(_('some exception occured when you download data at point {}. Check!!').format(
+                        stream.process_point.value))
+                    for waiting in pending:
+                        waiting[1].cancel()
+                    break
+                logger.info(_('Finished downloading {} data on {}').format(
+                    self.kind, stream.process_point.value.isoformat()))
+
 
 class StreamRequest():
     def _stream_requests(self, url: str) -> Generator[bytes, None, None]:
-        response = requests.get(url, stream=True)
+        response = requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
         response.raise_for_status()
         for chunk in response.iter_content(chunk_size=io.DEFAULT_BUFFER_SIZE):
             yield chunk
@@ -149,12 +232,30 @@ class StreamRequest():
 
 class FileObjRequest():
     def _stream_requests(self, url: str) -> IO:
-        response = requests.get(url, stream=True)
+        response = requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
         response.raise_for_status()
         return response.raw
 
 
+def parse_day(kind: str, raw: Union[bytes, IO]) -> Dict[str, pandas.DataFrame]:
+    """
+    Parse the gzip csv of a day to the frames of every symbol.
+    """
+    if isinstance(raw, bytes):
+        raw = io.BytesIO(raw)
+    if kind == 'trade':
+        dataframe = read_trade_tar(raw, index='timestamp')
+    elif kind == 'quote':
+        dataframe = read_quote_tar(raw, index='timestamp')
+    return classify_df(dataframe, 'symbol')
+
+
 class _HDFStream(FileObjRequest, DownloadProcess):
+    """
+    Parse the response of a day straight into the HDF file. A broken
+    download of a day is downloaded again from the beginning, only the
+    tar mode resumes the broken downloads.
+    """
     kind: str
 
     def __init__(self, point: DatePoint):
@@ -171,22 +272,36 @@ class _HDFStream(FileObjRequest, DownloadProcess):
 
         self.processed_key: Set = set()
 
+    def fetch(self) -> bytes:
+        # the whole day is read to hand it over to another process
+        return self._stream_requests(self.url).read()
+
+    def write(self, cla_df: Dict[str, pandas.DataFrame]) -> None:
+        for key, df in cla_df.items():
+            self.processed_key.add(key)
+            df.to_hdf(self.dst_file, key, mode='a',
+                      format='table', data_columns=True, index=False,
+                      complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL, append=True)
+
+    def _failed(self, e: Exception) -> None:
+        self.rollback()
+        logger.exception(_("Exception #{}# happened when process {} {}").format(e, self.url, self.dst_file))
+        raise DataDownloadError()
+
     def process(self) -> None:
         try:
-            if self.kind == 'trade':
-                dataframe = read_trade_tar(self._stream_requests(self.url), index='timestamp')
-            elif self.kind == 'quote':
-                dataframe = read_quote_tar(self._stream_requests(self.url), index='timestamp')
-            cla_df = classify_df(dataframe, 'symbol')
-            for key, df in cla_df.items():
-                self.processed_key.add(key)
-                df.to_hdf(self.dst_file, key, mode='a',
-                          format='table', data_columns=True, index=False,
-                          complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL, append=True)
+            self.write(parse_day(self.kind, self._stream_requests(self.url)))
         except Exception as e:
-            self.rollback()
-            logger.exception(_("Exception #{}# happened when process {} {}").format(e, self.url, self.dst_file))
-            raise DataDownloadError()
+            self._failed(e)
+
+    def write_parsed(self, parsed: "Future[Dict[str, pandas.DataFrame]]") -> None:
+        """
+        Write the day fetched and parsed by the future.
+        """
+        try:
+            self.write(parsed.result())
+        except Exception as e:
+            self._failed(e)
 
     def rollback(self) -> None:
         date = self.process_point.value
@@ -225,13 +340,142 @@ class HDFQuoteStream(_HDFStream):
     kind = 'quote'
 
 
+class HDFFundingStream(DownloadProcess):
+    """
+    Save the funding history of the perpetual contracts in the point to
+    the table of its symbol in ``funding.hdf``, indexed by the funding
+    timestamp with the ``fundingRate`` and ``fundingRateDaily`` columns.
+
+    The url of the point has a ``{start}`` field left for the paging. The
+    requests are `FUNDING_REQUEST_INTERVAL` seconds apart, and a rate
+    limited request is retried after the Retry-After seconds.
+    """
+    _last_request: float = 0.
+
+    def __init__(self, point: DatePoint):
+        super(HDFFundingStream, self).__init__(point=point)
+        self.url = point.url
+        assure_dir(point.dst_dir)
+        self.dst_file = os.path.join(point.dst_dir, FUNDING_FILE_NAME)
+        self.process_point = point
+        self.processed_key: Set = set()
+
+    @classmethod
+    def _get(cls, url: str) -> requests.Response:
+        for retry in range(FUNDING_MAX_RETRY + 1):
+            wait = HDFFundingStream._last_request + FUNDING_REQUEST_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            response = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+            HDFFundingStream._last_request = time.monotonic()
+            if response.status_code != 429:
+                break
+            try:
+                delay = float(response.headers['Retry-After'])
+            except (KeyError, ValueError):
+                delay = FUNDING_REQUEST_INTERVAL * 2 ** retry
+            logger.info(_("The funding requests are rate limited, retry in {} seconds").format(delay))
+            time.sleep(delay)
+        return response
+
+    def _request_records(self) -> List[dict]:
+        records: List[dict] = []
+        while True:
+            response = self._get(self.url.format(start=len(records)))
+            response.raise_for_status()
+            page = response.json()
+            records.extend(page)
+            if len(page) < FUNDING_PAGE_SIZE:
+                return records
+
+    def process(self) -> None:
+        try:
+            records = self._request_records()
+            if not records:
+                return
+            dataframe = pandas.DataFrame(records, columns=['timestamp', 'symbol', 'fundingRate', 'fundingRateDaily'])
+            dataframe['timestamp'] = pandas.to_datetime(dataframe['timestamp'], utc=True)
+            dataframe = dataframe.set_index('timestamp')
+            cla_df = classify_df(dataframe, 'symbol')
+            for key, df in cla_df.items():
+                self.processed_key.add(key)
+                df.to_hdf(self.dst_file, key, mode='a',
+                          format='table', data_columns=True, index=False,
+                          complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL, append=True)
+        except Exception as e:
+            self.rollback()
+            logger.exception(_("Exception #{}# happened when process {} {}").format(e, self.url, self.dst_file))
+            raise DataDownloadError()
+
+    def rollback(self) -> None:
+        if not self.processed_key:
+            return
+        date = self.process_point.value
+        with pandas.HDFStore(self.dst_file) as store:
+            for key in self.processed_key:
+                if key in store:
+                    store.remove(key, "index>=datetime.datetime({},{},{})".format(date.year, date.month, date.day))
+
+    @classmethod
+    def get_start(cls, dst_dir: str) -> datetime.datetime:
+        try:
+            with pandas.HDFStore(os.path.join(dst_dir, FUNDING_FILE_NAME), 'r') as store:
+                max_date = START_DATE
+                for key in store.keys():
+                    max_date = max(max_date, max(store.select_column(key, 'index')))
+                last_date = utc_datetime(max_date.year, max_date.month, max_date.day)
+                return last_date + relativedelta(days=+1)
+        except (KeyError, OSError):
+            return START_DATE
+
+
+class DownloadManifest():
+    """
+    The sizes and the sha256 checksums of the files completely downloaded
+    in a directory, saved in the ``manifest.json`` of the directory.
+    """
+
+    def __init__(self, dst_dir: str):
+        self.dst_dir = dst_dir
+        self.path = os.path.join(dst_dir, MANIFEST_FILE_NAME)
+        try:
+            with open(self.path) as f:
+                self.files: Dict[str, Dict[str, Union[int, str]]] = json.load(f)
+        except FileNotFoundError:
+            self.files = {}
+
+    def add(self, filename: str) -> None:
+        path = os.path.join(self.dst_dir, filename)
+        self.files[filename] = {'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+        tmp = self.path + PART_FILE_SUFFIX
+        with open(tmp, 'w') as f:
+            json.dump(self.files, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def verify(self) -> List[str]:
+        """
+        The files missing or not matching their size or checksum.
+        """
+        broken = []
+        for filename, record in sorted(self.files.items()):
+            path = os.path.join(self.dst_dir, filename)
+            if not os.path.exists(path) or os.path.getsize(path) != record['size'] or \
+                    file_sha256(path) != record['sha256']:
+                broken.append(filename)
+        return broken
+
+
 class RawStreamRequest(StreamRequest, DownloadProcess):
     """
     Stream a url request and save the raw contents to local.
     The child class has to be configured the `FILENAME`
 
-    If anything exception happens in the process,
-    the stream file would be deleted and raise `DataDownloadException`.
+    The contents are streamed to a ``.part`` file renamed to the `FILENAME`
+    once complete and recorded in the :class:`DownloadManifest`. A download
+    ending before the size the server announced is resumed by a http range
+    request at most `DOWNLOAD_MAX_RESUME` times, then the part file is kept
+    for the next process to resume it and `DataDownloadException` is raised.
+    Only the complete part file failing the gzip check is removed.
 
     :param url: the url used to stream, the url should be response
         content not just header.
@@ -247,24 +491,97 @@ class RawStreamRequest(StreamRequest, DownloadProcess):
         self.dst_dir = point.dst_dir
 
         self.dst_file = os.path.join(self.dst_dir, self.FILENAME)
+        self.part_file = self.dst_file + PART_FILE_SUFFIX
+
+    def _ranged_requests(self, offset: int) -> Tuple[Iterator[bytes], int, Optional[int]]:
+        """
+        The chunks of the contents from the offset, the offset the server
+        starts from and the size of the whole file if the server tells it.
+        """
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else None
+        response = requests.get(self.url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+        if response.status_code == 416:
+            if response.headers.get('Content-Range') == 'bytes */{}'.format(offset):
+                # the part file is the whole file already
+                return iter(()), offset, offset
+            # the part file is not a beginning of the file on the server
+            logger.info(_("The not complete file {} can't be resumed, download it again").format(self.part_file))
+            return self._ranged_requests(0)
+        response.raise_for_status()
+        if response.status_code != 206:
+            # the server doesn't support the range requests
+            offset = 0
+            length = response.headers.get('Content-Length')
+            size = int(length) if length is not None else None
+        else:
+            logger.info(_("Resume {} from {} bytes").format(self.url, offset))
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            size = int(total) if total.isdigit() else None
+        return response.iter_content(chunk_size=io.DEFAULT_BUFFER_SIZE), offset, size
+
+    def download(self) -> bool:
+        """
+        Stream the rest of the file to the part file, return whether the
+        part file reaches the size of the file.
+        """
+        offset = os.path.getsize(self.part_file) if os.path.exists(self.part_file) else 0
+        chunks, offset, size = self._ranged_requests(offset)
+        with open(self.part_file, 'ab' if offset else 'wb') as f:
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+            except requests.RequestException as e:
+                # the newer urllib3 raises on a connection dropped in the body
+                logger.info(_("The download of {} is broken by {}").format(self.url, e))
+                return False
+        written = os.path.getsize(self.part_file)
+        if size is not None and written < size:
+            # the older urllib3 ends the body quietly on a dropped connection
+            logger.info(_("Only {} of the {} bytes of {} are downloaded").format(written, size, self.url))
+            return False
+        return True
 
     def process(self) -> None:
         try:
-            with open(self.dst_file, 'wb') as f:
-                for chunk in self._stream_requests(self.url):
-                    f.write(chunk)
+            for _i in range(DOWNLOAD_MAX_RESUME + 1):
+                if self.download():
+                    break
+            else:
+                raise DataDownloadError(_("The download of {} is not complete").format(self.url))
+            if not self.intact():
+                # a resumed tail that doesn't fit the beginning can't be fixed
+                os.remove(self.part_file)
+                raise DataDownloadError(_("The downloaded file {} is broken").format(self.part_file))
+            os.replace(self.part_file, self.dst_file)
+            DownloadManifest(self.dst_dir).add(self.FILENAME)
         except Exception as e:
             self.rollback()
             logger.exception(_("Exception #{}# happened when process {} {}").format(e, self.url, self.dst_file))
             raise DataDownloadError()
 
+    def intact(self) -> bool:
+        """
+        Whether the complete part file is intact. A gzip file is decompressed
+        to check the crc32 and the size of every member.
+        """
+        if not self.FILENAME.endswith('.gz'):
+            return True
+        try:
+            with gzip.open(self.part_file) as f:
+                while f.read(io.DEFAULT_BUFFER_SIZE * 64):
+                    pass
+        except (OSError, EOFError, zlib.error):
+            return False
+        return True
+
     def rollback(self) -> None:
-        logger.info(_("Rollback!Remove the not complete file {}").format(self.dst_file))
-        os.remove(self.dst_file)
+        if os.path.exists(self.part_file):
+            logger.info(_("Keep the not complete file {} to resume it").format(self.part_file))
 
     @classmethod
     def get_start(cls, dst_dir: str) -> datetime.datetime:
-        dones = os.listdir(dst_dir)
+        # the part files and the manifest are not the days done
+        dones = [name for name in os.listdir(dst_dir) if name.endswith(TARFILETYPE)]
         if dones:
             current = max(dones)
             return utc.localize(datetime.datetime.strptime(current, "%Y%m%d" + TARFILETYPE)) + relativedelta(days=+1)
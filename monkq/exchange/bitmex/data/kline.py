@@ -22,34 +22,116 @@
 # SOFTWARE.
 #
 import datetime
+import itertools
 import json
 import os
-from typing import Dict, Iterator, List, Optional, Tuple
+import queue
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, wait,
+)
+from multiprocessing.managers import SyncManager
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar,
+)
 
 import pandas
 from dateutil.relativedelta import relativedelta
 from logbook import Logger
 from monkq.config.global_settings import (
     HDF_FILE_COMPRESS_LEVEL, HDF_FILE_COMPRESS_LIB,
-    HDF_TRADE_TO_KLINE_CHUNK_SIZE,
+    HDF_TRADE_TO_KLINE_CHUNK_SIZE, KLINE_SIDE_CLOSED, KLINE_SIDE_LABEL,
 )
 from monkq.data import DataProcessor, Point, ProcessPoints
 from monkq.exception import DataDownloadError
 from monkq.exchange.bitmex.const import (
-    INSTRUMENT_FILENAME, KLINE_FILE_NAME, START_DATE, TRADE_FILE_NAME,
+    INSTRUMENT_FILENAME, KLINE_FILE_NAME, KLINE_WORKER_POLL_INTERVAL,
+    START_DATE, TRADE_FILE_NAME,
 )
 from monkq.utils.i18n import _
-from monkq.utils.timefunc import parse_datetime_str, utc_datetime
+from monkq.utils.timefunc import parse_datetime_str
 
 from ..log import logger_group
 from .utils import (
-    check_1m_data_integrity, fullfill_1m_kline_with_start_end,
-    trades_to_1m_kline,
+    KLINE_COLUMNS, KlineAggregator, check_1m_data_integrity,
+    fullfill_1m_kline_with_start_end,
 )
 
 logger = Logger('exchange.bitmex.data')
 logger_group.add_logger(logger)
 
+T_RESULT = TypeVar('T_RESULT')
+
+# the attribute of a kline table keeping the last kline full filled
+FULLFILL_MARK_ATTR = 'fullfill_mark'
+
+
+def read_trade_chunks(input_file: str, key: str, start_time: datetime.datetime) -> Iterator[pandas.DataFrame]:
+    """
+    The trades of a key in the minute starting at start time and after it
+    in chunks of `HDF_TRADE_TO_KLINE_CHUNK_SIZE` rows.
+    """
+    # a trade on the start time belongs to the minute before when the
+    # kline intervals are closed on the right
+    operator = '>' if KLINE_SIDE_CLOSED == 'right' else '>='
+    return pandas.read_hdf(input_file, key,
+                           where="index{}datetime.datetime({},{},{},{},{})".format(operator,
+                                                                                   start_time.year,
+                                                                                   start_time.month,
+                                                                                   start_time.day,
+                                                                                   start_time.hour,
+                                                                                   start_time.minute),
+                           columns=['price', 'homeNotional', 'foreignNotional'],
+                           chunksize=HDF_TRADE_TO_KLINE_CHUNK_SIZE, iterator=True)
+
+
+def aggregate_trades(kline_queue: queue.Queue, input_file: str, key: str, start_time: datetime.datetime) -> None:
+    """
+    Aggregate the trades of a key after the start time, run in the worker
+    processes of :meth:`BitMexKlineTransform.do_all_parallel`. The klines of
+    every chunk are put on the queue as soon as they are complete and a
+    None marks the end of the key, so a worker only holds one chunk.
+    """
+    try:
+        aggregator = KlineAggregator()
+        for df in read_trade_chunks(input_file, key, start_time):
+            kline_queue.put((key, aggregator.update(df)))
+        kline_queue.put((key, aggregator.close()))
+    finally:
+        kline_queue.put((key, None))
+
+
+def fullfill_kline(df: pandas.DataFrame, start: datetime.datetime, end: datetime.datetime) -> pandas.DataFrame:
+    """
+    The kline full filled from start to end.
+    """
+    logger.debug("Kline data start point is: {}, end point is: {}.".format(start, end))
+    if check_1m_data_integrity(df, start, end):
+        logger.debug("Check kline is complete, doesn't have to full fill.")
+        return df
+    logger.debug("Kline data is not full fill, try to full fill.")
+    return fullfill_1m_kline_with_start_end(df, start, end)
+
+
+def imap_processes(func: Callable[..., T_RESULT], tasks: Iterable[Tuple[str, tuple]],
+                   workers: int) -> Iterator[Tuple[str, T_RESULT]]:
+    """
+    Run func on the arguments of every task in a pool of processes, at most
+    twice the workers of tasks are sent ahead so the results waiting to be
+    written stay bounded. Yield the key and the result of every task in the
+    order they finish.
+    """
+    tasks = iter(tasks)
+    pending: Dict[Future, str] = {}
+    with ProcessPoolExecutor(workers) as executor:
+        while True:
+            for key, args in itertools.islice(tasks, workers * 2 - len(pending)):
+                pending[executor.submit(func, *args)] = key
+            if not pending:
+                break
+            done, _not_done = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
 
 class KlinePoint(Point):
     __slots__ = ('df', 'key')
@@ -69,58 +151,76 @@ class BitMexKlineProcessPoints(ProcessPoints):
         self.output_file = output_file
 
     def __iter__(self) -> Iterator[KlinePoint]:
-        try:
-            trade_hdf = pandas.HDFStore(self.input_file, 'r')
-        except OSError:  # not exist
-            raise DataDownloadError(_("The required trade.hdf doesn't exist. Download the kline data of Bitmex need "
-                                      "the Bitmex trade data.You have to download the trade data first."
-                                      "Run 'monktrader download --kind trade'"))
-        keys = trade_hdf.keys()
-        trade_hdf.close()
-
+        keys = self.keys()
+        start_times = self.start_times(keys)
         for key in keys:
-            if os.path.exists(self.output_file):
-                logger.info(_("Updating new kline data from new trade data."))
-                try:
-                    kline_hdf = pandas.HDFStore(self.output_file, 'r')
-                    last = kline_hdf.select_column(key, 'index', start=-1)
-                    last_time = last[0]
-                    start_time = last_time + relativedelta(days=1)
-                except KeyError:  # not exist
-                    start_time = START_DATE
-                finally:
-                    kline_hdf.close()
-            else:
-                logger.info(_("You don't have any kline data. We are going to "
-                              "generate the kline data from scratch"))
-                start_time = START_DATE
-
+            start_time = start_times.get(key, START_DATE)
             logger.info(_("Generating kline data {} now from date {}.").format(key, start_time))
             found = False
-            iter_df = pandas.read_hdf(self.input_file, key,
-                                      where="index>=datetime.datetime({},{},{})".format(start_time.year,
-                                                                                        start_time.month,
-                                                                                        start_time.day),
-                                      columns=['price', 'homeNotional', 'foreignNotional'],
-                                      chunksize=HDF_TRADE_TO_KLINE_CHUNK_SIZE, iterator=True)
-            for df in iter_df:
+            for df in read_trade_chunks(self.input_file, key, start_time):
                 yield KlinePoint(df, key)
                 found = True
             else:
                 if found:
-                    # finally yield an end point to process the cache last date
+                    # finally yield an end point to close the last minute
                     yield KlinePoint(None, key)
                     logger.info(_("Successfully generate kline data "
                                   "{}").format(key))
 
+    def keys(self) -> List[str]:
+        try:
+            trade_hdf = pandas.HDFStore(self.input_file, 'r')
+        except OSError:  # not exist
+            raise DataDownloadError(_("The required trade.hdf doesn't exist. Download the kline data of Bitmex need "
+                                      "the Bitmex trade data.You have to download the trade data first."
+                                      "Run 'monktrader download --kind trade'"))
+        keys = trade_hdf.keys()
+        trade_hdf.close()
+        return keys
+
+    def start_times(self, keys: List[str]) -> Dict[str, datetime.datetime]:
+        """
+        The start of the minute of the last kline of every key already in
+        the kline file, the kline file is only opened once for all the keys.
+
+        The last kline is generated again from all the trades of its minute,
+        the trades of the next day may still fall in it, e.g. a trade
+        exactly on the midnight when the intervals are closed on the right.
+        """
+        if not os.path.exists(self.output_file):
+            logger.info(_("You don't have any kline data. We are going to "
+                          "generate the kline data from scratch"))
+            return {}
+
+        logger.info(_("Updating new kline data from new trade data."))
+        start_times = {}
+        with pandas.HDFStore(self.output_file, 'r') as kline_hdf:
+            kline_keys = set(kline_hdf.keys())
+            for key in keys:
+                if key not in kline_keys:
+                    continue
+                last_time = kline_hdf.select_column(key, 'index', start=-1)[0]
+                if KLINE_SIDE_LABEL == 'right':
+                    last_time = last_time - relativedelta(minutes=1)
+                start_times[key] = last_time.to_pydatetime()
+        return start_times
+
 
 class BitMexKlineTransform(DataProcessor):
-    def __init__(self, input_dir: str, output_dir: str) -> None:
+    """
+    :param workers: the number of symbols turned to klines at the same time.
+        Every worker process reads the trades of its own symbol, the klines
+        are written into the kline file by this process only.
+    """
+
+    def __init__(self, input_dir: str, output_dir: str, workers: int = 1) -> None:
         self.input_file = os.path.join(input_dir, TRADE_FILE_NAME)
         self.output_file = os.path.join(output_dir, KLINE_FILE_NAME)
+        self.workers = workers
 
-        self.mark_point = START_DATE
-        self.cache = None
+        self.aggregators: Dict[str, KlineAggregator] = {}
+        # the keys whose klines have been written by this run
+        self.written: Set[str] = set()
 
     def process_points(self) -> BitMexKlineProcessPoints:
         return BitMexKlineProcessPoints(self.input_file, self.output_file)
@@ -128,53 +228,94 @@ class BitMexKlineTransform(DataProcessor):
     def process_one_point(self, point: KlinePoint) -> None:
         # if df is None, it is an end point
         if point.df is None:
-            if self.cache is not None:
-                kline = trades_to_1m_kline(self.cache)
-                kline.to_hdf(self.output_file, point.key, mode='a',
-                             format='table', data_columns=True, index=False,
-                             complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL, append=True)
-                logger.debug("Finished data {}".format(point.key))
-                # reset everything for another key
-                self.cache = None
-                self.mark_point = START_DATE
+            aggregator = self.aggregators.pop(point.key, None)
+            if aggregator is None:
+                return
+            kline = aggregator.close()
+            logger.debug("Finished data {}".format(point.key))
+        else:
+            aggregator = self.aggregators.setdefault(point.key, KlineAggregator())
+            kline = aggregator.update(point.df)
+
+        self.write(point.key, kline)
+
+    def write(self, key: str, kline: pandas.DataFrame) -> None:
+        if len(kline):
+            logger.debug("Write {} data from {} to {} into hdf file"
+                         .format(key, kline.index[0], kline.index[-1]))
+            if key not in self.written:
+                self.written.add(key)
+                self.remove_regenerated(key, kline.index[0])
+            kline.to_hdf(self.output_file, key, mode='a',
+                         format='table', data_columns=True, index=False,
+                         complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL, append=True)
+
+    def remove_regenerated(self, key: str, first: pandas.Timestamp) -> None:
+        """
+        Remove the klines of the run before which are generated again by
+        this run, they start from the last kline of the run before.
+        """
+        if not os.path.exists(self.output_file):
             return
-
-        end_time = point.df.index[-1]
-        last_date = end_time + relativedelta(hour=0, minute=0, second=0, microsecond=0)
-        logger.debug("Process {} data from {} to {}".format(point.key, self.mark_point, last_date))
-        if last_date > self.mark_point:
-            process_df = point.df.loc[
-                point.df.index < utc_datetime(last_date.year, last_date.month, last_date.day)]
-            cache_df = point.df.loc[point.df.index >= utc_datetime(last_date.year, last_date.month, last_date.day)]
-
-            if self.cache is not None:
-                process_df = pandas.concat([self.cache, process_df], copy=False)
-
-            if len(process_df) != 0:
-                kline = trades_to_1m_kline(process_df)
-                logger.debug("Write {} data from {} to {} into hdf file"
-                             .format(point.key, self.mark_point, last_date))
-                kline.to_hdf(self.output_file, point.key, mode='a',
-                             format='table', data_columns=True, index=False,
-                             complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL, append=True)
-
-            self.cache = cache_df
-            self.mark_point = last_date
+        with pandas.HDFStore(self.output_file) as kline_hdf:
+            if key in kline_hdf:
+                kline_hdf.remove(key, where='index>=first')
+
+    def do_all(self) -> None:
+        if self.workers > 1:
+            try:
+                self.do_all_parallel()
+            except DataDownloadError:
+                logger.info(_("The kline data are not generated, the trade data are missing."))
+            self.last()
         else:
-            if self.cache is None:
-                self.cache = point.df
-            else:
-                self.cache = pandas.concat([self.cache, point.df], copy=False)
+            super(BitMexKlineTransform, self).do_all()
+
+    def do_all_parallel(self) -> None:
+        points = self.process_points()
+        keys = points.keys()
+        start_times = points.start_times(keys)
+        # the queue of a manager is passed to the tasks as an argument,
+        # at most twice the workers of chunks wait to be written
+        manager = SyncManager()
+        with manager, ProcessPoolExecutor(self.workers) as executor:
+            kline_queue = manager.Queue(self.workers * 2)
+            futures = {key: executor.submit(aggregate_trades, kline_queue, self.input_file, key,
+                                            start_times.get(key, START_DATE))
+                       for key in keys}
+            running = len(futures)
+            while running:
+                try:
+                    key, kline = kline_queue.get(timeout=KLINE_WORKER_POLL_INTERVAL)
+                except queue.Empty:
+                    # a worker died hard never puts the end of its key
+                    for future in futures.values():
+                        if future.done() and future.exception() is not None:
+                            future.result()
+                    continue
+                if kline is None:
+                    running -= 1
+                    logger.debug("Finished data {}".format(key))
+                else:
+                    self.write(key, kline)
+            for key, future in futures.items():
+                future.result()
+                logger.info(_("Successfully generate kline data "
+                              "{}").format(key))
 
     def last(self) -> None:
         pass
 
 
 class FullFillPoint(Point):
-    def __init__(self, df: pandas.DataFrame, instruemt_data: dict, key: str):
+    def __init__(self, df: pandas.DataFrame, instruemt_data: dict, key: str,
+                 mark: Optional[pandas.Timestamp] = None):
         self.df = df
         self.instrument_data = instruemt_data
         self.key = key
+        # the last kline full filled by the run before and the first row of
+        # df, None if the whole table has to be full filled
+        self.mark = mark
 
     @property
     def value(self) -> pandas.DataFrame:
@@ -190,8 +331,23 @@ class KlineFullFileProcessPoints(ProcessPoints):
 
     def __iter__(self) -> Iterator[FullFillPoint]:
         for key in self.keys:
-            df = pandas.read_hdf(self.kline_hdf_path, key)
-            yield FullFillPoint(df, self.instrument_data[key], key)
+            with pandas.HDFStore(self.kline_hdf_path, 'r') as kline:
+                df, mark = self.read(kline, key)
+            yield FullFillPoint(df, self.instrument_data[key], key, mark)
+
+    def read(self, kline: pandas.HDFStore, key: str) -> Tuple[pandas.DataFrame, Optional[pandas.Timestamp]]:
+        """
+        Only the klines from the full fill mark on are read if the table has
+        one, the whole table otherwise.
+        """
+        storer = kline.get_storer(key)
+        mark = getattr(storer.attrs, FULLFILL_MARK_ATTR, None) if storer.is_table else None
+        if mark is not None:
+            df = kline.select(key, where='index>=mark')
+            if len(df) and df.index[0] == mark:
+                return df, mark
+            logger.info(_("The full fill mark of kline data {} is not found, full fill it again.").format(key))
+        return kline.select(key), None
 
     def get_keys(self) -> List[str]:
         kline = pandas.HDFStore(self.kline_hdf_path)
@@ -202,11 +358,25 @@ class KlineFullFileProcessPoints(ProcessPoints):
 
 
 class KlineFullFill(DataProcessor):
-    def __init__(self, input_dir: str) -> None:
+    """
+    Full fill the kline data from the listing of every instrument to the end
+    of the last day of the kline data or the expiry.
+
+    The last kline full filled is kept as a mark in the attributes of the
+    table, so the next run only full fills the klines appended after the
+    mark. The tables in the fixed format written by the full fill before
+    are written again in the table format once.
+
+    :param workers: the number of symbols full filled at the same time. The
+        kline file is read and written by this process only.
+    """
+
+    def __init__(self, input_dir: str, workers: int = 1) -> None:
         with open(os.path.join(input_dir, INSTRUMENT_FILENAME)) as f:
             instrument_data: List[dict] = json.load(f)
         self.instrument_data = self.reformat_instrument_data(instrument_data)
         self.output_file = os.path.join(input_dir, KLINE_FILE_NAME)
+        self.workers = workers
 
     def reformat_instrument_data(self, data: List[dict]) -> Dict[str, dict]:
         outcome = {}
@@ -219,35 +389,64 @@ class KlineFullFill(DataProcessor):
 
     def process_one_point(self, point: FullFillPoint) -> None:
         logger.debug("Full fill kline data {}.".format(point.key))
-        df = point.value
-        list_datetime, last_datetime = self.get_start_end(point.key, df)
-
-        logger.debug("Kline data start point is: {}, end point is: {}.".format(list_datetime, last_datetime))
+        start, end = self.get_start_end(point.key, point.df, point.mark)
+        if point.mark is not None and end <= point.mark:
+            logger.debug("Kline data {} doesn't have new data to full fill.".format(point.key))
+            return
+        self.write(point.key, fullfill_kline(point.df, start, end), point.mark)
 
-        if check_1m_data_integrity(df, list_datetime, last_datetime):
-            logger.debug("Check kline is complete, doesn't have to full fill.")
+    def write(self, key: str, fullfill_df: pandas.DataFrame, mark: Optional[pandas.Timestamp]) -> None:
+        with pandas.HDFStore(self.output_file, 'a') as kline:
+            if mark is None:
+                kline.remove(key)
+            else:
+                kline.remove(key, where='index>mark')
+                fullfill_df = fullfill_df.loc[fullfill_df.index > mark]
+            kline.append(key, fullfill_df[KLINE_COLUMNS], format='table', data_columns=True, index=False,
+                         complib=HDF_FILE_COMPRESS_LIB, complevel=HDF_FILE_COMPRESS_LEVEL)
+            setattr(kline.get_storer(key).attrs, FULLFILL_MARK_ATTR, fullfill_df.index[-1])
+
+    def do_all(self) -> None:
+        if self.workers > 1:
+            self.do_all_parallel()
+            self.last()
         else:
-            logger.debug("Kline data is not full fill, try to full fill.")
-            fullfill_df = fullfill_1m_kline_with_start_end(df, list_datetime, last_datetime)
+            super(KlineFullFill, self).do_all()
+
+    def do_all_parallel(self) -> None:
+        marks: Dict[str, Optional[pandas.Timestamp]] = {}
 
-            fullfill_df.to_hdf(self.output_file, key=point.key, mode='a',
-                               format='fixed', data_columns=True,
-                               index=False, complib=HDF_FILE_COMPRESS_LIB,
-                               complevel=HDF_FILE_COMPRESS_LEVEL)
+        def tasks() -> Iterator[Tuple[str, tuple]]:
+            for point in self.process_points():
+                start, end = self.get_start_end(point.key, point.df, point.mark)
+                if point.mark is not None and end <= point.mark:
+                    continue
+                marks[point.key] = point.mark
+                yield point.key, (point.df, start, end)
 
-    def get_start_end(self, key: str, df: pandas.DataFrame) -> Tuple[datetime.datetime, datetime.datetime]:
+        for key, fullfill_df in imap_processes(fullfill_kline, tasks(), self.workers):
+            logger.debug("Full filled kline data {}.".format(key))
+            self.write(key, fullfill_df, marks.pop(key))
+
+    def get_start_end(self, key: str, df: pandas.DataFrame,
+                      mark: Optional[pandas.Timestamp] = None) -> Tuple[datetime.datetime, datetime.datetime]:
         instrument = self.instrument_data[key]
-        list_datetime = parse_datetime_str(instrument['listing'])
-        start = list_datetime + relativedelta(minutes=1)
+        if mark is None:
+            list_datetime = parse_datetime_str(instrument['listing'])
+            start = list_datetime + relativedelta(minutes=1)
+        else:
+            start = mark.to_pydatetime()
 
         last_pd_datetime = df.index[-1]
         last_pd_datetime = last_pd_datetime.to_pydatetime()
+        # the last day of the kline data is the day the last minute starts in
+        last_day = last_pd_datetime - relativedelta(minutes=1) if KLINE_SIDE_LABEL == 'right' else last_pd_datetime
         if instrument.get('expiry'):
             expiry_datetime = parse_datetime_str(instrument['expiry'])
             if expiry_datetime > last_pd_datetime:
                 logger.debug("Instrument {} haven't expired yet. "
                              "Expiry date: {}, last_kline_date: {}.".format(key, expiry_datetime, last_pd_datetime))
-                last_datetime = last_pd_datetime + relativedelta(days=+1, hour=0, minute=0, second=0, microsecond=0)
+                last_datetime = last_day + relativedelta(days=+1, hour=0, minute=0, second=0, microsecond=0)
             else:
                 logger.debug("Instrument {} has expired. Use expiry date {}".format(key, expiry_datetime))
                 last_datetime = expiry_datetime
@@ -256,7 +455,7 @@ class KlineFullFill(DataProcessor):
                          "Use the df last datetime as the last date."
                          "Original kline last datetime is {}".format(key, last_pd_datetime))
 
-            last_datetime = last_pd_datetime + relativedelta(days=+1, hour=0, minute=0, second=0, microsecond=0)
+            last_datetime = last_day + relativedelta(days=+1, hour=0, minute=0, second=0, microsecond=0)
         return (start, last_datetime)
 
     def last(self) -> None:
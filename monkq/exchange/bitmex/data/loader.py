@@ -25,8 +25,9 @@
 import datetime
 import json
 import os
-from typing import TYPE_CHECKING, Dict, Optional, Type
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Type, Union
 
+import numpy
 import pandas
 from logbook import Logger
 from monkq.assets.instrument import (
@@ -34,11 +35,17 @@ from monkq.assets.instrument import (
     PutOptionInstrument,
 )
 from monkq.exception import LoadDataError
-from monkq.exchange.bitmex.const import INSTRUMENT_FILENAME, KLINE_FILE_NAME
-from monkq.lazyhdf import LazyHDFTableStore
-from monkq.utils.dataframe import kline_count_window, make_datetime_exactly
+from monkq.exchange.bitmex.const import (
+    FUNDING_FILE_NAME, INSTRUMENT_FILENAME, KLINE_FILE_NAME, KLINE_MMAP_DIR,
+)
+from monkq.klinearray import (
+    ONE_MINUTE_NS, LazyKlineArrayStore, MemmapKlineStore,
+)
+from monkq.utils.dataframe import kline_count_window
 from monkq.utils.i18n import _
-from monkq.utils.timefunc import is_aware_datetime
+from monkq.utils.timefunc import (
+    datetime_to_ns, is_aware_datetime, ns_to_datetime,
+)
 
 from ..log import logger_group
 
@@ -89,11 +96,34 @@ class BitmexDataloader:
     # below are all index like instrument
     _abandon_instrument_type = ('MRIXXX', 'MRRXXX', 'MRCXXX')
 
-    def __init__(self, data_dir: str) -> None:
+    def __init__(self, data_dir: str, cache_size: Optional[int] = None, pinned: Iterable[str] = (),
+                 start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> None:
+        """
+        With `start` or `end` only the kline data in that range is loaded.
+        """
         self.data_dir = data_dir
+        self.cache_size = cache_size
+        self.pinned = tuple(pinned)
+        self.start_ns = None if start is None else datetime_to_ns(start)
+        self.end_ns = None if end is None else datetime_to_ns(end)
         self.instruments: Dict[str, Instrument] = dict()
         self.trade_data: Dict = dict()
-        self._kline_store = LazyHDFTableStore(os.path.join(data_dir, KLINE_FILE_NAME))
+        self._kline_store = self._open_kline_store()
+
+    def _open_kline_store(self) -> Union[LazyKlineArrayStore, MemmapKlineStore]:
+        kline_file = os.path.join(self.data_dir, KLINE_FILE_NAME)
+        mmap_dir = os.path.join(self.data_dir, KLINE_MMAP_DIR)
+        if MemmapKlineStore.available(mmap_dir):
+            store = MemmapKlineStore(mmap_dir)
+            if store.is_fresh(kline_file):
+                logger.debug("Now using the memory mapped kline data in {}.".format(mmap_dir))
+                return store
+            logger.warning(_("The memory mapped kline data in {} is older than {}, "
+                             "run `monkq cachekline` to refresh it.").format(mmap_dir, kline_file))
+        return LazyKlineArrayStore(kline_file, self.cache_size, self.pinned, self.start_ns, self.end_ns)
+
+    def cache_stats(self) -> dict:
+        return self._kline_store.stats()
 
     def load_instruments(self, exchange: Optional['BitmexSimulateExchange']) -> None:
         logger.debug("Now loading the instruments data.")
@@ -123,24 +153,77 @@ class BitmexDataloader:
                 active[instrument.symbol] = instrument
         return active
 
+    def preload(self, start: datetime.datetime, end: datetime.datetime) -> List[str]:
+        """
+        Load the kline data of the instruments which are traded between
+        `start` and `end`, so the processes forked afterwards share it.
+        """
+        symbols = []
+        for symbol in self._kline_store.keys():
+            instrument = self.instruments.get(symbol)
+            if instrument is None:
+                continue
+            if instrument.listing_date is not None and instrument.listing_date > end:
+                continue
+            if instrument.expiry_date is not None and instrument.expiry_date < start:
+                continue
+            self._kline_store.get_array(symbol)
+            symbols.append(symbol)
+        return symbols
+
+    def funding_rates(self, symbols: Iterable[str]) -> Dict[str, pandas.Series]:
+        """
+        The ``fundingRate`` history in ``funding.hdf`` of the symbols which
+        have one, indexed by the funding timestamp.
+        """
+        funding_file = os.path.join(self.data_dir, FUNDING_FILE_NAME)
+        if not os.path.exists(funding_file):
+            return {}
+        rates = {}
+        with pandas.HDFStore(funding_file, 'r') as store:
+            keys = set(key.lstrip('/') for key in store.keys())
+            for symbol in symbols:
+                if symbol in keys:
+                    rates[symbol] = store.select(symbol, columns=['fundingRate'])['fundingRate']
+        return rates
+
+    def share_kline(self, other: "BitmexDataloader") -> None:
+        """
+        Use the kline data already loaded by another dataloader of the same
+        data directory.
+        """
+        self._kline_store = other._kline_store
+
     def get_last_price(self, symbol: str, date_time: datetime.datetime) -> float:
         assert is_aware_datetime(date_time)
-        kline = self._kline_store.get(symbol)
-        time_target = make_datetime_exactly(date_time, "T", forward=False)
-        try:
-            bar = kline.loc[time_target]
-            return bar['close']
-        except KeyError:
+        kline = self._kline_store.get_array(symbol)
+        price = kline.last_price(datetime_to_ns(date_time))
+        if price is None:
             logger.warning(_("Instrument {} on {} has no bar data., Use 0 as last price"
                              .format(symbol, date_time)))
             return 0.0
+        return price
+
+    def get_last_bar(self, symbol: str, timestamp_ns: int) -> Optional[numpy.ndarray]:
+        return self._kline_store.get_array(symbol).bar(timestamp_ns)
 
     def get_kline(self, symbol: str, date_time: datetime.datetime,
                   count: int) -> pandas.DataFrame:
         assert is_aware_datetime(date_time)
+        self._ensure_history(datetime_to_ns(date_time), count)
         kline_frame = self._kline_store.get(symbol)
         target_klines = kline_count_window(kline_frame, date_time, count)
         return target_klines
 
+    def get_kline_array(self, symbol: str, timestamp_ns: int, count: int) -> numpy.ndarray:
+        self._ensure_history(timestamp_ns, count)
+        return self._kline_store.get_array(symbol).window(timestamp_ns, count)
+
+    def _ensure_history(self, timestamp_ns: int, count: int) -> None:
+        start_ns = timestamp_ns - count * ONE_MINUTE_NS
+        if self._kline_store.ensure_start(start_ns):
+            logger.info(_("Reload the kline data from {} for {} bars, increase DATA_WARMUP to "
+                          "avoid it.").format(ns_to_datetime(start_ns), count))
+
     def all_data(self, symbol: str) -> pandas.DataFrame:
         return self._kline_store.get(symbol)
@@ -23,7 +23,7 @@
 #
 
 import datetime
-from typing import IO, List, Optional, Union
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas
@@ -35,10 +35,10 @@ from monkq.const import TICK_DIRECTION
 dtypes_trades = {
     "timestamp": np.object,
     "symbol": np.str,
-    "side": np.float64,
+    "side": "category",
     "size": np.float64,
     "price": np.float64,
-    "tickDirection": np.float64,
+    "tickDirection": "category",
     "trdMatchID": np.str,
     "grossValue": np.float64,
     "homeNotional": np.float64,
@@ -55,30 +55,59 @@ dtypes_quote = {
 }
 
 
-def _date_parse(one: str) -> pandas.Timestamp:
-    return pandas.to_datetime(one, format="%Y-%m-%dD%H:%M:%S.%f", utc=True)
+TIMESTAMP_FORMAT = "%Y-%m-%dD%H:%M:%S.%f"
 
+# the length of the timestamps like `2018-12-05D00:00:25.948313000`
+TIMESTAMP_LENGTH = 29
+
+SIDE_VALUES = {
+    'Buy': SIDE.BUY.value,
+    'Sell': SIDE.SELL.value,
+}
+
+TICK_DIRECTION_VALUES = {
+    'PlusTick': TICK_DIRECTION.PLUS_TICK.value,
+    'ZeroPlusTick': TICK_DIRECTION.ZERO_PLUS_TICK.value,
+    'MinusTick': TICK_DIRECTION.MINUS_TICK.value,
+    'ZeroMinusTick': TICK_DIRECTION.ZERO_MINUS_TICK.value,
+}
+
+
+def parse_timestamps(values: np.ndarray) -> pandas.DatetimeIndex:
+    """
+    Parse the timestamps of the bitmex csv files in bulk. The timestamps
+    of the usual length are turned into ISO 8601 strings in place and
+    parsed by NumPy, the others by :func:`pandas.to_datetime`.
+    """
+    raw = values.astype('S{}'.format(TIMESTAMP_LENGTH + 1))
+    chars = raw.view('S1').reshape(len(raw), TIMESTAMP_LENGTH + 1)
+    if len(raw) and (chars[:, 10] == b'D').all() and (chars[:, TIMESTAMP_LENGTH] == b'').all() \
+            and (chars[:, TIMESTAMP_LENGTH - 1] != b'').all():
+        chars[:, 10] = b'T'
+        return pandas.DatetimeIndex(raw.astype('datetime64[ns]')).tz_localize('UTC')
+    return pandas.DatetimeIndex(pandas.to_datetime(values, format=TIMESTAMP_FORMAT, utc=True))
+
+
+def map_category(column: pandas.Series, values: dict, unknown: float) -> np.ndarray:
+    """
+    Map a categorical column to float64 by looking up its codes, the
+    categories not in `values` and the missing ones are `unknown`.
+    """
+    lookup = np.array([values.get(category, unknown) for category in column.cat.categories] + [unknown],
+                      dtype=np.float64)
+    # the code of a missing value is -1, the last one of the lookup
+    return lookup[column.cat.codes.values]
 
-def _side_converters(side: str) -> SIDE:
-    if side == 'Buy':
-        return np.float64(SIDE.BUY.value)
-    elif side == 'Sell':
-        return np.float64(SIDE.SELL.value)
-    else:
-        return np.float64(SIDE.UNKNOWN.value)  # pragma: no cover
-
-
-def _tick_direction(tick_direction: str) -> TICK_DIRECTION:
-    if tick_direction == 'MinusTick':
-        return np.float64(TICK_DIRECTION.MINUS_TICK.value)
-    elif tick_direction == 'PlusTick':
-        return np.float64(TICK_DIRECTION.PLUS_TICK.value)
-    elif tick_direction == 'ZeroMinusTick':
-        return np.float64(TICK_DIRECTION.ZERO_MINUS_TICK.value)
-    elif tick_direction == 'ZeroPlusTick':
-        return np.float64(TICK_DIRECTION.ZERO_PLUS_TICK.value)
-    else:
-        return np.float64(TICK_DIRECTION.UNKNOWN.value)  # pragma: no cover
+
+def _read_tar(path: Union[str, IO], usecols: List[str], dtypes: dict) -> pandas.DataFrame:
+    use_dtypes = {col: dtypes[col] for col in usecols}
+    use_dtypes['timestamp'] = np.str
+    t_frame = pandas.read_csv(path, compression='gzip',
+                              usecols=usecols,
+                              dtype=use_dtypes,
+                              engine='c', low_memory=True)
+    t_frame['timestamp'] = parse_timestamps(t_frame['timestamp'].values)
+    return t_frame
 
 
 def read_trade_tar(path: Union[str, IO], with_detailed: bool = False, with_symbol: bool = True,
@@ -92,19 +121,10 @@ def read_trade_tar(path: Union[str, IO], with_detailed: bool = False, with_symbo
                    "grossValue", "homeNotional", "foreignNotional"]
     if with_symbol:
         usecols.append("symbol")
-    use_dtypes = {}
-    for col in usecols:
-        if col in ('side', "tickDirection"):
-            continue
-        use_dtypes[col] = dtypes_trades[col]
-    t_frame = pandas.read_csv(path, compression='gzip',
-                              parse_dates=[0],
-                              infer_datetime_format=True,
-                              usecols=usecols,
-                              dtype=use_dtypes,
-                              converters={'side': _side_converters,
-                                          'tickDirection': _tick_direction},
-                              engine='c', low_memory=True, date_parser=_date_parse)
+    t_frame = _read_tar(path, usecols, dtypes_trades)
+    t_frame['side'] = map_category(t_frame['side'], SIDE_VALUES, SIDE.UNKNOWN.value)
+    t_frame['tickDirection'] = map_category(t_frame['tickDirection'], TICK_DIRECTION_VALUES,
+                                            TICK_DIRECTION.UNKNOWN.value)
     if index:
         t_frame.set_index(index, inplace=True)
     return t_frame
@@ -114,16 +134,7 @@ def read_quote_tar(path: Union[str, IO], with_symbol: bool = True, index: Option
     usecols = ["timestamp", "bidSize", "bidPrice", "askPrice", "askSize"]
     if with_symbol:
         usecols.append("symbol")
-
-    use_dtypes = {}
-    for col in usecols:
-        use_dtypes[col] = dtypes_quote[col]
-    t_frame = pandas.read_csv(path, compression='gzip',
-                              parse_dates=[0],
-                              infer_datetime_format=True,
-                              usecols=usecols,
-                              dtype=use_dtypes,
-                              engine='c', low_memory=True, date_parser=_date_parse)
+    t_frame = _read_tar(path, usecols, dtypes_quote)
     if index:
         t_frame.set_index(index, inplace=True)
     return t_frame
@@ -138,6 +149,107 @@ def trades_to_1m_kline(frame: pandas.DataFrame) -> pandas.DataFrame:
     return kline
 
 
+MINUTE_NS = 60 * 10 ** 9
+
+DAY_NS = 24 * 60 * MINUTE_NS
+
+KLINE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'turnover']
+
+
+class KlineAggregator():
+    """
+    Aggregate the trades of a symbol chunk by chunk to the same 1 minute
+    klines as :func:`trades_to_1m_kline` applied on the trades of every
+    day, a kline belongs to the day its minute starts in. The minutes
+    without a trade in a day are forward filled.
+
+    Only the trades of the minute still open and the last kline are kept
+    between the chunks, the klines completed are returned by :meth:`update`
+    and the last one by :meth:`close`.
+    """
+
+    def __init__(self) -> None:
+        self._tail: Optional[Tuple[np.ndarray, ...]] = None
+        self._last: Optional[Tuple[int, int, float, float, float, float]] = None
+        self._tz: Any = None
+        self._name: Optional[str] = None
+
+    @staticmethod
+    def _buckets(timestamps: np.ndarray) -> np.ndarray:
+        # the end of the minute interval of every trade
+        if KLINE_SIDE_CLOSED == 'right':
+            return -(-timestamps // MINUTE_NS) * MINUTE_NS
+        return timestamps // MINUTE_NS * MINUTE_NS + MINUTE_NS
+
+    def update(self, trades: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        :param trades: the trades in time order with the `price`,
+            `homeNotional` and `foreignNotional` columns.
+        """
+        self._tz = trades.index.tz
+        self._name = trades.index.name
+        columns: Tuple[np.ndarray, ...] = (
+            trades.index.asi8, trades['price'].values,
+            np.nan_to_num(trades['homeNotional'].values), np.nan_to_num(trades['foreignNotional'].values),
+        )
+        if self._tail is not None:
+            columns = tuple(np.concatenate((tail, column)) for tail, column in zip(self._tail, columns))
+        buckets = self._buckets(columns[0])
+        # the trades of the last minute may go on in the next chunk
+        open_start = np.searchsorted(buckets, buckets[-1]) if len(buckets) else 0
+        self._tail = tuple(column[open_start:] for column in columns)
+        return self._klines(tuple(column[:open_start] for column in columns), buckets[:open_start])
+
+    def close(self) -> pandas.DataFrame:
+        if self._tail is None:
+            return self._frame(np.empty(0, dtype=np.int64), *[np.empty(0)] * len(KLINE_COLUMNS))
+        columns, self._tail = self._tail, None
+        return self._klines(columns, self._buckets(columns[0]))
+
+    def _klines(self, columns: Tuple[np.ndarray, ...], buckets: np.ndarray) -> pandas.DataFrame:
+        _, price, home, foreign = columns
+        if not len(buckets):
+            return self._frame(np.empty(0, dtype=np.int64), *[np.empty(0)] * len(KLINE_COLUMNS))
+        new_group = np.concatenate(([True], buckets[1:] != buckets[:-1]))
+        starts = np.flatnonzero(new_group)
+        ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+        # bincount sums in the order of the trades like pandas does
+        groups = np.cumsum(new_group) - 1
+        bucket = buckets[starts]
+        values = [price[starts], np.maximum.reduceat(price, starts), np.minimum.reduceat(price, starts),
+                  price[ends], np.bincount(groups, home), np.bincount(groups, foreign)]
+        day = (bucket - MINUTE_NS) // DAY_NS
+
+        if self._last is not None:
+            # the last kline returned fills the minutes before the first one
+            last_bucket, last_day, *last_prices = self._last
+            bucket = np.concatenate(([last_bucket], bucket))
+            day = np.concatenate(([last_day], day))
+            values = [np.concatenate(([value], column)) for value, column in zip(last_prices + [0., 0.], values)]
+
+        repeats = np.ones(len(bucket), dtype=np.int64)
+        repeats[:-1] = np.where(day[1:] == day[:-1], (bucket[1:] - bucket[:-1]) // MINUTE_NS, 1)
+        rows = np.repeat(np.arange(len(bucket)), repeats)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        out_bucket = bucket[rows] + offsets * MINUTE_NS
+        filled = offsets > 0
+        out = [column[rows] for column in values]
+        out[4] = np.where(filled, 0., out[4])
+        out[5] = np.where(filled, 0., out[5])
+        if self._last is not None:
+            out_bucket = out_bucket[1:]
+            out = [column[1:] for column in out]
+        self._last = (int(bucket[-1]), int(day[-1]), out[0][-1], out[1][-1], out[2][-1], out[3][-1])
+        return self._frame(out_bucket, *out)
+
+    def _frame(self, buckets: np.ndarray, *values: np.ndarray) -> pandas.DataFrame:
+        labels = buckets if KLINE_SIDE_LABEL == 'right' else buckets - MINUTE_NS
+        index = pandas.DatetimeIndex(labels, name=self._name).tz_localize('UTC')
+        if self._tz is not None:
+            index = index.tz_convert(self._tz)
+        return pandas.DataFrame(dict(zip(KLINE_COLUMNS, values)), index=index, columns=KLINE_COLUMNS)
+
+
 def kline_from_list_of_dict(obj: List[dict]) -> pandas.DataFrame:
     """dict format
     {'timestamp': '2019-03-02T02:05:00.000Z',
@@ -186,15 +298,27 @@ def fullfill_1m_kline_with_start_end(frame: pandas.DataFrame, start: datetime.da
     return outcome
 
 
-def classify_df(df: pandas.DataFrame, column: str, delete_column: bool = True) -> pandas.DataFrame:
-    out = {}
-    uniques = df[column].unique()
-    for one in uniques:
-        new = df[df[column] == one]
-        if delete_column:
-            del new[column]
-        out[one] = new
-    return out
+def classify_df(df: pandas.DataFrame, column: str, delete_column: bool = True) -> Dict[Any, pandas.DataFrame]:
+    """
+    Split the rows of the frame by the values of the column, in the order
+    the values first appear. The rows keep their order in every part.
+
+    The rows are sorted by the codes of the values with one stable sort
+    and gathered once, every part is a slice of the sorted frame.
+    """
+    codes, uniques = pandas.factorize(df[column].values)
+    valid = codes >= 0
+    if not valid.all():
+        # the rows with a missing value belong to no part
+        codes = np.where(valid, codes, len(uniques))
+    order = np.argsort(codes, kind='mergesort')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(uniques))[:len(uniques)])))
+    if delete_column:
+        columns = [i for i, name in enumerate(df.columns) if name != column]
+        ordered = df.iloc[order, columns]
+    else:
+        ordered = df.iloc[order]
+    return {key: ordered.iloc[bounds[i]:bounds[i + 1]] for i, key in enumerate(uniques)}
 
 
 def check_1m_data_integrity(df: pandas.DataFrame, start: datetime.datetime, end: datetime.datetime) -> bool:
@@ -22,15 +22,21 @@
 # SOFTWARE.
 #
 import asyncio
+import datetime
 import ssl
-from typing import TYPE_CHECKING, Dict, List, Optional, TypeVar, ValuesView
+from typing import (
+    TYPE_CHECKING, Dict, List, Optional, TypeVar, Union, ValuesView,
+)
 
+import numpy
 import pandas
 from aiohttp import ClientSession, TCPConnector, TraceConfig  # type:ignore
 from aiohttp.helpers import sentinel
 from logbook import Logger
 from monkq.assets.account import FutureAccount, RealFutureAccount
-from monkq.assets.instrument import FutureInstrument, Instrument
+from monkq.assets.instrument import (
+    FutureInstrument, Instrument, PerpetualInstrument,
+)
 from monkq.assets.order import ORDER_T, FutureLimitOrder, FutureMarketOrder
 from monkq.exchange.base import BaseExchange, BaseSimExchange
 from monkq.exchange.base.info import ExchangeInfo
@@ -41,6 +47,8 @@ from monkq.exchange.bitmex.data.loader import BitmexDataloader
 from monkq.exchange.bitmex.data.utils import kline_from_list_of_dict
 from monkq.exchange.bitmex.http import BitMexHTTPInterface
 from monkq.exchange.bitmex.websocket import BitmexWebsocket
+from monkq.funding import FundingSchedule
+from monkq.liquidation import LiquidationEngine
 from monkq.tradecounter import TradeCounter
 from monkq.utils.as_dict import base_order_to_dict
 from monkq.utils.id import gen_unique_id
@@ -62,10 +70,26 @@ bitmex_info = ExchangeInfo(name="bitmex",
 class BitmexSimulateExchange(BaseSimExchange):
     def __init__(self, context: "Context", name: str, exchange_setting: dict) -> None:
         super(BitmexSimulateExchange, self).__init__(context, name, exchange_setting)
-        data_dir = context.settings.DATA_DIR  # type:ignore
-        self._data = BitmexDataloader(data_dir)
+        settings = context.settings
+        data_dir = settings.DATA_DIR  # type:ignore
+        warmup = settings.DATA_WARMUP  # type:ignore
+        if warmup is None:
+            start, end = None, None
+        else:
+            start = settings.START_TIME - datetime.timedelta(minutes=warmup)  # type:ignore
+            end = settings.END_TIME  # type:ignore
+        self._data = BitmexDataloader(data_dir, exchange_setting.get('DATA_CACHE_SIZE'),
+                                      exchange_setting.get('DATA_CACHE_PINNED', ()), start, end)
         self._data.load_instruments(self)
         self._trade_counter: TradeCounter = context.trade_counter
+        self._liquidation = LiquidationEngine(self, self._trade_counter)
+        self._funding: Optional[FundingSchedule] = None
+        # the accounts trading on the exchange by id
+        self._accounts: Dict[int, FutureAccount] = {}
+        # the last prices of the bar at `_prices_ns`, valuing the positions
+        # asks for them many times in a bar
+        self._prices: Dict[str, float] = {}
+        self._prices_ns: Optional[int] = None
 
     def all_data(self, instrument: Instrument) -> pandas.DataFrame:
         return self._data.all_data(instrument.symbol)
@@ -74,10 +98,20 @@ class BitmexSimulateExchange(BaseSimExchange):
         return
 
     async def get_last_price(self, instrument: FutureInstrument) -> float:
-        return self._data.get_last_price(instrument.symbol, self.context.now)
+        return self.last_price(instrument)
 
     def last_price(self, instrument: FutureInstrument) -> float:
-        return self._data.get_last_price(instrument.symbol, self.context.now)
+        now_ns = self.context.now_ns
+        if now_ns != self._prices_ns:
+            self._prices.clear()
+            self._prices_ns = now_ns
+        price = self._prices.get(instrument.symbol)
+        if price is None:
+            price = self._prices[instrument.symbol] = self._data.get_last_price(instrument.symbol, self.context.now)
+        return price
+
+    def last_bar(self, instrument: FutureInstrument) -> Optional[numpy.ndarray]:
+        return self._data.get_last_bar(instrument.symbol, self.context.now_ns)
 
     def exchange_info(self) -> ExchangeInfo:
         return bitmex_info
@@ -124,19 +158,58 @@ class BitmexSimulateExchange(BaseSimExchange):
         active_instruments = self._data.active_instruments(self.context.now)
         return active_instruments.values()
 
-    async def get_kline(self, instrument: FutureInstrument,
-                        count: int = 100, including_now: bool = False) -> pandas.DataFrame:
+    async def get_kline(self, instrument: FutureInstrument, count: int = 100, including_now: bool = False,
+                        raw: bool = False) -> Union[pandas.DataFrame, numpy.ndarray]:
+        if raw:
+            return self.get_kline_array(instrument, count)
         return self._data.get_kline(instrument.symbol, self.context.now, count)
 
+    def get_kline_array(self, instrument: FutureInstrument, count: int = 100) -> numpy.ndarray:
+        return self._data.get_kline_array(instrument.symbol, self.context.now_ns, count)
+
     async def get_instrument(self, symbol: str) -> Instrument:
         return self._data.instruments[symbol]
 
     def match_open_orders(self) -> None:
-        self._trade_counter.match(self.context.now)
+        # the positions carried into the bar are liquidated before the
+        # orders are matched, the positions opened by this bar have not
+        # lived through its low and high
+        self._liquidation.check(self.context.now_ns)
+        self._funding_schedule().accrue(self._accounts.values(), self.context.now_ns)
+        if self._trade_counter.open_orders():
+            self._trade_counter.match(self.context.now)
+
+    def positions_changed(self, account: FutureAccount) -> None:
+        self._accounts[id(account)] = account
+        self._liquidation.positions_changed(account)
+
+    def _funding_schedule(self) -> FundingSchedule:
+        if self._funding is None:
+            symbols = [symbol for symbol, instrument in self._data.instruments.items()
+                       if isinstance(instrument, PerpetualInstrument)]
+            self._funding = FundingSchedule(self._data.funding_rates(symbols))
+        return self._funding
+
+    def funding_rate(self, instrument: FutureInstrument) -> float:
+        return self._funding_schedule().rate(instrument.symbol, self.context.now_ns)
 
     def get_open_orders(self, account: FutureAccount) -> List[ORDER_T]:
         return list(self._trade_counter.open_orders())
 
+    def orders_version(self) -> int:
+        return self._trade_counter.version
+
+    def price_version(self) -> int:
+        return self.context.now_ns
+
+    def preload(self) -> None:
+        settings = self.context.settings
+        self._data.preload(settings.START_TIME, settings.END_TIME)  # type:ignore
+
+    def share_data(self, other: BaseSimExchange) -> None:
+        assert isinstance(other, BitmexSimulateExchange)
+        self._data.share_kline(other._data)
+
 
 class BitmexExchange(BaseExchange):
     INSTRUMENT_KEY_MAP = {
@@ -0,0 +1,120 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy
+import pandas
+from logbook import Logger
+
+from .log import core_log_group
+
+logger = Logger('funding')
+core_log_group.add_logger(logger)
+
+
+class FundingSchedule():
+    """
+    The funding rates of the perpetual contracts of an exchange on one time
+    axis. `times` are the funding timestamps of all the symbols in
+    nanoseconds and `rates` is a symbol by timestamp matrix, 0 where a
+    symbol has no funding at a timestamp.
+
+    :param rates: the funding rate history of every symbol, indexed by the
+        funding timestamp.
+    """
+
+    def __init__(self, rates: Dict[str, pandas.Series]) -> None:
+        self.rows = {symbol: row for row, symbol in enumerate(rates)}
+        if rates:
+            frame = pandas.DataFrame(rates).sort_index()
+            self.times = frame.index.values.view(numpy.int64)
+            self.rates = numpy.nan_to_num(frame.values.T)
+        else:
+            self.times = numpy.empty(0, dtype=numpy.int64)
+            self.rates = numpy.empty((0, 0))
+        self._symbol_rates = {}
+        for symbol, series in rates.items():
+            series = series.sort_index()
+            self._symbol_rates[symbol] = (series.index.values.view(numpy.int64), series.values)
+        self._cursor: Optional[int] = None
+
+    def rate(self, symbol: str, timestamp_ns: int) -> float:
+        """
+        The rate of the next funding of the symbol after the timestamp, it
+        is known ahead as on the exchange. The last rate once the history
+        ends and 0 without history.
+        """
+        times, rates = self._symbol_rates.get(symbol, (None, None))
+        if times is None or not len(times):
+            return 0.
+        index = numpy.searchsorted(times, timestamp_ns, side='right')
+        return float(rates[min(index, len(times) - 1)])
+
+    def due(self, timestamp_ns: int) -> slice:
+        """
+        The columns of the fundings since the last call up to the timestamp
+        included. The first call only takes a funding right at the
+        timestamp.
+        """
+        end = int(numpy.searchsorted(self.times, timestamp_ns, side='right'))
+        if self._cursor is None:
+            self._cursor = int(numpy.searchsorted(self.times, timestamp_ns, side='left'))
+        start, self._cursor = self._cursor, end
+        return slice(start, end)
+
+    def accrue(self, accounts: Iterable[Any], timestamp_ns: int) -> float:
+        """
+        Pay the fundings due at the timestamp for every open position of the
+        accounts on a perpetual contract, long positions pay positive rates
+        to short ones, and return the total paid.
+
+        The payments are the market value of the positions by the sum of
+        the rates due, computed for all the positions at once and summed
+        per account.
+        """
+        due = self.due(timestamp_ns)
+        if due.start == due.stop:
+            return 0.
+        accounts = list(accounts)
+        rows: List[int] = []
+        values: List[float] = []
+        owners: List[int] = []
+        for owner, account in enumerate(accounts):
+            for position in account.positions.values():
+                row = self.rows.get(position.instrument.symbol)
+                if row is None or position.quantity == 0:
+                    continue
+                rows.append(row)
+                values.append(position.quantity * position.instrument.last_price)
+                owners.append(owner)
+        if not rows:
+            return 0.
+        rates = self.rates[rows, due].sum(axis=1)
+        payments = numpy.bincount(owners, weights=numpy.array(values) * rates, minlength=len(accounts))
+        for account, payment in zip(accounts, payments):
+            if payment:
+                account.wallet_balance -= payment
+                account.positions_changed()
+        logger.debug("Pay the funding of {} positions, {} in total", len(rows), payments.sum())
+        return float(payments.sum())
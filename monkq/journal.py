@@ -0,0 +1,232 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from typing import Any, Dict, List
+
+import numpy
+import pandas
+from monkq.assets.const import SIDE
+from monkq.assets.order import (
+    BaseOrder, LimitOrder, MarketOrder, StopLimitOrder, StopMarketOrder,
+)
+from monkq.assets.trade import Trade
+from monkq.utils.timefunc import datetime_to_ns
+
+# the order types in the order journal, by code
+ORDER_TYPES = ('limit', 'market', 'stop_limit', 'stop_market', 'unknown')
+# the states of the orders in the order journal, by code
+ORDER_STATES = ('not_traded', 'partly_traded', 'full_traded', 'cancelled')
+
+ID_DTYPE = 'S36'  # an uuid4 string
+
+
+class Journal():
+    """
+    An append only table of scalar columns. The rows live in one NumPy
+    structured array growing geometrically, and strings like the symbols
+    are kept once in `strings` and stored as their index.
+
+    Only the filled rows are pickled, so a journal of millions of rows is
+    written in one memory copy.
+    """
+    dtype: numpy.dtype
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._rows = numpy.zeros(capacity, dtype=self.dtype)
+        self._size = 0
+        self._cleared = 0
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def total(self) -> int:
+        """
+        The rows appended, including the rows dropped by :meth:`clear`.
+        """
+        return self._cleared + self._size
+
+    def clear(self) -> None:
+        """
+        Drop the rows once they are written somewhere else. The memory of
+        the rows is reused by the next appends.
+        """
+        self._cleared += self._size
+        self._size = 0
+
+    @property
+    def rows(self) -> numpy.ndarray:
+        rows = self._rows[:self._size]
+        rows.flags.writeable = False
+        return rows
+
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def _append(self, row: tuple) -> None:
+        if self._size == len(self._rows):
+            grown = numpy.zeros(max(len(self._rows) * 2, 1), dtype=self.dtype)
+            grown[:self._size] = self._rows
+            self._rows = grown
+        self._rows[self._size] = row
+        self._size += 1
+
+    def _decode(self, column: str) -> numpy.ndarray:
+        return numpy.array(self.strings, dtype=object)[self.rows[column]] if len(self) \
+            else numpy.empty(0, dtype=object)
+
+    def to_frame(self) -> pandas.DataFrame:
+        raise NotImplementedError()
+
+    def __getstate__(self) -> dict:
+        return {'rows': self._rows[:self._size].copy(), 'strings': self.strings}
+
+    def __setstate__(self, state: dict) -> None:
+        self._rows = state['rows']
+        self._size = len(self._rows)
+        self._cleared = 0
+        self.strings = state['strings']
+        self._string_ids = {value: string_id for string_id, value in enumerate(self.strings)}
+
+
+class TradeJournal(Journal):
+    dtype = numpy.dtype([
+        ('trade_ns', numpy.int64),
+        ('exec_price', numpy.float64),
+        ('exec_quantity', numpy.float64),
+        ('commission', numpy.float64),
+        ('symbol', numpy.int32),
+        ('order_id', ID_DTYPE),
+        ('trade_id', ID_DTYPE),
+    ])
+
+    def append(self, trade: Trade, now_ns: int) -> None:
+        """
+        :param now_ns: the time of the trade if it has no `trade_datetime`.
+        """
+        trade_ns = now_ns if trade.trade_datetime is None else datetime_to_ns(trade.trade_datetime)
+        self._append((trade_ns, trade.exec_price, trade.exec_quantity, trade.commission,
+                      self._intern(trade.instrument.symbol), trade.order_id.encode(), trade.trade_id.encode()))
+
+    def to_frame(self) -> pandas.DataFrame:
+        """
+        The trades with the columns of :meth:`Trade.to_dict`.
+        """
+        rows = self.rows
+        return pandas.DataFrame({
+            'exec_price': rows['exec_price'],
+            'exec_quantity': rows['exec_quantity'],
+            'trade_id': rows['trade_id'].astype(str),
+            'trade_datetime': pandas.to_datetime(rows['trade_ns'], utc=True),
+            'side': numpy.where(rows['exec_quantity'] > 0, SIDE.BUY.name, SIDE.SELL.name),
+            'symbol': self._decode('symbol'),
+            'order_id': rows['order_id'].astype(str),
+            'value': rows['exec_quantity'] * rows['exec_price'],
+            'commission': rows['commission'],
+        })
+
+
+class OrderJournal(Journal):
+    """
+    A row is appended with the state of an order when it is submitted,
+    traded and cancelled, so the last row of an order is its final state.
+    """
+    dtype = numpy.dtype([
+        ('submit_ns', numpy.int64),
+        ('update_ns', numpy.int64),
+        ('quantity', numpy.float64),
+        ('traded_quantity', numpy.float64),
+        ('price', numpy.float64),
+        ('order_type', numpy.int8),
+        ('state', numpy.int8),
+        ('symbol', numpy.int32),
+        ('text', numpy.int32),
+        ('order_id', ID_DTYPE),
+    ])
+
+    def __init__(self, capacity: int = 1024) -> None:
+        super(OrderJournal, self).__init__(capacity)
+        # the orders submitted, including the ones dropped by `clear`
+        self.submitted = 0
+
+    @staticmethod
+    def _order_type(order: Any) -> int:
+        for code, order_cls in enumerate((LimitOrder, MarketOrder, StopLimitOrder, StopMarketOrder)):
+            if isinstance(order, order_cls):
+                return code
+        return len(ORDER_TYPES) - 1
+
+    @staticmethod
+    def _state(order: BaseOrder, cancelled: bool) -> int:
+        if cancelled:
+            return ORDER_STATES.index('cancelled')
+        if order.traded_quantity == 0:
+            return ORDER_STATES.index('not_traded')
+        if order.traded_quantity == order.quantity:
+            return ORDER_STATES.index('full_traded')
+        return ORDER_STATES.index('partly_traded')
+
+    def append(self, order: BaseOrder, now_ns: int, cancelled: bool = False) -> None:
+        """
+        :param now_ns: the time of the change, and the time the order is
+            submitted if it has no `submit_datetime`.
+        :param cancelled: whether the order is cancelled now.
+        """
+        price = order.price if isinstance(order, LimitOrder) else numpy.nan
+        submit_ns = now_ns if order.submit_datetime is None else datetime_to_ns(order.submit_datetime)
+        state = self._state(order, cancelled)
+        if state == ORDER_STATES.index('not_traded'):
+            self.submitted += 1
+        self._append((submit_ns, now_ns, order.quantity, order.traded_quantity, price, self._order_type(order),
+                      state, self._intern(order.instrument.symbol), self._intern(order.text),
+                      order.order_id.encode()))
+
+    def to_frame(self) -> pandas.DataFrame:
+        rows = self.rows
+        return pandas.DataFrame({
+            'order_id': rows['order_id'].astype(str),
+            'submit_datetime': pandas.to_datetime(rows['submit_ns'], utc=True),
+            'update_datetime': pandas.to_datetime(rows['update_ns'], utc=True),
+            'symbol': self._decode('symbol'),
+            'order_type': numpy.array(ORDER_TYPES, dtype=object)[rows['order_type']],
+            'quantity': rows['quantity'],
+            'traded_quantity': rows['traded_quantity'],
+            'price': rows['price'],
+            'state': numpy.array(ORDER_STATES, dtype=object)[rows['state']],
+            'text': self._decode('text'),
+        })
+
+    def __getstate__(self) -> dict:
+        state = super(OrderJournal, self).__getstate__()
+        state['submitted'] = self.submitted
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        super(OrderJournal, self).__setstate__(state)
+        self.submitted = state['submitted']
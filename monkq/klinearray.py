@@ -0,0 +1,314 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy
+import pandas
+from monkq.exception import DataError
+from monkq.lazyhdf import LazyHDFTableStore
+from monkq.utils.filefunc import assure_dir
+from monkq.utils.i18n import _
+
+KLINE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'turnover']
+
+# column positions of KLINE_COLUMNS in KlineArray.values
+OPEN, HIGH, LOW, CLOSE, VOLUME, TURNOVER = range(len(KLINE_COLUMNS))
+
+ONE_MINUTE_NS = 60 * 10 ** 9
+
+MANIFEST_FILE_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+class KlineArray():
+    """
+    A gap-free kline stored as a 2d float64 array with the columns of
+    `KLINE_COLUMNS`, plus the epoch of the first bar.
+
+    Because every bar is exactly `step_ns` after the previous one, finding
+    the bar of a timestamp is integer arithmetic instead of an index lookup.
+    """
+
+    def __init__(self, values: numpy.ndarray, start_ns: int, step_ns: int = ONE_MINUTE_NS) -> None:
+        assert values.ndim == 2 and values.shape[1] == len(KLINE_COLUMNS)
+        self.values = values
+        self.values.flags.writeable = False
+        self.start_ns = start_ns
+        self.step_ns = step_ns
+        self.length = len(values)
+
+    @classmethod
+    def from_frame(cls, frame: pandas.DataFrame, step_ns: int = ONE_MINUTE_NS) -> "KlineArray":
+        """
+        The frame must be gap-free and hold exactly the `KLINE_COLUMNS`.
+        The values are shared with the frame whenever pandas allows it.
+        """
+        assert list(frame.columns) == KLINE_COLUMNS
+        start_ns = int(frame.index.asi8[0]) if len(frame) else 0
+        return cls(frame.values, start_ns, step_ns)
+
+    def index_of(self, timestamp_ns: int) -> int:
+        """
+        The position of the bar which covers the timestamp. It may be out of
+        the array range.
+        """
+        return (timestamp_ns - self.start_ns) // self.step_ns
+
+    def bar(self, timestamp_ns: int) -> Optional[numpy.ndarray]:
+        index = self.index_of(timestamp_ns)
+        if 0 <= index < self.length:
+            return self.values[index]
+        return None
+
+    def last_price(self, timestamp_ns: int) -> Optional[float]:
+        index = self.index_of(timestamp_ns)
+        if 0 <= index < self.length:
+            return self.values.item(index, CLOSE)
+        return None
+
+    def window(self, timestamp_ns: int, count: int) -> numpy.ndarray:
+        """
+        The last `count` bars up to the bar which covers the timestamp, the
+        same bars as :func:`~monkq.utils.dataframe.kline_count_window`. It is
+        a read-only view of `values`, so nothing is copied.
+        """
+        end = self.index_of(timestamp_ns) + 1
+        start = max(end - count, 0)
+        return self.values[start:max(end, 0)]
+
+
+def normalize_kline_frame(frame: pandas.DataFrame, freq: str = '1min') -> pandas.DataFrame:
+    """
+    Make the kline frame gap-free with the columns in `KLINE_COLUMNS` order
+    and a single float block, so its values can back a :class:`KlineArray`
+    without another copy.
+    """
+    if len(frame) and frame.index.freq is None:
+        frame = frame.asfreq(freq)
+    if list(frame.columns) != KLINE_COLUMNS:
+        frame = frame.reindex(columns=KLINE_COLUMNS)
+    values = frame.values.astype(numpy.float64, copy=False)
+    return pandas.DataFrame(values, index=frame.index, columns=KLINE_COLUMNS)
+
+
+def read_kline_range(hdf_path: str, key: str, start_ns: Optional[int], end_ns: Optional[int],
+                     step_ns: int = ONE_MINUTE_NS) -> pandas.DataFrame:
+    """
+    Read the bars of a kline table between `start_ns` and `end_ns`
+    inclusively, `None` means unbounded.
+
+    A table format table is read with a `where` clause on the index. A fixed
+    format table can only be read by row positions, which are computed from
+    its first bar when the table is gap-free, otherwise the whole table is
+    read and sliced.
+    """
+    start = None if start_ns is None else pandas.Timestamp(start_ns, tz='UTC')
+    end = None if end_ns is None else pandas.Timestamp(end_ns, tz='UTC')
+    with pandas.HDFStore(hdf_path, 'r') as store:
+        storer = store.get_storer(key)
+        if storer.is_table:
+            where = []
+            if start is not None:
+                where.append('index >= start')
+            if end is not None:
+                where.append('index <= end')
+            return store.select(key, where=where or None)
+
+        nrows = storer.shape[0]
+        if nrows == 0:
+            return store.select(key)
+        first_ns = store.select(key, start=0, stop=1).index.asi8[0]
+        last_ns = store.select(key, start=nrows - 1, stop=nrows).index.asi8[0]
+        if last_ns - first_ns != step_ns * (nrows - 1):
+            return store.select(key).loc[start:end]
+        begin = 0 if start_ns is None else max(-((first_ns - start_ns) // step_ns), 0)
+        stop = nrows if end_ns is None else min((end_ns - first_ns) // step_ns + 1, nrows)
+        return store.select(key, start=begin, stop=max(stop, begin))
+
+
+class LazyKlineArrayStore(LazyHDFTableStore):
+    """
+    A :class:`LazyHDFTableStore` for kline tables which also serves each
+    table as a :class:`KlineArray` sharing memory with the cached frame.
+
+    With `start_ns` or `end_ns` only the bars in that range are loaded.
+    """
+
+    def __init__(self, hdf_path: str, max_bytes: Optional[int] = None, pinned: Iterable[str] = (),
+                 start_ns: Optional[int] = None, end_ns: Optional[int] = None):
+        super(LazyKlineArrayStore, self).__init__(hdf_path, max_bytes, pinned)
+        self._arrays: Dict[str, KlineArray] = dict()
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+
+    def _load(self, key: str) -> pandas.DataFrame:
+        if self.start_ns is None and self.end_ns is None:
+            frame = super(LazyKlineArrayStore, self)._load(key)
+        else:
+            try:
+                frame = read_kline_range(self.hdf_path, key, self.start_ns, self.end_ns)
+            except KeyError:
+                raise DataError(_("Not found hdf data {} in {}").format(key, self.hdf_path))
+        return normalize_kline_frame(frame)
+
+    def _evict(self, key: str) -> None:
+        super(LazyKlineArrayStore, self)._evict(key)
+        self._arrays.pop(key, None)
+
+    def clear(self) -> None:
+        super(LazyKlineArrayStore, self).clear()
+        self._arrays.clear()
+
+    def ensure_start(self, start_ns: int) -> bool:
+        """
+        Make sure the bars from `start_ns` are loaded. If they are before the
+        loaded range, the range is extended and the cached tables are
+        dropped to be read again. Return whether it happened.
+        """
+        if self.start_ns is None or start_ns >= self.start_ns:
+            return False
+        self.start_ns = start_ns
+        self.clear()
+        return True
+
+    def get_array(self, key: str) -> KlineArray:
+        # always go through `get`, so the table is marked as recently used
+        frame = self.get(key)
+        kline = self._arrays.get(key)
+        if kline is None:
+            kline = KlineArray.from_frame(frame)
+            self._arrays[key] = kline
+        return kline
+
+
+def _source_signature(hdf_path: str) -> Dict[str, int]:
+    stat = os.stat(hdf_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def convert_kline_hdf(hdf_path: str, output_dir: str) -> Dict[str, dict]:
+    """
+    Write every kline table of the hdf file into `output_dir` as a ``.npy``
+    array which :class:`MemmapKlineStore` can map without reading it, and
+    describe them in a manifest. The manifest is written last, so an
+    interrupted conversion never looks complete.
+    """
+    assure_dir(output_dir)
+    keys = LazyHDFTableStore(hdf_path).keys()
+
+    tables = dict()
+    for key in keys:
+        kline = KlineArray.from_frame(normalize_kline_frame(pandas.read_hdf(hdf_path, key)))
+        filename = '{}.npy'.format(key)
+        tmp_path = os.path.join(output_dir, filename + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            numpy.save(f, numpy.ascontiguousarray(kline.values))
+        os.replace(tmp_path, os.path.join(output_dir, filename))
+        tables[key] = {'file': filename, 'start_ns': kline.start_ns,
+                       'step_ns': kline.step_ns, 'length': kline.length}
+
+    manifest = {'version': MANIFEST_VERSION, 'columns': KLINE_COLUMNS,
+                'source': _source_signature(hdf_path), 'tables': tables}
+    tmp_manifest = os.path.join(output_dir, MANIFEST_FILE_NAME + '.tmp')
+    with open(tmp_manifest, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(tmp_manifest, os.path.join(output_dir, MANIFEST_FILE_NAME))
+    return tables
+
+
+class MemmapKlineStore():
+    """
+    Serve the kline tables converted by :func:`convert_kline_hdf`. The
+    arrays are memory mapped read-only, so opening a table costs nothing
+    and concurrent backtests share the pages through the OS page cache.
+
+    It has the same `get` and `get_array` as :class:`LazyKlineArrayStore`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE_NAME)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != MANIFEST_VERSION or self.manifest.get('columns') != KLINE_COLUMNS:
+            raise DataError(_("Unsupported kline manifest in {}").format(directory))
+        self._arrays: Dict[str, KlineArray] = dict()
+        self._cached: Dict[str, pandas.DataFrame] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def available(directory: str) -> bool:
+        return os.path.isfile(os.path.join(directory, MANIFEST_FILE_NAME))
+
+    def is_fresh(self, hdf_path: str) -> bool:
+        """
+        Whether the hdf file is still the one the arrays were converted from.
+        """
+        return os.path.exists(hdf_path) and self.manifest['source'] == _source_signature(hdf_path)
+
+    @property
+    def cached_table(self) -> List[str]:
+        return list(self._arrays.keys())
+
+    def keys(self) -> List[str]:
+        return list(self.manifest['tables'].keys())
+
+    def stats(self) -> dict:
+        """
+        The mapped tables don't hold memory of the process, the sizes are
+        what the OS may page in for them.
+        """
+        sizes = {key: int(kline.values.nbytes) for key, kline in self._arrays.items()}
+        return {'tables': sizes, 'total_bytes': sum(sizes.values()), 'max_bytes': None,
+                'pinned': [], 'hits': self.hits, 'misses': self.misses, 'evictions': 0}
+
+    def ensure_start(self, start_ns: int) -> bool:
+        # every bar is mapped already
+        return False
+
+    def get_array(self, key: str) -> KlineArray:
+        kline = self._arrays.get(key)
+        if kline is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            table = self.manifest['tables'].get(key)
+            if table is None:
+                raise DataError(_("Not found kline data {} in {}").format(key, self.directory))
+            values = numpy.load(os.path.join(self.directory, table['file']), mmap_mode='r')
+            kline = KlineArray(values, table['start_ns'], table['step_ns'])
+            self._arrays[key] = kline
+        return kline
+
+    def get(self, key: str) -> pandas.DataFrame:
+        frame = self._cached.get(key)
+        if frame is None:
+            kline = self.get_array(key)
+            index = pandas.date_range(start=pandas.Timestamp(kline.start_ns, tz='UTC'), periods=kline.length,
+                                      freq=pandas.Timedelta(kline.step_ns, 'ns'))
+            frame = pandas.DataFrame(kline.values, index=index, columns=KLINE_COLUMNS, copy=False)
+            self._cached[key] = frame
+        return frame
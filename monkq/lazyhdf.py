@@ -22,7 +22,8 @@
 # SOFTWARE.
 #
 
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
 
 import pandas
 from monkq.exception import DataError
@@ -30,21 +31,91 @@ from monkq.utils.i18n import _
 
 
 class LazyHDFTableStore():
-    def __init__(self, hdf_path: str):
+    """
+    Load the tables of a hdf file on first use and keep them in memory.
+
+    With `max_bytes` the cached tables are held within that budget by
+    evicting the least recently used ones. The pinned tables are never
+    evicted, and the table just loaded is kept even if it alone is over
+    the budget.
+    """
+
+    def __init__(self, hdf_path: str, max_bytes: Optional[int] = None, pinned: Iterable[str] = ()):
         self.hdf_path = hdf_path
-        self._cached: Dict[str, pandas.DataFrame] = dict()
+        self.max_bytes = max_bytes
+        self._cached: 'OrderedDict[str, pandas.DataFrame]' = OrderedDict()
+        self._sizes: Dict[str, int] = dict()
+        self._pinned: Set[str] = set(pinned)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     @property
     def cached_table(self) -> List[str]:
         return [key.strip('/') for key in self._cached.keys()]
 
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def keys(self) -> List[str]:
+        with pandas.HDFStore(self.hdf_path, 'r') as store:
+            return [key.strip('/') for key in store.keys()]
+
     def get(self, key: str) -> pandas.DataFrame:
         if key in self._cached:
+            self.hits += 1
+            self._cached.move_to_end(key)
             return self._cached[key]
         else:
-            try:
-                df = pandas.read_hdf(self.hdf_path, key)
-                self._cached[key] = df
-                return df
-            except KeyError:
-                raise DataError(_("Not found hdf data {} in {}").format(key, self.hdf_path))
+            self.misses += 1
+            df = self._load(key)
+            self._cached[key] = df
+            self._sizes[key] = int(df.memory_usage(index=True).sum())
+            self._shrink(keep=key)
+            return df
+
+    def pin(self, key: str) -> None:
+        self._pinned.add(key)
+
+    def unpin(self, key: str) -> None:
+        self._pinned.discard(key)
+        self._shrink()
+
+    def clear(self) -> None:
+        self._cached.clear()
+        self._sizes.clear()
+
+    def stats(self) -> dict:
+        return {
+            'tables': {key.strip('/'): size for key, size in self._sizes.items()},
+            'total_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'pinned': sorted(self._pinned),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _shrink(self, keep: Optional[str] = None) -> None:
+        if self.max_bytes is None:
+            return
+        total = self.total_bytes
+        for key in list(self._cached.keys()):
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self._pinned:
+                continue
+            total -= self._sizes[key]
+            self._evict(key)
+
+    def _evict(self, key: str) -> None:
+        del self._cached[key]
+        del self._sizes[key]
+        self.evictions += 1
+
+    def _load(self, key: str) -> pandas.DataFrame:
+        try:
+            return pandas.read_hdf(self.hdf_path, key)
+        except KeyError:
+            raise DataError(_("Not found hdf data {} in {}").format(key, self.hdf_path))
@@ -0,0 +1,184 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import bisect
+import datetime
+import math
+from typing import Any, Dict, List, Tuple
+
+from logbook import Logger
+from monkq.assets.order import FutureLimitOrder, LimitOrder
+from monkq.assets.positions import FutureBasePosition
+from monkq.assets.trade import Trade
+from monkq.klinearray import HIGH, LOW
+from monkq.tradecounter import TradeCounter
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import ns_to_datetime
+
+from .log import core_log_group
+
+logger = Logger('liquidation')
+core_log_group.add_logger(logger)
+
+
+class LiquidationIndex():
+    """
+    The liquidation prices of the positions on one instrument, sorted so
+    the positions reached by a bar are found by bisection.
+
+    A long position is liquidated when the low of the bar reaches its
+    liquidation price, a short one when the high does.
+    """
+
+    def __init__(self, instrument: Any) -> None:
+        self.instrument = instrument
+        self.long_prices: List[float] = []
+        self.long_positions: List[FutureBasePosition] = []
+        self.short_prices: List[float] = []
+        self.short_positions: List[FutureBasePosition] = []
+
+    def __len__(self) -> int:
+        return len(self.long_prices) + len(self.short_prices)
+
+    def _side(self, is_long: bool) -> Tuple[List[float], List[FutureBasePosition]]:
+        if is_long:
+            return self.long_prices, self.long_positions
+        return self.short_prices, self.short_positions
+
+    def add(self, position: FutureBasePosition, price: float, is_long: bool) -> None:
+        prices, positions = self._side(is_long)
+        index = bisect.bisect_right(prices, price)
+        prices.insert(index, price)
+        positions.insert(index, position)
+
+    def remove(self, position: FutureBasePosition, price: float, is_long: bool) -> None:
+        prices, positions = self._side(is_long)
+        index = bisect.bisect_left(prices, price)
+        while positions[index] is not position:
+            index += 1
+        del prices[index]
+        del positions[index]
+
+    def reached(self, low: float, high: float) -> List[Tuple[FutureBasePosition, float]]:
+        """
+        Remove and return the positions liquidated by a bar with their
+        liquidation prices.
+        """
+        # a bar without trades is nan and reaches nothing, bisecting nan
+        # would reach every position
+        if math.isnan(low) or math.isnan(high):
+            return []
+        index = bisect.bisect_left(self.long_prices, low)
+        reached = list(zip(self.long_positions[index:], self.long_prices[index:]))
+        del self.long_prices[index:]
+        del self.long_positions[index:]
+
+        index = bisect.bisect_right(self.short_prices, high)
+        reached.extend(zip(self.short_positions[:index], self.short_prices[:index]))
+        del self.short_prices[:index]
+        del self.short_positions[:index]
+        return reached
+
+
+class LiquidationEngine():
+    """
+    Liquidate the positions of the accounts on a simulated exchange whose
+    liquidation price is reached by the bar.
+
+    The liquidation prices are indexed when the positions of an account
+    change, trades and margin settings, not on every bar. It is exact for
+    isolated positions. The liquidation price of a cross position also
+    moves with the pnl of the other positions of the account, it is taken
+    as it was at the last change.
+    """
+
+    def __init__(self, exchange: Any, trade_counter: TradeCounter) -> None:
+        self.exchange = exchange
+        self.trade_counter = trade_counter
+        self._indexes: Dict[str, LiquidationIndex] = {}
+        # id of the position -> (symbol, liquidation price, is long)
+        self._entries: Dict[int, Tuple[str, float, bool]] = {}
+        # the accounts whose positions changed since the last check, by id
+        self._dirty: Dict[int, Any] = {}
+
+    def positions_changed(self, account: Any) -> None:
+        self._dirty[id(account)] = account
+
+    def _reindex(self, account: Any) -> None:
+        for position in account.positions.values():
+            entry = self._entries.pop(id(position), None)
+            if entry is not None:
+                symbol, price, is_long = entry
+                self._indexes[symbol].remove(position, price, is_long)
+            if not isinstance(position, FutureBasePosition) or position.quantity == 0:
+                continue
+            price = position.liq_price
+            if price <= 0:
+                continue
+            symbol = position.instrument.symbol
+            index = self._indexes.get(symbol)
+            if index is None:
+                index = self._indexes[symbol] = LiquidationIndex(position.instrument)
+            is_long = position.quantity > 0
+            index.add(position, price, is_long)
+            self._entries[id(position)] = (symbol, price, is_long)
+
+    def check(self, now_ns: int) -> None:
+        """
+        :param now_ns: the time of the bar in nanoseconds, the datetime is
+            only built when a position is liquidated.
+        """
+        while self._dirty:
+            _, account = self._dirty.popitem()
+            self._reindex(account)
+
+        for index in self._indexes.values():
+            if not len(index):
+                continue
+            bar = self.exchange.last_bar(index.instrument)
+            if bar is None:
+                continue
+            for position, price in index.reached(bar[LOW], bar[HIGH]):
+                self._entries.pop(id(position))
+                self.liquidate(position, price, ns_to_datetime(now_ns))
+
+    def liquidate(self, position: FutureBasePosition, price: float, now: datetime.datetime) -> None:
+        """
+        Cancel the open limit orders of the position instrument and close
+        the position at its liquidation price.
+        """
+        account = position.account
+        for order in list(self.trade_counter.open_orders()):
+            if order.account is account and isinstance(order, LimitOrder) \
+                    and order.instrument.symbol == position.instrument.symbol:
+                self.trade_counter.cancel_order(order.order_id)
+
+        order = FutureLimitOrder(account=account, order_id=gen_unique_id(), instrument=position.instrument,
+                                 quantity=-position.quantity, price=price, submit_datetime=now,
+                                 text='liquidation')
+        trade = Trade(order, price, order.quantity, gen_unique_id(), now)
+        logger.info("Liquidate a position of {} {} at {}", position.quantity, position.instrument.symbol, price)
+        self.trade_counter.stat.collect_order(order)
+        self.trade_counter.stat.collect_trade(trade)
+        order.deal(trade)
+        self.trade_counter.stat.collect_order(order)
@@ -0,0 +1,295 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import glob
+import os
+import pickle
+import shutil
+from typing import Any, Dict, List, Optional
+
+import pandas
+from logbook import Logger
+from monkq.exception import SettingError
+from monkq.journal import OrderJournal, TradeJournal
+from monkq.utils.as_dict import base_order_to_dict
+from monkq.utils.i18n import _
+
+from .log import core_log_group
+
+logger = Logger('report')
+core_log_group.add_logger(logger)
+
+HDF_EXTENSIONS = ('.h5', '.hdf', '.hdf5')
+
+PARQUET_EXTENSION = '.parquet'
+
+PARQUET_SETTINGS_FILE = 'settings.pkl'
+
+# the width in utf-8 bytes of the string columns in a HDF report table,
+# longer strings are truncated to fit
+HDF_STRING_SIZES = {
+    'symbol': 32,
+    'text': 128,
+    'order_type': 16,
+    'state': 16,
+    'side': 8,
+    'order_id': 36,
+    'trade_id': 36,
+}
+
+COLUMNS_T = Optional[List[str]]
+
+
+def _pyarrow() -> Any:
+    # pyarrow is only needed by the parquet reports
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError(_("The parquet report needs pyarrow, please install it by `pip install pyarrow`"))
+    return pyarrow
+
+
+def _capital_columns(columns: COLUMNS_T) -> COLUMNS_T:
+    if columns is None or 'timestamp' in columns:
+        return columns
+    return ['timestamp'] + list(columns)
+
+
+def _select(df: pandas.DataFrame, columns: COLUMNS_T) -> pandas.DataFrame:
+    return df if columns is None else df[columns]
+
+
+class ReportWriter():
+    """
+    Write the capital, the orders and the trades of a backtest in chunks
+    while it is running.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def write_settings(self, settings: Any) -> None:
+        raise NotImplementedError()
+
+    def append(self, key: str, df: pandas.DataFrame) -> None:
+        raise NotImplementedError()
+
+
+def _truncate_strings(df: pandas.DataFrame, sizes: Dict[str, int]) -> pandas.DataFrame:
+    """
+    Cut the strings longer than the width of their column, which can't be
+    appended to the HDF table.
+    """
+    copied = False
+    for column, size in sizes.items():
+        if df[column].dtype != object:
+            continue
+        encoded = df[column].str.encode('utf-8')
+        too_long = encoded.str.len() > size
+        if not too_long.any():
+            continue
+        if not copied:
+            df = df.copy()
+            copied = True
+        logger.warning(_("Truncate the {} longer than {} bytes in the report").format(column, size))
+        df.loc[too_long, column] = encoded[too_long].str.slice(0, size).str.decode('utf-8', 'ignore')
+    return df
+
+
+class HDFReportWriter(ReportWriter):
+    """
+    Every chunk is appended to the tables of the HDF file and the file is
+    closed after that, so the chunks flushed are kept if the run crashes.
+    """
+
+    def __init__(self, path: str) -> None:
+        super(HDFReportWriter, self).__init__(path)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write_settings(self, settings: Any) -> None:
+        with pandas.HDFStore(self.path, mode='a') as store:
+            store.get_node('/')._v_attrs.settings = settings
+
+    def append(self, key: str, df: pandas.DataFrame) -> None:
+        if not len(df):
+            return
+        min_itemsize = {column: size for column, size in HDF_STRING_SIZES.items() if column in df.columns}
+        df = _truncate_strings(df, min_itemsize)
+        with pandas.HDFStore(self.path, mode='a') as store:
+            store.append(key, df, format='table', min_itemsize=min_itemsize or None)
+
+
+class ParquetReportWriter(ReportWriter):
+    """
+    The report is a directory with a directory of parquet files for every
+    table, each chunk is written as a file of its own so the files written
+    are complete if the run crashes.
+    """
+
+    def __init__(self, path: str) -> None:
+        super(ParquetReportWriter, self).__init__(path)
+        self.pyarrow = _pyarrow()
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        self.parts: Dict[str, int] = {}
+
+    def write_settings(self, settings: Any) -> None:
+        with open(os.path.join(self.path, PARQUET_SETTINGS_FILE), 'wb') as f:
+            pickle.dump(settings, f)
+
+    def append(self, key: str, df: pandas.DataFrame) -> None:
+        if not len(df):
+            return
+        table_dir = os.path.join(self.path, key)
+        part = self.parts.get(key, 0)
+        if part == 0:
+            os.makedirs(table_dir)
+        table = self.pyarrow.Table.from_pandas(df, preserve_index=False)
+        self.pyarrow.parquet.write_table(table, os.path.join(table_dir, 'part-{:06d}.parquet'.format(part)))
+        self.parts[key] = part + 1
+
+
+def report_writer(path: str) -> ReportWriter:
+    ext = os.path.splitext(path)[1]
+    if ext in HDF_EXTENSIONS:
+        return HDFReportWriter(path)
+    elif ext == PARQUET_EXTENSION:
+        return ParquetReportWriter(path)
+    raise SettingError(_("Report file {} is not a streaming report format").format(path))
+
+
+class Report():
+    """
+    The result of a backtest as the :class:`Analyser` reads it. The tables
+    can be read with only some of their columns.
+    """
+    settings: Any
+
+    def capital(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        raise NotImplementedError()
+
+    def orders(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        raise NotImplementedError()
+
+    def trades(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        raise NotImplementedError()
+
+
+class PickleReport(Report):
+    """
+    The report pickled at the end of the run by :class:`Statistic`.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self.result_data: Dict[str, Any] = pickle.load(f)
+        self.settings = self.result_data['settings']
+
+    def capital(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        df = pandas.DataFrame(self.result_data['daily_capital'])
+        return _select(df, _capital_columns(columns)).set_index('timestamp')
+
+    def orders(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        result_orders = self.result_data['orders']
+        if isinstance(result_orders, OrderJournal):
+            df = result_orders.to_frame()
+        else:
+            df = pandas.DataFrame([base_order_to_dict(order) for order in result_orders])
+        return _select(df, columns)
+
+    def trades(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        result_trades = self.result_data['trades']
+        if isinstance(result_trades, TradeJournal):
+            df = result_trades.to_frame()
+        else:
+            # the reports before the trade journal keep the Trade objects
+            df = pandas.DataFrame([trade.to_dict() for trade in result_trades])
+        return _select(df, columns)
+
+
+class ChunkReport(Report):
+    """
+    A report streamed by :class:`~monkq.stat.StreamStatistic`. Only the
+    settings are read when it's opened, every table is read when it's asked.
+    """
+
+    def _read(self, key: str, columns: COLUMNS_T) -> Optional[pandas.DataFrame]:
+        raise NotImplementedError()
+
+    def _table(self, key: str, empty: pandas.DataFrame, columns: COLUMNS_T) -> pandas.DataFrame:
+        df = self._read(key, columns)
+        if df is None:
+            # nothing of the kind is flushed
+            return _select(empty, columns)
+        return df
+
+    def capital(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        return self._table('capital', pandas.DataFrame(columns=['timestamp']),
+                           _capital_columns(columns)).set_index('timestamp')
+
+    def orders(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        return self._table('orders', OrderJournal().to_frame(), columns)
+
+    def trades(self, columns: COLUMNS_T = None) -> pandas.DataFrame:
+        return self._table('trades', TradeJournal().to_frame(), columns)
+
+
+class HDFReport(ChunkReport):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with pandas.HDFStore(path, mode='r') as store:
+            self.settings = store.get_node('/')._v_attrs.settings
+
+    def _read(self, key: str, columns: COLUMNS_T) -> Optional[pandas.DataFrame]:
+        with pandas.HDFStore(self.path, mode='r') as store:
+            if key not in store:
+                return None
+            df = store.select(key, columns=columns)
+        return df.reset_index(drop=True)
+
+
+class ParquetReport(ChunkReport):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.pyarrow = _pyarrow()
+        with open(os.path.join(path, PARQUET_SETTINGS_FILE), 'rb') as f:
+            self.settings = pickle.load(f)
+
+    def _read(self, key: str, columns: COLUMNS_T) -> Optional[pandas.DataFrame]:
+        parts = sorted(glob.glob(os.path.join(self.path, key, 'part-*.parquet')))
+        if not parts:
+            return None
+        tables = [self.pyarrow.parquet.read_table(part, columns=columns, memory_map=True) for part in parts]
+        return self.pyarrow.concat_tables(tables).to_pandas()
+
+
+def load_report(path: str) -> Report:
+    ext = os.path.splitext(path.rstrip(os.sep))[1]
+    if ext in HDF_EXTENSIONS:
+        return HDFReport(path)
+    elif ext == PARQUET_EXTENSION:
+        return ParquetReport(path)
+    return PickleReport(path)
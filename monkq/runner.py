@@ -26,7 +26,8 @@ from asyncio import get_event_loop
 from logbook import Logger
 from monkq.config import Setting
 from monkq.context import Context
-from monkq.ticker import FrequencyTicker
+from monkq.exchange.base import BaseSimExchange
+from monkq.ticker import BarClock, FrequencyTicker
 
 from .log import core_log_group
 
@@ -44,7 +45,8 @@ class Runner():
         self.start_datetime = settings.START_TIME  # type: ignore
         self.end_datetime = settings.END_TIME  # type: ignore
 
-        self.ticker = FrequencyTicker(self.start_datetime, self.end_datetime, '1m')
+        ticker_cls = self.context.load_target_cls(getattr(settings, 'TICKER', FrequencyTicker), FrequencyTicker)
+        self.ticker = ticker_cls(self.start_datetime, self.end_datetime, '1m')
 
         self.stat = self.context.stat
 
@@ -53,21 +55,40 @@ class Runner():
 
         self.stat.freq_collect_account()
 
-        for current_time in self.ticker.timer():
-            self.context.now = current_time
-            logger.debug("Handler time {}".format(current_time))
+        if isinstance(self.ticker, BarClock):
+            for current_ns in self.ticker.timer_ns():
+                self.context.now_ns = current_ns
+                await self._handle_bar()
+        else:
+            for current_time in self.ticker.timer():
+                self.context.now = current_time
+                logger.debug("Handler time {}".format(current_time))
+                await self._handle_bar()
 
-            await self.context.strategy.handle_bar()
-            logger.debug("Finish handle bar to {}".format(current_time))
+        self.stat.collect_account_info()
 
-            for key, exchange in self.context.exchanges.items():
-                exchange.match_open_orders()  # type:ignore
+        self.lastly()
 
-            self.stat.freq_collect_account()
+    async def _handle_bar(self) -> None:
+        await self.context.strategy.handle_bar()
 
-        self.stat.collect_account_info()
+        for key, exchange in self.context.exchanges.items():
+            exchange.match_open_orders()  # type:ignore
 
-        self.lastly()
+        self.stat.freq_collect_account()
+
+    def preload(self) -> None:
+        for exchange in self.context.exchanges.values():
+            if isinstance(exchange, BaseSimExchange):
+                exchange.preload()
+
+    def share_data(self, other: "Runner") -> None:
+        """
+        Use the data loaded by another runner of the same exchange settings.
+        """
+        for name, exchange in self.context.exchanges.items():
+            if isinstance(exchange, BaseSimExchange):
+                exchange.share_data(other.context.exchanges[name])  # type:ignore
 
     def lastly(self) -> None:
         self.stat.report()
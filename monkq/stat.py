@@ -25,9 +25,12 @@ import datetime
 import pickle
 from typing import TYPE_CHECKING, Dict, List, Union
 
-from monkq.assets.order import ORDER_T, BaseOrder
+import pandas
+from monkq.assets.order import ORDER_T
 from monkq.assets.trade import Trade
-from monkq.utils.timefunc import utc_datetime
+from monkq.journal import OrderJournal, TradeJournal
+from monkq.report import report_writer
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
 from pandas.tseries.frequencies import DateOffset, to_offset
 
 if TYPE_CHECKING:
@@ -42,11 +45,15 @@ class Statistic():
         self.report_file: str = getattr(self.context.settings, 'REPORT_FILE', 'result.pkl')
         self.collect_freq = getattr(self.context.settings, 'COLLECT_FREQ', '4H')
         self.daily_capital: List[DAILY_STAT_TYPE] = []
-        self.order_collections: List[BaseOrder] = []
-        self.trade_collections: List[Trade] = []
+        # only the scalar fields of the orders and trades are kept, the
+        # objects reference the accounts and the exchanges
+        self.order_collections = OrderJournal()
+        self.trade_collections = TradeJournal()
 
         self.collect_offset: DateOffset = to_offset(self.collect_freq)
+        self.collect_offset_ns: int = self.collect_offset.nanos
         self.last_collect_time: datetime.datetime = utc_datetime(1970, 1, 1)
+        self.last_collect_ns: int = datetime_to_ns(self.last_collect_time)
 
     def collect_account_info(self) -> None:
         accounts_capital: DAILY_STAT_TYPE = {k: v.total_capital for k, v in self.context.accounts.items()}
@@ -54,15 +61,21 @@ class Statistic():
         self.daily_capital.append(accounts_capital)
 
     def freq_collect_account(self) -> None:
-        if self.context.now - self.last_collect_time >= self.collect_offset.delta:
+        # compare in nanoseconds so a lazily built `context.now` stays unbuilt
+        if self.context.now_ns - self.last_collect_ns >= self.collect_offset_ns:
             self.collect_account_info()
             self.last_collect_time = self.context.now
+            self.last_collect_ns = self.context.now_ns
 
-    def collect_order(self, order: ORDER_T) -> None:
-        self.order_collections.append(order)
+    def collect_order(self, order: ORDER_T, cancelled: bool = False) -> None:
+        """
+        Record the state of an order when it is submitted, traded or
+        cancelled.
+        """
+        self.order_collections.append(order, self.context.now_ns, cancelled)
 
     def collect_trade(self, trade: Trade) -> None:
-        self.trade_collections.append(trade)
+        self.trade_collections.append(trade, self.context.now_ns)
 
     def _pickle_obj(self) -> dict:
         return {
@@ -75,3 +88,45 @@ class Statistic():
     def report(self) -> None:
         with open(self.report_file, 'wb') as f:
             pickle.dump(self._pickle_obj(), f)
+
+
+class StreamStatistic(Statistic):
+    """
+    Flush the capital, the orders and the trades to the report file every
+    `REPORT_FLUSH_FREQ` of the backtest instead of pickling all of them at
+    the end, so a crashed run keeps what is flushed and the orders and the
+    trades of the whole run are never held in memory.
+
+    The report file format is chosen by the file extension, see
+    :func:`monkq.report.report_writer`.
+    """
+
+    def __init__(self, context: "Context"):
+        super(StreamStatistic, self).__init__(context)
+        self.flush_freq = getattr(self.context.settings, 'REPORT_FLUSH_FREQ', '1D')
+        self.flush_offset_ns: int = to_offset(self.flush_freq).nanos
+        self.last_flush_ns: int = self.context.now_ns
+        self.flushed_capital = 0
+        self.writer = report_writer(self.report_file)
+        self.writer.write_settings(self.context.settings)
+
+    def freq_collect_account(self) -> None:
+        super(StreamStatistic, self).freq_collect_account()
+        if self.context.now_ns - self.last_flush_ns >= self.flush_offset_ns:
+            self.flush()
+            self.last_flush_ns = self.context.now_ns
+
+    def flush(self) -> None:
+        # the capital snapshots are few, they are kept for the summaries
+        # of the sweeps
+        capital = self.daily_capital[self.flushed_capital:]
+        if capital:
+            self.writer.append('capital', pandas.DataFrame(capital))
+            self.flushed_capital = len(self.daily_capital)
+        self.writer.append('orders', self.order_collections.to_frame())
+        self.order_collections.clear()
+        self.writer.append('trades', self.trade_collections.to_frame())
+        self.trade_collections.clear()
+
+    def report(self) -> None:
+        self.flush()
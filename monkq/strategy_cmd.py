@@ -22,10 +22,18 @@
 # SOFTWARE.
 #
 
+import datetime
+from typing import Optional, Tuple
+
 import click
+import pandas
 from monkq.__main__ import cmd_main
 from monkq.config import gen_settings
+from monkq.exception import CommandError
 from monkq.runner import Runner
+from monkq.sweep import Sweep, parse_params
+from monkq.utils.i18n import _
+from monkq.walkforward import WalkForward
 
 
 @cmd_main.command()
@@ -36,5 +44,51 @@ def runstrategy(ctx: click.Context) -> None:
     runner.run()
 
 
+@cmd_main.command()
+@click.help_option()
+@click.option('--param', '-p', 'params', multiple=True, type=str,
+              help='A setting to sweep like NAME=value1,value2. It can be used many times.')
+@click.option('--workers', '-w', default=None, type=int, help='The number of processes, default is the cpu count')
+@click.option('--output', '-o', default='sweep.csv', type=str, help='The csv file of the results')
+@click.pass_context
+def sweep(ctx: click.Context, params: Tuple[str, ...], workers: Optional[int], output: str) -> None:
+    settings = gen_settings()
+    result = Sweep(settings, parse_params(params), workers).run()
+    result.to_csv(output, index=False)
+    click.echo(result.to_string())
+
+
+def _parse_timedelta(value: str) -> datetime.timedelta:
+    try:
+        return pandas.Timedelta(value).to_pytimedelta()
+    except ValueError:
+        raise CommandError(_("Can not parse {} as a time length like 30D").format(value))
+
+
+@cmd_main.command()
+@click.help_option()
+@click.option('--train', default='0D', type=str, help='The length of the train periods like 90D')
+@click.option('--test', type=str, required=True, help='The length of the test periods like 30D')
+@click.option('--step', default=None, type=str, help='The step of the windows, default is the test length')
+@click.option('--param', '-p', 'params', multiple=True, type=str,
+              help='A setting to choose in the train periods like NAME=value1,value2. It can be used many times.')
+@click.option('--metric', default='return', type=str, help='The result column to choose the parameters by')
+@click.option('--minimize', is_flag=True, help='Choose the parameters with the smallest metric')
+@click.option('--workers', '-w', default=None, type=int, help='The number of processes, default is the cpu count')
+@click.option('--output', '-o', default='walkforward.csv', type=str, help='The csv file of the windows')
+@click.option('--capital', default='walkforward_capital.csv', type=str, help='The csv file of the equity curve')
+@click.pass_context
+def walkforward(ctx: click.Context, train: str, test: str, step: Optional[str], params: Tuple[str, ...],
+                metric: str, minimize: bool, workers: Optional[int], output: str, capital: str) -> None:
+    settings = gen_settings()
+    walk_forward = WalkForward(settings, _parse_timedelta(train), _parse_timedelta(test),
+                               None if step is None else _parse_timedelta(step),
+                               parse_params(params), metric, minimize, workers)
+    result = walk_forward.run()
+    result.to_csv(output, index=False)
+    pandas.DataFrame(walk_forward.daily_capital).to_csv(capital, index=False)
+    click.echo(result.to_string())
+
+
 if __name__ == '__main__':
     cmd_main()
@@ -0,0 +1,181 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import ast
+import asyncio
+import copy
+import itertools
+import multiprocessing
+import os
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import pandas
+from logbook import Logger
+from monkq.config import Setting
+from monkq.exception import CommandError, SettingError
+from monkq.runner import Runner
+from monkq.utils.i18n import _
+
+from .log import core_log_group
+
+logger = Logger('sweep')
+core_log_group.add_logger(logger)
+
+PARAMS_T = Dict[str, Any]
+
+# the sweep being run, inherited by the forked workers
+_sweep: Optional["Sweep"] = None
+
+
+def parameter_grid(params: Mapping[str, Sequence]) -> List[PARAMS_T]:
+    """
+    All the combinations of the parameters, the last parameter changes
+    fastest.
+    """
+    names = list(params.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def _parse_value(value: str) -> Any:
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_params(options: Sequence[str]) -> Dict[str, List[Any]]:
+    """
+    Parse the command line parameters like ``FAST=5,10,20``. Every value is
+    read as a python literal if possible, otherwise kept as a string.
+    """
+    params: Dict[str, List[Any]] = dict()
+    for option in options:
+        name, sep, values = option.partition('=')
+        if not sep or not name or not values:
+            raise CommandError(_("Sweep parameter should be like NAME=value1,value2, got {}").format(option))
+        params[name.strip()] = [_parse_value(value.strip()) for value in values.split(',')]
+    return params
+
+
+def sweep_settings(settings: Setting, params: PARAMS_T, suffix: Union[int, str]) -> Setting:
+    """
+    A copy of the settings with the parameters set and a report file of
+    its own named with the suffix.
+    """
+    run_settings = copy.copy(settings)
+    for name, value in params.items():
+        if not name.isupper():
+            raise SettingError(_("Sweep parameter {} must be an upper case setting name").format(name))
+        setattr(run_settings, name, value)
+    root, ext = os.path.splitext(getattr(settings, 'REPORT_FILE', 'result.pkl'))
+    run_settings.REPORT_FILE = "{}_{}{}".format(root, suffix, ext)  # type:ignore
+    return run_settings
+
+
+def summarize(runner: Runner) -> PARAMS_T:
+    stat = runner.stat
+    capital = pandas.DataFrame(stat.daily_capital).set_index('timestamp').sum(axis=1)
+    drawdown = 1 - capital / capital.cummax()
+    return {
+        'start_capital': capital.iloc[0],
+        'end_capital': capital.iloc[-1],
+        'return': capital.iloc[-1] / capital.iloc[0] - 1,
+        'max_drawdown': drawdown.max(),
+        'orders': stat.order_collections.submitted,
+        'trades': stat.trade_collections.total,
+        'report_file': stat.report_file,
+    }
+
+
+def _run_task(index: int) -> PARAMS_T:
+    assert _sweep is not None
+    return _sweep.run_task(index)
+
+
+class Sweep():
+    """
+    Run the same strategy over a grid of settings.
+
+    The data is loaded once in this process by a template :class:`Runner`,
+    then the runs are spread over a pool of forked workers which share the
+    loaded data copy-on-write. Every run has its own :class:`Context` and
+    report file. Without the `fork` start method or with one worker, the
+    runs are done one by one in this process.
+    """
+
+    def __init__(self, settings: Setting, params: Mapping[str, Sequence], workers: Optional[int] = None) -> None:
+        self.settings = settings
+        self.grid = parameter_grid(params)
+        self.workers = workers or os.cpu_count() or 1
+        self.template: Optional[Runner] = None
+
+    def report_suffix(self, index: int) -> Union[int, str]:
+        return index
+
+    def run_task(self, index: int) -> PARAMS_T:
+        params = self.grid[index]
+        logger.info(_("Start sweep run {} with {}").format(index, params))
+        runner = Runner(sweep_settings(self.settings, params, self.report_suffix(index)))
+        if self.template is not None:
+            runner.share_data(self.template)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            runner.run()
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        return self.collect(params, runner)
+
+    def collect(self, params: PARAMS_T, runner: Runner) -> PARAMS_T:
+        result = dict(params)
+        result.update(summarize(runner))
+        return result
+
+    def map(self) -> List[PARAMS_T]:
+        """
+        Run every settings of `grid`. The template runner is created on the
+        first call and reused by the next ones.
+        """
+        # the workers find the sweep through the module, so nothing but the
+        # index and the result crosses the process boundary
+        global _sweep
+        if self.template is None:
+            self.template = Runner(self.settings)
+            self.template.preload()
+        indexes = list(range(len(self.grid)))
+        workers = min(self.workers, len(indexes))
+        _sweep = self
+        try:
+            if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    return pool.map(_run_task, indexes, chunksize=1)
+            return [_run_task(index) for index in indexes]
+        finally:
+            _sweep = None
+
+    def run(self) -> pandas.DataFrame:
+        try:
+            return pandas.DataFrame(self.map())
+        finally:
+            self.template = None
@@ -24,13 +24,18 @@
 import datetime
 from typing import Generator
 
+import numpy
 from dateutil.rrule import DAILY, MINUTELY, rrule
 from monkq.exception import SettingError
 from monkq.utils.i18n import _
-from monkq.utils.timefunc import is_aware_datetime
+from monkq.utils.timefunc import (
+    datetime_to_ns, is_aware_datetime, ns_to_datetime,
+)
 
 FREQ_DICT = {'1m': MINUTELY, '1d': DAILY}
 
+FREQ_NS_DICT = {'1m': 60 * 10 ** 9, '1d': 24 * 60 * 60 * 10 ** 9}
+
 
 class FrequencyTicker():
     def __init__(self, start_time: datetime.datetime, end_time: datetime.datetime, frequency: str):
@@ -49,3 +54,38 @@ class FrequencyTicker():
         for current_datetime in rrule(self.frequency, dtstart=self.start_time, until=self.end_time):
             self.current = current_datetime
             yield self.current
+
+
+class BarClock(FrequencyTicker):
+    """
+    A ticker which precomputes every bar of the backtest as an int64
+    nanosecond array aligned with the kline index.
+
+    The runner drives the backtest with :meth:`timer_ns`, so no datetime
+    is built for a bar unless somebody asks for ``context.now``.
+    """
+    CHUNK_SIZE = 10000
+
+    def __init__(self, start_time: datetime.datetime, end_time: datetime.datetime, frequency: str):
+        super(BarClock, self).__init__(start_time, end_time, frequency)
+        step = FREQ_NS_DICT.get(frequency)
+        if step is None:
+            raise SettingError(_("Unsupported frequency {}").format(frequency))
+        start_ns = datetime_to_ns(start_time)
+        end_ns = datetime_to_ns(end_time)
+        self.clock = numpy.arange(start_ns, end_ns + 1, step, dtype=numpy.int64)
+
+    def __len__(self) -> int:
+        return len(self.clock)
+
+    def timer_ns(self) -> Generator[int, None, None]:
+        # tolist converts a chunk of the clock to python ints in one go,
+        # which is a lot cheaper than boxing numpy scalars one by one.
+        for start in range(0, len(self.clock), self.CHUNK_SIZE):
+            for current_ns in self.clock[start:start + self.CHUNK_SIZE].tolist():
+                yield current_ns
+
+    def timer(self) -> Generator[datetime.datetime, None, None]:
+        for current_ns in self.timer_ns():
+            self.current = ns_to_datetime(current_ns)
+            yield self.current
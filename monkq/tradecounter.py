@@ -23,12 +23,15 @@
 #
 
 import datetime
-from typing import Dict, Optional, ValuesView
+import heapq
+from typing import Any, Dict, List, Optional, Tuple, Union, ValuesView
 
+import numpy
 from logbook import Logger
 from monkq.assets.order import ORDER_T, LimitOrder, MarketOrder
 from monkq.assets.trade import Trade
 from monkq.exception import ImpossibleError
+from monkq.klinearray import HIGH, LOW
 from monkq.stat import Statistic
 from monkq.utils.id import gen_unique_id
 
@@ -37,39 +40,277 @@ from .log import core_log_group
 logger = Logger('trade_counter')
 core_log_group.add_logger(logger)
 
+# (sort key, match round of the submit, sequence, order id)
+BOOK_ENTRY_T = Tuple[float, int, int, str]
+
+
+class BaseOrderBook():
+    """
+    The resting limit orders of one instrument.
+    """
+
+    def __init__(self, exchange: Any, instrument: Any) -> None:
+        self.exchange = exchange
+        self.instrument = instrument
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    def push(self, order: LimitOrder, match_round: int, sequence: int) -> None:
+        raise NotImplementedError()
+
+    def crossed(self, open_orders: Dict[str, ORDER_T], match_round: int,
+                low: float, high: float) -> List[str]:
+        """
+        Remove and return the orders whose price is within the bar, buy
+        orders at or above the low and sell orders at or below the high. The
+        orders submitted in this match round stay, they have to wait for the
+        next bar.
+        """
+        raise NotImplementedError()
+
+    def discard(self, order_id: str, open_orders: Dict[str, ORDER_T]) -> None:
+        """
+        Record an order of the book is cancelled, `open_orders` must not hold
+        it any more.
+        """
+        raise NotImplementedError()
+
+
+class OrderBook(BaseOrderBook):
+    """
+    The buy orders are kept in a heap with the highest price first and the sell orders with the
+    lowest price first, so matching a bar only touches the orders whose
+    price the bar crossed.
+
+    Cancelled orders are not removed from the heaps, they are dropped when
+    they come to the top or when more than half of the book is stale.
+    """
+
+    def __init__(self, exchange: Any, instrument: Any) -> None:
+        super(OrderBook, self).__init__(exchange, instrument)
+        self.bids: List[BOOK_ENTRY_T] = []
+        self.asks: List[BOOK_ENTRY_T] = []
+        self.stale = 0
+
+    def push(self, order: LimitOrder, match_round: int, sequence: int) -> None:
+        if order.quantity > 0:
+            heapq.heappush(self.bids, (-order.price, match_round, sequence, order.order_id))
+        else:
+            heapq.heappush(self.asks, (order.price, match_round, sequence, order.order_id))
+
+    def __len__(self) -> int:
+        return len(self.bids) + len(self.asks)
+
+    def crossed(self, open_orders: Dict[str, ORDER_T], match_round: int,
+                low: float, high: float) -> List[str]:
+        crossed: List[str] = []
+        crossed.extend(self._pop_crossed(self.bids, open_orders, match_round, -low))
+        crossed.extend(self._pop_crossed(self.asks, open_orders, match_round, high))
+        return crossed
+
+    def _pop_crossed(self, heap: List[BOOK_ENTRY_T], open_orders: Dict[str, ORDER_T],
+                     match_round: int, limit: float) -> List[str]:
+        crossed: List[str] = []
+        waiting: List[BOOK_ENTRY_T] = []
+        # nan never compares true, so a bar without trades crosses nothing
+        while heap and heap[0][0] <= limit:
+            entry = heapq.heappop(heap)
+            if entry[3] not in open_orders:
+                self.stale -= 1
+                continue
+            if entry[1] >= match_round:
+                waiting.append(entry)
+            else:
+                crossed.append(entry[3])
+        for entry in waiting:
+            heapq.heappush(heap, entry)
+        return crossed
+
+    def discard(self, order_id: str, open_orders: Dict[str, ORDER_T]) -> None:
+        self.stale += 1
+        if self.stale * 2 > len(self):
+            for heap in (self.bids, self.asks):
+                heap[:] = [entry for entry in heap if entry[3] in open_orders]
+                heapq.heapify(heap)
+            self.stale = 0
+
+
+class ArrayOrderBook(BaseOrderBook):
+    """
+    An order book keeping the limit orders in flat NumPy arrays, so the
+    orders crossed by a bar are found with one vectorized comparison.
+
+    Every order belongs to a group, which lets one book hold the orders of
+    several instruments: :meth:`crossed` then takes the low and the high of
+    the bars as arrays indexed by the group.
+    """
+
+    def __init__(self, exchange: Any, instrument: Any) -> None:
+        super(ArrayOrderBook, self).__init__(exchange, instrument)
+        self.prices = numpy.zeros(16, dtype=numpy.float64)
+        self.is_buy = numpy.zeros(16, dtype=bool)
+        self.rounds = numpy.zeros(16, dtype=numpy.int64)
+        self.alive = numpy.zeros(16, dtype=bool)
+        self.groups = numpy.zeros(16, dtype=numpy.int64)
+        self.order_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def push(self, order: LimitOrder, match_round: int, sequence: int, group: int = 0) -> None:
+        size = len(self.order_ids)
+        if size == len(self.prices):
+            if len(self._positions) * 2 <= size:
+                self._compact()
+                size = len(self.order_ids)
+            else:
+                self._grow()
+        self.prices[size] = order.price
+        self.is_buy[size] = order.quantity > 0
+        self.rounds[size] = match_round
+        self.alive[size] = True
+        self.groups[size] = group
+        self.order_ids.append(order.order_id)
+        self._positions[order.order_id] = size
+
+    def _grow(self) -> None:
+        capacity = len(self.prices) * 2
+        for name in ('prices', 'is_buy', 'rounds', 'alive', 'groups'):
+            array = getattr(self, name)
+            grown = numpy.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _compact(self) -> None:
+        size = len(self.order_ids)
+        keep = numpy.flatnonzero(self.alive[:size])
+        count = len(keep)
+        for name in ('prices', 'is_buy', 'rounds', 'alive', 'groups'):
+            array = getattr(self, name)
+            array[:count] = array[keep]
+            array[count:] = 0
+        self.order_ids = [self.order_ids[i] for i in keep]
+        self._positions = {order_id: i for i, order_id in enumerate(self.order_ids)}
+
+    def _remove(self, order_id: str) -> None:
+        self.alive[self._positions.pop(order_id)] = False
+
+    def crossed(self, open_orders: Dict[str, ORDER_T], match_round: int,
+                low: Union[float, numpy.ndarray], high: Union[float, numpy.ndarray]) -> List[str]:
+        size = len(self.order_ids)
+        prices = self.prices[:size]
+        if isinstance(low, numpy.ndarray) and isinstance(high, numpy.ndarray):
+            groups = self.groups[:size]
+            low = low[groups]
+            high = high[groups]
+        # nan never compares true, so a bar without trades crosses nothing
+        with numpy.errstate(invalid='ignore'):
+            hit = numpy.where(self.is_buy[:size], prices >= low, prices <= high)
+        hit &= self.alive[:size]
+        hit &= self.rounds[:size] < match_round
+        crossed = [self.order_ids[i] for i in numpy.flatnonzero(hit)]
+        for order_id in crossed:
+            self._remove(order_id)
+        return crossed
+
+    def discard(self, order_id: str, open_orders: Dict[str, ORDER_T]) -> None:
+        self._remove(order_id)
+
 
 class TradeCounter:
+    """
+    The matching engine of the backtest.
+
+    Market orders are filled on the bar they are submitted at the last
+    price. Limit orders rest in the :class:`OrderBook` of their instrument
+    and are filled at their own price by the first later bar whose range
+    reaches the price.
+    """
+
     def __init__(self, stat: Statistic) -> None:
         self._open_orders: Dict[str, ORDER_T] = {}
         self.stat = stat
         self._traded_orders: Dict[str, ORDER_T] = {}
+        self._market_orders: Dict[str, ORDER_T] = {}
+        self._books: Dict[Tuple[Any, Any], BaseOrderBook] = {}
+        self._match_round = 0
+        self._sequence = 0
+        # bumped whenever the open orders change
+        self.version = 0
 
     def match(self, match_time: datetime.datetime) -> None:
-        close_order_ids = []
-        for order in self._open_orders.values():
-            if isinstance(order, MarketOrder):
-                trade = Trade(order, order.account.exchange.last_price(order.instrument),
-                              order.quantity, gen_unique_id(), match_time)
-            elif isinstance(order, LimitOrder):
-                trade = Trade(order, order.price, order.quantity, gen_unique_id(), match_time)
-            else:
-                raise ImpossibleError("Unsupported order type {}".format(type(order)))
+        self._match_limit_orders(match_time)
+
+        for order in list(self._market_orders.values()):
+            self._fill(order, order.account.exchange.last_price(order.instrument), match_time)
+
+        self._match_round += 1
+
+    def _match_limit_orders(self, match_time: datetime.datetime) -> None:
+        for book in self._books.values():
+            if not len(book):
+                continue
+            bar = book.exchange.last_bar(book.instrument)
+            if bar is None:
+                continue
+            self._fill_crossed(book.crossed(self._open_orders, self._match_round, bar[LOW], bar[HIGH]), match_time)
+
+    def _fill_crossed(self, order_ids: List[str], match_time: datetime.datetime) -> None:
+        for order_id in order_ids:
+            order = self._open_orders[order_id]
+            assert isinstance(order, LimitOrder)
+            self._fill(order, order.price, match_time)
+
+    def _fill(self, order: ORDER_T, price: float, match_time: datetime.datetime) -> None:
+        trade = self._deal(order, price, match_time)
+        logger.debug("Trade counter match a trade {}", trade)
 
-            self.stat.collect_trade(trade)
+    def _deal(self, order: ORDER_T, price: float, match_time: datetime.datetime) -> Trade:
+        trade = Trade(order, price, order.remain_quantity, gen_unique_id(), match_time)
 
-            logger.debug("Trade counter match a trade {}".format(trade))
-            order.deal(trade)
-            if order.remain_quantity == 0:
-                close_order_ids.append(order.order_id)
-        for order_id in close_order_ids:
-            self._open_orders.pop(order_id)
+        self.stat.collect_trade(trade)
+
+        order.deal(trade)
+        self.stat.collect_order(order)
+        self.version += 1
+        if order.remain_quantity == 0:
+            self._open_orders.pop(order.order_id)
+            self._market_orders.pop(order.order_id, None)
+        return trade
 
     def submit_order(self, order: ORDER_T) -> None:
+        if isinstance(order, MarketOrder):
+            self._market_orders[order.order_id] = order
+        elif isinstance(order, LimitOrder):
+            self._push(order)
+        else:
+            raise ImpossibleError("Unsupported order type {}".format(type(order)))
         self._open_orders[order.order_id] = order
+        self.version += 1
         self.stat.collect_order(order)
 
+    def _push(self, order: LimitOrder) -> None:
+        self._book(order).push(order, self._match_round, self._sequence)
+        self._sequence += 1
+
+    def _book(self, order: LimitOrder) -> BaseOrderBook:
+        key = (order.account.exchange, order.instrument.symbol)
+        book = self._books.get(key)
+        if book is None:
+            book = self._books[key] = OrderBook(order.account.exchange, order.instrument)
+        return book
+
     def cancel_order(self, order_id: str) -> ORDER_T:
-        return self._open_orders.pop(order_id)
+        order = self._open_orders.pop(order_id)
+        self.version += 1
+        if isinstance(order, LimitOrder):
+            self._book(order).discard(order_id, self._open_orders)
+        else:
+            self._market_orders.pop(order_id, None)
+        self.stat.collect_order(order, cancelled=True)
+        return order
 
     # TODO
     def amend_order(self, order_id: str, quantity: Optional[float], price: Optional[float]) -> None:
@@ -77,3 +318,55 @@ class TradeCounter:
 
     def open_orders(self) -> ValuesView[ORDER_T]:
         return self._open_orders.values()
+
+
+class BatchTradeCounter(TradeCounter):
+    """
+    A :class:`TradeCounter` keeping the limit orders of all the instruments
+    in one :class:`ArrayOrderBook`, so a match round checks every resting
+    order against the range of its own bar in a single vectorized pass.
+
+    It is slower than the heaps when a bar only crosses a few orders, and
+    pays off for strategies keeping hundreds of resting orders over many
+    instruments with a good part of them filled on every bar.
+    """
+
+    def __init__(self, stat: Statistic) -> None:
+        super(BatchTradeCounter, self).__init__(stat)
+        self._batch_book = ArrayOrderBook(None, None)
+        self._groups: Dict[Tuple[Any, Any], int] = {}
+        self._group_instruments: List[Tuple[Any, Any]] = []
+
+    def _match_limit_orders(self, match_time: datetime.datetime) -> None:
+        if not len(self._batch_book):
+            return
+        lows = numpy.full(len(self._group_instruments), numpy.nan)
+        highs = numpy.full(len(self._group_instruments), numpy.nan)
+        for group, (exchange, instrument) in enumerate(self._group_instruments):
+            bar = exchange.last_bar(instrument)
+            if bar is not None:
+                lows[group] = bar[LOW]
+                highs[group] = bar[HIGH]
+        self._fill_crossed(self._batch_book.crossed(self._open_orders, self._match_round, lows, highs), match_time)
+
+    def _fill_crossed(self, order_ids: List[str], match_time: datetime.datetime) -> None:
+        # one log record for the whole batch, building a record per trade
+        # costs as much as the trade itself
+        for order_id in order_ids:
+            order = self._open_orders[order_id]
+            assert isinstance(order, LimitOrder)
+            self._deal(order, order.price, match_time)
+        if order_ids:
+            logger.debug("Trade counter match {} limit orders at {}", len(order_ids), match_time)
+
+    def _push(self, order: LimitOrder) -> None:
+        key = (order.account.exchange, order.instrument.symbol)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = len(self._group_instruments)
+            self._group_instruments.append((order.account.exchange, order.instrument))
+        self._batch_book.push(order, self._match_round, self._sequence, group)
+        self._sequence += 1
+
+    def _book(self, order: LimitOrder) -> BaseOrderBook:
+        return self._batch_book
@@ -21,6 +21,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import hashlib
+import io
 import os
 import pathlib
 import stat
@@ -51,3 +53,11 @@ def make_writable(filename: str) -> None:
         st = os.stat(filename)
         new_permissions = stat.S_IMODE(st.st_mode) | stat.S_IWUSR
         os.chmod(filename, new_permissions)
+
+
+def file_sha256(filename: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(io.DEFAULT_BUFFER_SIZE * 64), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -54,3 +54,22 @@ if local_offset is None:
     local_offset_seconds = 0.  # pragma: no cover
 else:
     local_offset_seconds = local_offset.total_seconds()
+
+
+EPOCH = utc_datetime(1970, 1, 1)
+
+NANOSECONDS_PER_MICROSECOND = 1000
+
+
+def datetime_to_ns(t: datetime.datetime) -> int:
+    """
+    Convert an aware datetime to integer nanoseconds since the unix epoch.
+    """
+    return (t - EPOCH) // datetime.timedelta(microseconds=1) * NANOSECONDS_PER_MICROSECOND
+
+
+def ns_to_datetime(ns: int) -> datetime.datetime:
+    """
+    Convert integer nanoseconds since the unix epoch to a utc datetime.
+    """
+    return EPOCH + datetime.timedelta(microseconds=ns // NANOSECONDS_PER_MICROSECOND)
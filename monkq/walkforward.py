@@ -0,0 +1,160 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import datetime
+from typing import List, Mapping, NamedTuple, Optional, Sequence, Union
+
+import pandas
+from monkq.config import Setting
+from monkq.exception import SettingError
+from monkq.runner import Runner
+from monkq.stat import DAILY_STAT_TYPE
+from monkq.sweep import PARAMS_T, Sweep
+from monkq.utils.i18n import _
+
+
+class Window(NamedTuple):
+    train_start: datetime.datetime
+    train_end: datetime.datetime
+    test_start: datetime.datetime
+    test_end: datetime.datetime
+
+
+def rolling_windows(start: datetime.datetime, end: datetime.datetime, train: datetime.timedelta,
+                    test: datetime.timedelta, step: Optional[datetime.timedelta] = None) -> List[Window]:
+    """
+    Split `start` to `end` into rolling windows. Each test period follows
+    its train period, the windows move forward by `step` which defaults to
+    the test length, and the last test period is cut at `end`.
+    """
+    if step is None:
+        step = test
+    zero = datetime.timedelta(0)
+    if train < zero or test <= zero or step <= zero:
+        raise SettingError(_("The train length can't be negative, the test length and the step must be positive"))
+    windows = []
+    train_start = start
+    while train_start + train < end:
+        test_start = train_start + train
+        windows.append(Window(train_start, test_start, test_start, min(test_start + test, end)))
+        train_start += step
+    return windows
+
+
+def chain_capital(curves: Sequence[List[DAILY_STAT_TYPE]]) -> List[DAILY_STAT_TYPE]:
+    """
+    Join the `daily_capital` of consecutive backtests into one curve. Every
+    backtest starts with the same balance, so each curve is scaled to start
+    where the previous one ended, like reinvesting the whole capital.
+    """
+    merged: List[DAILY_STAT_TYPE] = []
+    for curve in curves:
+        if not curve:
+            continue
+        first = curve[0]
+        accounts = [key for key in first.keys() if key != 'timestamp']
+        skip = 0
+        factors = {account: 1.0 for account in accounts}
+        if merged:
+            last = merged[-1]
+            for account in accounts:
+                if first[account]:
+                    factors[account] = last[account] / first[account]  # type: ignore
+            if first['timestamp'] <= last['timestamp']:  # type: ignore
+                skip = 1
+        for record in curve[skip:]:
+            scaled: DAILY_STAT_TYPE = {account: record[account] * factors[account]  # type: ignore
+                                       for account in accounts}
+            scaled['timestamp'] = record['timestamp']
+            merged.append(scaled)
+    return merged
+
+
+class WalkForward(Sweep):
+    """
+    Walk forward backtest over the rolling windows of
+    `START_TIME..END_TIME`.
+
+    With `params`, every combination is run on each train period, and the
+    one with the best `metric` (a column of the sweep results) is run on
+    the following test period. The runs of each phase are done in parallel
+    by :class:`Sweep`, with the data loaded only once for all of them. The
+    `daily_capital` of the test periods is chained into one equity curve.
+    """
+
+    def __init__(self, settings: Setting, train: datetime.timedelta, test: datetime.timedelta,
+                 step: Optional[datetime.timedelta] = None, params: Optional[Mapping[str, Sequence]] = None,
+                 metric: str = 'return', minimize: bool = False, workers: Optional[int] = None) -> None:
+        super(WalkForward, self).__init__(settings, params or {}, workers)
+        self.params = params or {}
+        self.params_grid = self.grid
+        self.windows = rolling_windows(settings.START_TIME, settings.END_TIME,  # type: ignore
+                                       train, test, step)
+        if not self.windows:
+            raise SettingError(_("There is no test period between START_TIME and END_TIME"))
+        self.metric = metric
+        self.minimize = minimize
+        self.phase = 'test'
+        self.daily_capital: List[DAILY_STAT_TYPE] = []
+
+    def report_suffix(self, index: int) -> Union[int, str]:
+        return "{}_{}".format(self.phase, index)
+
+    def collect(self, params: PARAMS_T, runner: Runner) -> PARAMS_T:
+        result = super(WalkForward, self).collect(params, runner)
+        result['daily_capital'] = runner.stat.daily_capital
+        return result
+
+    def _train(self) -> List[PARAMS_T]:
+        if not self.params:
+            return [{} for window in self.windows]
+        self.phase = 'train'
+        self.grid = [dict(params, START_TIME=window.train_start, END_TIME=window.train_end)
+                     for window in self.windows for params in self.params_grid]
+        results = pandas.DataFrame(self.map())
+        chosen = []
+        size = len(self.params_grid)
+        for i in range(len(self.windows)):
+            metric = results[self.metric].iloc[i * size:(i + 1) * size].reset_index(drop=True)
+            best = metric.idxmin() if self.minimize else metric.idxmax()
+            chosen.append(self.params_grid[0 if pandas.isnull(best) else best])
+        return chosen
+
+    def run(self) -> pandas.DataFrame:
+        """
+        Return a table of the windows with the chosen parameters and the
+        test results. The chained `daily_capital` of the test periods is
+        kept in :attr:`daily_capital`.
+        """
+        try:
+            chosen = self._train()
+            self.phase = 'test'
+            self.grid = [dict(params, START_TIME=window.test_start, END_TIME=window.test_end)
+                         for window, params in zip(self.windows, chosen)]
+            results = self.map()
+        finally:
+            self.template = None
+        self.daily_capital = chain_capital([result.pop('daily_capital') for result in results])
+        table = pandas.DataFrame(results).drop(columns=['START_TIME', 'END_TIME'])
+        windows = pandas.DataFrame(self.windows, columns=Window._fields)
+        return pandas.concat([windows, table], axis=1)
@@ -391,3 +391,91 @@ def test_future_account_position_margin(exchange: MagicMock, future_instrument:
     position1.set_leverage(4)
 
     assert account.position_margin == pytest.approx(271.5)
+
+
+def test_future_account_cached_aggregates(exchange: MagicMock, future_instrument: FutureInstrument) -> None:
+    open_orders: List[FutureLimitOrder] = []
+    exchange.get_open_orders = MagicMock(return_value=open_orders)
+    exchange.last_price = MagicMock(return_value=10)
+    exchange.orders_version = MagicMock(return_value=0)
+    exchange.price_version = MagicMock(return_value=0)
+
+    account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+
+    order1 = FutureLimitOrder(order_id=random_string(6), account=account, instrument=future_instrument,
+                              quantity=100, price=11)
+    assert account.order_margin == 0
+    open_orders.append(order1)
+    # the same orders version keeps the margin
+    assert account.order_margin == 0
+    assert exchange.get_open_orders.call_count == 1
+    exchange.orders_version.return_value = 1
+    assert account.order_margin == 60.5
+
+    trade1 = Trade(order=order1, exec_price=11, exec_quantity=100, trade_id=random_string(6))
+    account.deal(trade1)
+    open_orders.remove(order1)
+    exchange.orders_version.return_value = 2
+    assert account.order_margin == 0
+    # a trade changes the positions without a new price version
+    assert account.unrealised_pnl == -102.5
+    assert account.position_margin == pytest.approx(52.50, 0.0001)
+
+    exchange.last_price.return_value = 12
+    assert account.unrealised_pnl == -102.5
+    exchange.price_version.return_value = 1
+    assert account.unrealised_pnl == pytest.approx(97)
+    assert account.available_balance == pytest.approx(10094.25 - 63)
+
+    position = account.positions[future_instrument]
+    position.set_leverage(4)
+    assert account.position_margin == pytest.approx(300)
+    position.set_cross()
+    assert account.position_margin == pytest.approx(63)
+
+
+def test_future_account_uncached_aggregates(exchange: MagicMock, future_instrument: FutureInstrument) -> None:
+    # the base exchange has no versions, every query computes the values
+    open_orders: List[FutureLimitOrder] = []
+    exchange.get_open_orders = MagicMock(return_value=open_orders)
+    exchange.last_price = MagicMock(return_value=10)
+    account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+
+    assert account.order_margin == 0
+    open_orders.append(FutureLimitOrder(order_id=random_string(6), account=account, instrument=future_instrument,
+                                        quantity=100, price=11))
+    assert account.order_margin == 60.5
+
+
+def test_future_account_running_totals(exchange: MagicMock, future_instrument: FutureInstrument,
+                                       future_instrument2: FutureInstrument) -> None:
+    prices = {future_instrument.symbol: 10., future_instrument2.symbol: 100.}
+    exchange.get_open_orders = MagicMock(return_value=[])
+    exchange.last_price = MagicMock(side_effect=lambda instrument: prices[instrument.symbol])
+    exchange.orders_version = MagicMock(return_value=0)
+    exchange.price_version = MagicMock(return_value=0)
+
+    account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+    for instrument, quantity, price in ((future_instrument, 100, 10), (future_instrument2, -10, 100)):
+        order = FutureLimitOrder(order_id=random_string(6), account=account, instrument=instrument,
+                                 quantity=quantity, price=price)
+        account.deal(Trade(order=order, exec_price=price, exec_quantity=quantity, trade_id=random_string(6)))
+    assert account.unrealised_pnl == pytest.approx(account._unrealised_pnl())
+    assert account.position_margin == pytest.approx(account._position_margin())
+
+    # only the position whose price moved is valued again
+    unmoved = account._position_values[future_instrument2]
+    prices[future_instrument.symbol] = 12.
+    exchange.price_version.return_value = 1
+    assert account.unrealised_pnl == pytest.approx(account._unrealised_pnl())
+    assert account.position_margin == pytest.approx(account._position_margin())
+    assert account._position_values[future_instrument2] is unmoved
+    assert account._position_values[future_instrument][0] == 12.
+
+    # a closed position leaves the totals
+    order = FutureLimitOrder(order_id=random_string(6), account=account, instrument=future_instrument,
+                             quantity=-100, price=12)
+    account.deal(Trade(order=order, exec_price=12, exec_quantity=-100, trade_id=random_string(6)))
+    assert account.unrealised_pnl == pytest.approx(account._unrealised_pnl())
+    assert list(account._position_values) == [future_instrument2]
+    assert account.position_margin == pytest.approx(account._position_margin())
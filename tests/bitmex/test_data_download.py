@@ -23,11 +23,14 @@
 #
 import datetime
 import gzip
+import http.server
 import io
 import os
 import random
 import tempfile
+import threading
 import zlib
+from typing import Generator
 from unittest.mock import MagicMock, patch
 
 import pandas
@@ -37,13 +40,17 @@ from monkq.assets.const import SIDE
 from monkq.const import TICK_DIRECTION
 from monkq.exception import DataDownloadError
 from monkq.exchange.bitmex.const import (
-    INSTRUMENT_FILENAME, QUOTE_FILE_NAME, START_DATE, TRADE_FILE_NAME,
+    DOWNLOAD_TIMEOUT, FUNDING_FILE_NAME, FUNDING_LINK, FUNDING_MAX_RETRY,
+    FUNDING_REQUEST_INTERVAL, INSTRUMENT_FILENAME, MANIFEST_FILE_NAME,
+    QUOTE_FILE_NAME, START_DATE, TRADE_FILE_NAME,
 )
 from monkq.exchange.bitmex.data.download import (
-    BitMexDownloader, BitMexProcessPoints, DatePoint, HDFQuoteStream,
-    HDFTradeStream, QuoteZipFileStream, SymbolsStreamRequest, TarStreamRequest,
+    BitMexDownloader, BitMexFundingPoints, BitMexProcessPoints, DatePoint,
+    DownloadManifest, HDFFundingStream, HDFQuoteStream, HDFTradeStream,
+    QuoteZipFileStream, SymbolsStreamRequest, TarStreamRequest,
     TradeZipFileStream,
 )
+from monkq.utils.filefunc import file_sha256
 from monkq.utils.timefunc import utc_datetime
 from pytz import utc
 from tests.tools import (
@@ -87,6 +94,10 @@ def _mock_stream(self, url: str):  # type:ignore
             break
 
 
+def _mock_ranged_requests(self, offset: int):  # type:ignore
+    return self._stream_requests(self.url), 0, None
+
+
 def _mock_exception_stream(self, url: str):  # type:ignore
     s = 0
     while 1:
@@ -251,6 +262,7 @@ class MockRawStreamRequest(TarStreamRequest):
         super(MockRawStreamRequest, self).__init__(*args, **kwargs)
 
     _stream_requests = _mock_stream
+    _ranged_requests = _mock_ranged_requests
 
 
 class MockTradeZipFileStream(TradeZipFileStream):
@@ -275,6 +287,7 @@ class MockSymbolsStream(SymbolsStreamRequest):
         super(SymbolsStreamRequest, self).__init__(*args, **kwargs)
 
     _stream_requests = _mock_stream
+    _ranged_requests = _mock_ranged_requests
 
 
 def test_symbols_stream_request() -> None:
@@ -293,13 +306,13 @@ def test_raw_stream_request() -> None:
     with tempfile.TemporaryDirectory() as tmp:
         date = utc_datetime(2018, 1, 1)
         outcome = os.path.join(tmp, date.strftime("%Y%m%d") + '.csv.gz')
-        stream = MockRawStreamRequest(point=DatePoint(date, mock_url, tmp), stream=stream_b)
+        stream = MockRawStreamRequest(point=DatePoint(date, mock_url, tmp), stream=gzip.compress(stream_b))
         stream.process()
 
         with open(outcome, 'rb') as f:
             content = f.read()
 
-        assert content == stream_b
+        assert gzip.decompress(content) == stream_b
 
 
 def test_raw_stream_request_exception() -> None:
@@ -314,6 +327,200 @@ def test_raw_stream_request_exception() -> None:
         assert not os.path.exists(outcome)
 
 
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve the `files` of the server, with the range requests if the
+    server `support_range`, and cut the next response after `drop_after`
+    bytes if it's set.
+    """
+
+    def do_GET(self) -> None:
+        server = self.server
+        content = server.files[self.path]  # type: ignore
+        asked = self.headers.get('Range')
+        server.ranges.append(asked)  # type: ignore
+        start = 0
+        if asked and server.support_range:  # type: ignore
+            start = int(asked[len('bytes='):-1])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(len(content)))
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        body = content[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.drop_after is not None:  # type: ignore
+            self.wfile.write(body[:server.drop_after])  # type: ignore
+            server.drop_after = None  # type: ignore
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:  # type: ignore
+        pass
+
+
+@pytest.fixture()
+def http_server() -> Generator[http.server.HTTPServer, None, None]:
+    server = http.server.HTTPServer(('127.0.0.1', 0), RangeHandler)
+    server.files = {}  # type: ignore
+    server.ranges = []  # type: ignore
+    server.support_range = True  # type: ignore
+    server.drop_after = None  # type: ignore
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_raw_stream_request_resume(http_server: http.server.HTTPServer) -> None:
+    content = gzip.compress(os.urandom(200000))
+    http_server.files['/20180101.csv.gz'] = content  # type: ignore
+    http_server.drop_after = 120000  # type: ignore
+    url = 'http://127.0.0.1:{}/20180101.csv.gz'.format(http_server.server_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        outcome = os.path.join(tmp, '20180101.csv.gz')
+        point = DatePoint(utc_datetime(2018, 1, 1), url, tmp)
+        with patch("monkq.exchange.bitmex.data.download.DOWNLOAD_MAX_RESUME", 0):
+            with pytest.raises(DataDownloadError):
+                TarStreamRequest(point=point).process()
+        assert not os.path.exists(outcome)
+        part_size = os.path.getsize(outcome + '.part')
+        assert 0 < part_size <= 120000
+        assert TarStreamRequest.get_start(tmp) == START_DATE
+
+        TarStreamRequest(point=point).process()
+
+        assert http_server.ranges == [None, 'bytes={}-'.format(part_size)]  # type: ignore
+        with open(outcome, 'rb') as f:
+            assert f.read() == content
+        assert not os.path.exists(outcome + '.part')
+        manifest = DownloadManifest(tmp)
+        assert manifest.files == {'20180101.csv.gz': {'size': len(content), 'sha256': file_sha256(outcome)}}
+        assert manifest.verify() == []
+        assert os.path.exists(os.path.join(tmp, MANIFEST_FILE_NAME))
+        assert TarStreamRequest.get_start(tmp) == utc_datetime(2018, 1, 2)
+
+        with open(outcome, 'r+b') as f:
+            f.write(b'broken')
+        assert DownloadManifest(tmp).verify() == ['20180101.csv.gz']
+        os.remove(outcome)
+        assert DownloadManifest(tmp).verify() == ['20180101.csv.gz']
+
+
+def test_raw_stream_request_resume_in_process(http_server: http.server.HTTPServer) -> None:
+    content = gzip.compress(os.urandom(200000))
+    http_server.files['/20180101.csv.gz'] = content  # type: ignore
+    http_server.drop_after = 120000  # type: ignore
+    url = 'http://127.0.0.1:{}/20180101.csv.gz'.format(http_server.server_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        outcome = os.path.join(tmp, '20180101.csv.gz')
+        TarStreamRequest(point=DatePoint(utc_datetime(2018, 1, 1), url, tmp)).process()
+        first, resumed = http_server.ranges  # type: ignore
+        assert first is None
+        assert 0 < int(resumed[len('bytes='):-1]) <= 120000
+        with open(outcome, 'rb') as f:
+            assert f.read() == content
+        assert DownloadManifest(tmp).verify() == []
+
+
+class ShortReadStreamRequest(TarStreamRequest):
+    """
+    End the first response quietly before the size of the content as the
+    older urllib3 does on a dropped connection.
+    """
+    content = gzip.compress(os.urandom(1000))
+
+    def _ranged_requests(self, offset):  # type:ignore
+        if not offset:
+            return iter([self.content[:300]]), 0, len(self.content)
+        return iter([self.content[offset:]]), offset, len(self.content)
+
+
+def test_raw_stream_request_short_read() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        outcome = os.path.join(tmp, '20180101.csv.gz')
+        point = DatePoint(utc_datetime(2018, 1, 1), mock_url, tmp)
+        with patch("monkq.exchange.bitmex.data.download.DOWNLOAD_MAX_RESUME", 0):
+            with pytest.raises(DataDownloadError):
+                ShortReadStreamRequest(point=point).process()
+        # the short part file is kept to be resumed
+        assert os.path.getsize(outcome + '.part') == 300
+        assert not os.path.exists(outcome)
+
+        ShortReadStreamRequest(point=point).process()
+        with open(outcome, 'rb') as f:
+            assert f.read() == ShortReadStreamRequest.content
+        assert not os.path.exists(outcome + '.part')
+
+
+def test_raw_stream_request_resume_without_range(http_server: http.server.HTTPServer) -> None:
+    content = gzip.compress(os.urandom(100000))
+    http_server.files['/20180101.csv.gz'] = content  # type: ignore
+    http_server.support_range = False  # type: ignore
+    url = 'http://127.0.0.1:{}/20180101.csv.gz'.format(http_server.server_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        outcome = os.path.join(tmp, '20180101.csv.gz')
+        point = DatePoint(utc_datetime(2018, 1, 1), url, tmp)
+        with open(outcome + '.part', 'wb') as f:
+            f.write(b'stale')
+        TarStreamRequest(point=point).process()
+        with open(outcome, 'rb') as f:
+            assert f.read() == content
+
+        # a part file longer than the file on the server
+        http_server.support_range = True  # type: ignore
+        with open(outcome + '.part', 'wb') as f:
+            f.write(content + b'stale')
+        TarStreamRequest(point=point).process()
+        with open(outcome, 'rb') as f:
+            assert f.read() == content
+        assert DownloadManifest(tmp).verify() == []
+
+
+def test_raw_stream_request_broken_resume(http_server: http.server.HTTPServer) -> None:
+    content = gzip.compress(os.urandom(100000))
+    http_server.files['/20180101.csv.gz'] = content  # type: ignore
+    url = 'http://127.0.0.1:{}/20180101.csv.gz'.format(http_server.server_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        outcome = os.path.join(tmp, '20180101.csv.gz')
+        point = DatePoint(utc_datetime(2018, 1, 1), url, tmp)
+        # the beginning of another file
+        with open(outcome + '.part', 'wb') as f:
+            f.write(gzip.compress(os.urandom(100000))[:50000])
+        with pytest.raises(DataDownloadError):
+            TarStreamRequest(point=point).process()
+        assert not os.path.exists(outcome)
+        assert not os.path.exists(outcome + '.part')
+        assert DownloadManifest(tmp).files == {}
+
+        TarStreamRequest(point=point).process()
+        with open(outcome, 'rb') as f:
+            assert f.read() == content
+        assert http_server.ranges == ['bytes=50000-', None]  # type: ignore
+
+
+def test_raw_stream_request_complete_part(http_server: http.server.HTTPServer) -> None:
+    content = gzip.compress(os.urandom(100000))
+    http_server.files['/20180101.csv.gz'] = content  # type: ignore
+    url = 'http://127.0.0.1:{}/20180101.csv.gz'.format(http_server.server_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        outcome = os.path.join(tmp, '20180101.csv.gz')
+        with open(outcome + '.part', 'wb') as f:
+            f.write(content)
+        TarStreamRequest(point=DatePoint(utc_datetime(2018, 1, 1), url, tmp)).process()
+        # the 416 of a part file of the whole size doesn't download it again
+        assert http_server.ranges == ['bytes={}-'.format(len(content))]  # type: ignore
+        with open(outcome, 'rb') as f:
+            assert f.read() == content
+        assert DownloadManifest(tmp).verify() == []
+
+
 def test_trade_zip_file_stream() -> None:
     d = utc_datetime(2018, 1, 1)
 
@@ -519,3 +726,132 @@ def test_trade_hdf_stream() -> None:
                 assert XBTUSD['grossValue'][0] == 10494
                 assert XBTUSD['homeNotional'][0] == 11
                 assert XBTUSD['foreignNotional'][0] == 0.00010494
+
+
+def trade_day_gzip(date: datetime.datetime) -> bytes:
+    day = date.strftime('%Y-%m-%d').encode()
+    return gzip.compress(zlib.decompress(stream_trade).replace(b'2018-12-05', day))
+
+
+def test_bitmex_downloader_parallel() -> None:
+    days = [utc_datetime(2018, 1, day) for day in range(1, 6)]
+    bodies = {day.strftime('%Y%m%d'): trade_day_gzip(day) for day in days}
+
+    def get(url: str, stream: bool, timeout: int) -> MagicMock:
+        assert timeout == DOWNLOAD_TIMEOUT
+        response = MagicMock()
+        if url.endswith('20180104.csv.gz'):
+            response.raise_for_status.side_effect = Exception('404')
+        response.raw = io.BytesIO(bodies[url[-15:-7]])
+        return response
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch("monkq.exchange.bitmex.data.download.requests") as m:
+            m.get.side_effect = get
+            b = BitMexDownloader(kind='trade', mode='hdf', dst_dir=tmp, workers=3)
+            b.start, b.end = days[0], days[-1]
+            b.do_all()
+
+        with pandas.HDFStore(os.path.join(tmp, TRADE_FILE_NAME), 'r') as store:
+            XBTUSD = store['XBTUSD']
+        # the days after the failed day are not written though they are fetched
+        assert [index.day for index in XBTUSD.index] == [1, 2, 3]
+        assert XBTUSD['size'].tolist() == [11, 11, 11]
+        assert HDFTradeStream.get_start(tmp) == utc_datetime(2018, 1, 4)
+
+
+def funding_records(start: datetime.datetime, count: int, symbol: str = 'XBTUSD') -> list:
+    return [{'timestamp': (start + relativedelta(hours=8 * i + 4)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+             'symbol': symbol, 'fundingInterval': '2000-01-01T08:00:00.000Z',
+             'fundingRate': 0.0001 * i, 'fundingRateDaily': 0.0003 * i} for i in range(count)]
+
+
+def test_bitmex_funding_points() -> None:
+    points = list(BitMexFundingPoints(utc_datetime(2018, 1, 10), utc_datetime(2018, 3, 1), FUNDING_LINK, 'b'))
+    assert [point.value for point in points] == [utc_datetime(2018, 1, 10), utc_datetime(2018, 2, 10)]
+    assert 'startTime=2018-02-10T00:00:00Z&endTime=2018-03-02T00:00:00Z' in points[1].url
+    assert points[0].url.format(start=500).startswith(
+        'https://www.bitmex.com/api/v1/funding?count=500&start=500&startTime=2018-01-10T00:00:00Z')
+
+
+def test_funding_hdf_stream() -> None:
+    first_page = funding_records(utc_datetime(2018, 1, 1), 300) + \
+        funding_records(utc_datetime(2018, 1, 1), 200, 'ETHUSD')
+    second_page = funding_records(utc_datetime(2018, 4, 10), 3)
+    with patch("monkq.exchange.bitmex.data.download.requests") as m, \
+            patch("monkq.exchange.bitmex.data.download.time") as t:
+        t.monotonic.return_value = 100.
+        m.get.return_value.status_code = 200
+        m.get.return_value.json.side_effect = [first_page, second_page]
+        with tempfile.TemporaryDirectory() as tmp:
+            assert BitMexDownloader(kind='funding', mode='hdf', dst_dir=tmp).start == START_DATE
+
+            point = DatePoint(utc_datetime(2018, 1, 1), 'test_url?start={start}', tmp)
+            HDFFundingStream(point=point).process()
+            assert [c[0][0] for c in m.get.call_args_list] == ['test_url?start=0', 'test_url?start=500']
+            assert m.get.call_args[1] == {'timeout': DOWNLOAD_TIMEOUT}
+            # the requests are FUNDING_REQUEST_INTERVAL seconds apart
+            t.sleep.assert_called_with(FUNDING_REQUEST_INTERVAL)
+
+            with pandas.HDFStore(os.path.join(tmp, FUNDING_FILE_NAME), 'r') as store:
+                xbt = store['XBTUSD']
+                assert len(xbt) == 303
+                assert list(xbt.columns) == ['fundingRate', 'fundingRateDaily']
+                assert xbt.index[1] == utc_datetime(2018, 1, 1, 12)
+                assert xbt['fundingRate'][1] == 0.0001
+                assert len(store['ETHUSD']) == 200
+
+            b = BitMexDownloader(kind='funding', mode='hdf', dst_dir=tmp)
+            assert b.Streamer == HDFFundingStream
+            assert b.start == utc_datetime(2018, 4, 11)
+            assert isinstance(b.process_points(), BitMexFundingPoints)
+
+
+def test_funding_hdf_stream_rate_limit() -> None:
+    limited = MagicMock(status_code=429, headers={'Retry-After': '7'})
+    limited.raise_for_status.side_effect = Exception('429')
+    limited_without_header = MagicMock(status_code=429, headers={})
+    ok = MagicMock(status_code=200)
+    ok.json.return_value = funding_records(utc_datetime(2018, 1, 1), 3)
+    with patch("monkq.exchange.bitmex.data.download.requests") as m, \
+            patch("monkq.exchange.bitmex.data.download.time") as t:
+        t.monotonic.return_value = 0.
+        m.get.side_effect = [limited, limited_without_header, ok]
+        with tempfile.TemporaryDirectory() as tmp:
+            point = DatePoint(utc_datetime(2018, 1, 1), 'test_url?start={start}', tmp)
+            HDFFundingStream(point=point).process()
+            delays = [c[0][0] for c in t.sleep.call_args_list]
+            assert 7 in delays
+            assert FUNDING_REQUEST_INTERVAL * 2 in delays
+            assert m.get.call_count == 3
+            with pandas.HDFStore(os.path.join(tmp, FUNDING_FILE_NAME), 'r') as store:
+                assert len(store['XBTUSD']) == 3
+
+            m.get.side_effect = None
+            m.get.return_value = limited
+            with pytest.raises(DataDownloadError):
+                HDFFundingStream(point=point).process()
+            assert m.get.call_count == 3 + FUNDING_MAX_RETRY + 1
+
+
+def test_funding_hdf_stream_exception() -> None:
+    with patch("monkq.exchange.bitmex.data.download.requests") as m, \
+            patch("monkq.exchange.bitmex.data.download.time") as t:
+        t.monotonic.return_value = 0.
+        m.get.return_value.status_code = 200
+        m.get.return_value.json.return_value = funding_records(utc_datetime(2018, 1, 1), 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            point = DatePoint(utc_datetime(2018, 1, 1), 'test_url?start={start}', tmp)
+            HDFFundingStream(point=point).process()
+
+            m.get.return_value.json.return_value = funding_records(utc_datetime(2018, 2, 1), 3)
+            stream = HDFFundingStream(point=DatePoint(utc_datetime(2018, 2, 1), 'test_url?start={start}', tmp))
+            with patch("monkq.exchange.bitmex.data.download.classify_df") as f:
+                f.return_value = {'XBTUSD': pandas.DataFrame(
+                    {'fundingRate': [0.1], 'fundingRateDaily': [0.3]},
+                    index=pandas.DatetimeIndex([utc_datetime(2018, 2, 1, 4)])), 'ETHUSD': 's'}
+                with pytest.raises(DataDownloadError):
+                    stream.process()
+
+            with pandas.HDFStore(os.path.join(tmp, FUNDING_FILE_NAME), 'r') as store:
+                assert len(store['XBTUSD']) == 3
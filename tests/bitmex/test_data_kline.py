@@ -3,10 +3,12 @@ import json
 import os
 import random
 import tempfile
+from concurrent.futures.process import BrokenProcessPool
 from unittest.mock import patch
 
 import numpy as np
 import pandas
+import pytest
 from monkq.exchange.bitmex.const import (
     INSTRUMENT_FILENAME, KLINE_FILE_NAME, TRADE_FILE_NAME,
 )
@@ -14,7 +16,7 @@ from monkq.exchange.bitmex.data.kline import (
     BitMexKlineTransform, KlineFullFill,
 )
 from monkq.exchange.bitmex.data.utils import (
-    check_1m_data_integrity, fullfill_1m_kline_with_start_end,
+    KlineAggregator, check_1m_data_integrity, fullfill_1m_kline_with_start_end,
     trades_to_1m_kline,
 )
 from monkq.utils.timefunc import utc_datetime
@@ -104,6 +106,39 @@ def test_trade_to_1m_kline() -> None:
     assert outcome['turnover'][-1] == sum(df3['foreignNotional'])
 
 
+def test_kline_aggregator() -> None:
+    rng = np.random.RandomState(1)
+    length = 20000
+    start = int(utc_datetime(2018, 1, 1).timestamp()) * 10 ** 9
+    timestamps = np.sort(rng.randint(0, 5 * 24 * 3600 * 1000, length)) * 10 ** 6 + start
+    # trades right on a minute and on the midnight
+    timestamps[100] = timestamps[100] // (60 * 10 ** 9) * 60 * 10 ** 9
+    timestamps[-1] = int(utc_datetime(2018, 1, 6).timestamp()) * 10 ** 9
+    frame = pandas.DataFrame({'price': rng.uniform(1, 1000, length),
+                              'homeNotional': rng.uniform(0, 1, length),
+                              'foreignNotional': rng.uniform(0, 1000, length)},
+                             index=pandas.DatetimeIndex(timestamps).tz_localize('utc'))
+    # minutes without any trade
+    frame = frame[frame.index.minute % 37 != 5]
+
+    aggregator = KlineAggregator()
+    klines = []
+    position = 0
+    while position < len(frame):
+        size = rng.randint(1, 3000)
+        klines.append(aggregator.update(frame.iloc[position:position + size]))
+        position += size
+    klines.append(aggregator.close())
+    outcome = pandas.concat(klines)
+
+    # a kline belongs to the day its minute starts in
+    days = (frame.index - pandas.Timedelta(1)).floor('min').floor('D')
+    expected = pandas.concat([trades_to_1m_kline(one) for _, one in frame.groupby(days)])
+
+    assert outcome.index.is_unique
+    pandas.testing.assert_frame_equal(outcome, expected[outcome.columns], check_exact=True)
+
+
 def test_check_1m_data_integrity() -> None:
     df1 = random_kline_data(10, utc_datetime(2018, 1, 1, 12, 10))
 
@@ -269,8 +304,8 @@ def test_BitMexKlineTransform_with_data() -> None:
 
         write_hdf(hdf2, target, "TRXH19")
 
-        kline_df1 = random_kline_data(kline_count, utc_datetime(2018, 1, 1, 23, 59))
-        kline_df2 = random_kline_data(kline_count, utc_datetime(2018, 1, 1, 23, 59))
+        kline_df1 = random_kline_data(kline_count, utc_datetime(2018, 1, 2))
+        kline_df2 = random_kline_data(kline_count, utc_datetime(2018, 1, 2))
 
         write_hdf(kline_df1, kline_hdf, "XBTUSD")
 
@@ -282,6 +317,10 @@ def test_BitMexKlineTransform_with_data() -> None:
         with pandas.HDFStore(kline_hdf) as store:
             XBTUSD = store['XBTUSD']
             assert len(XBTUSD) == 13
+            # the last kline of the run before is generated again
+            assert XBTUSD.index[-4] == utc_datetime(2018, 1, 2)
+            assert XBTUSD['close'][-4] == ori1['price'][-1]
+            assert XBTUSD['volume'][-4] == sum(ori1['homeNotional'][-10:])
             assert XBTUSD.index[-3] == utc_datetime(2018, 1, 2, 12, 1)
             assert XBTUSD['high'][-3] == max(df1['price'])
             assert XBTUSD['low'][-3] == min(df1['price'])
@@ -334,7 +373,71 @@ def test_BitMexKlineTransform_with_data() -> None:
             assert TRXH19['turnover'][-1] == sum(df6['foreignNotional'])
 
 
-def test_fullfill_kline() -> None:
+def test_BitMexKlineTransform_midnight_trade() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, TRADE_FILE_NAME)
+
+        df1 = random_trade_frame(60, utc_datetime(2018, 1, 1, 23, 59))
+        write_hdf(df1, target, "XBTUSD")
+
+        b = BitMexKlineTransform(tmp, tmp)
+        b.do_all()
+
+        # the trade exactly on the midnight comes with the trades of the next day
+        midnight = random_trade_frame(1, utc_datetime(2018, 1, 2))
+        df2 = random_trade_frame(10, utc_datetime(2018, 1, 2, 12, 0, 1))
+        write_hdf(midnight.append(df2), target, "XBTUSD")
+
+        b = BitMexKlineTransform(tmp, tmp)
+        b.do_all()
+
+        with pandas.HDFStore(os.path.join(tmp, 'kline.hdf')) as store:
+            XBTUSD = store['XBTUSD']
+            # the trade on the midnight closes the last minute of the first day
+            assert list(XBTUSD.index) == [utc_datetime(2018, 1, 1, 23, 59), utc_datetime(2018, 1, 2),
+                                          utc_datetime(2018, 1, 2, 12, 1)]
+            assert XBTUSD['open'][1] == df1['price'][1]
+            assert XBTUSD['close'][1] == midnight['price'][0]
+            assert XBTUSD['high'][1] == max(df1['price'][1:].append(midnight['price']))
+            assert XBTUSD['volume'][1] == sum(df1['homeNotional'][1:].append(midnight['homeNotional']))
+            assert XBTUSD['volume'][2] == sum(df2['homeNotional'])
+
+
+def test_BitMexKlineTransform_parallel() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, TRADE_FILE_NAME)
+        for i, symbol in enumerate(["XBTUSD", "TRXH19", "XRPZ17"]):
+            frame = random_trade_frame(100, utc_datetime(2018, 1, 1, 23, 58 - i))
+            frame = frame.append(random_trade_frame(100, utc_datetime(2018, 1, 3, 12, i)))
+            write_hdf(frame, target, symbol)
+        serial_dir = os.path.join(tmp, 'serial')
+        parallel_dir = os.path.join(tmp, 'parallel')
+        os.mkdir(serial_dir)
+        os.mkdir(parallel_dir)
+
+        with patch("monkq.exchange.bitmex.data.kline.HDF_TRADE_TO_KLINE_CHUNK_SIZE", 30):
+            BitMexKlineTransform(tmp, serial_dir).do_all()
+            BitMexKlineTransform(tmp, parallel_dir, workers=2).do_all()
+
+        with pandas.HDFStore(os.path.join(serial_dir, KLINE_FILE_NAME)) as serial, \
+                pandas.HDFStore(os.path.join(parallel_dir, KLINE_FILE_NAME)) as parallel:
+            assert sorted(serial.keys()) == sorted(parallel.keys()) == ['/TRXH19', '/XBTUSD', '/XRPZ17']
+            for key in serial.keys():
+                pandas.testing.assert_frame_equal(serial[key], parallel[key])
+
+        # a failed worker doesn't leave the writer waiting for its klines
+        with patch("monkq.exchange.bitmex.data.kline.read_trade_chunks", side_effect=ValueError('broken')):
+            with pytest.raises(ValueError):
+                BitMexKlineTransform(tmp, os.path.join(tmp, 'serial'), workers=2).do_all()
+
+        # nor a worker died without the end of its key
+        with patch("monkq.exchange.bitmex.data.kline.read_trade_chunks", side_effect=lambda *args: os._exit(1)):
+            with pytest.raises(BrokenProcessPool):
+                BitMexKlineTransform(tmp, os.path.join(tmp, 'serial'), workers=2).do_all()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_fullfill_kline(workers: int) -> None:
     instruments_data = [
         {
             'symbol': "XBTUSD",
@@ -386,7 +489,7 @@ def test_fullfill_kline() -> None:
         write_hdf(xrpz17, kline_file, "XRPZ17")
         write_hdf(xmrj17, kline_file, "XMRJ17")
 
-        fullfill = KlineFullFill(tmp)
+        fullfill = KlineFullFill(tmp, workers)
 
         fullfill.do_all()
 
@@ -454,3 +557,55 @@ def test_fullfill_kline() -> None:
         compare_datafrome_index(xmrj17, XMRJ17, random.randint(1, len(XMRJ17)))
         compare_datafrome_index(xmrj17, XMRJ17, random.randint(1, len(XMRJ17)))
         store.close()
+
+
+def test_fullfill_kline_incremental() -> None:
+    instruments_data = [
+        {
+            'symbol': "XBTUSD",
+            'listing': '2016-05-04T12:00:00.000Z',
+            'expiry': None
+        },
+        {
+            'symbol': "TRXH19",
+            'listing': '2018-12-12T06:00:00.000Z',
+            'expiry': '2019-03-29T12:00:00.000Z'
+        },
+    ]
+    xbtusd1 = random_kline_data(100, utc_datetime(2016, 5, 4, 13))
+    xbtusd2 = random_kline_data(100, utc_datetime(2016, 5, 6, 12))
+    trxh19 = random_kline_data(100, utc_datetime(2018, 12, 13))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, INSTRUMENT_FILENAME), 'w') as f:
+            json.dump(instruments_data, f)
+        kline_file = os.path.join(tmp, KLINE_FILE_NAME)
+
+        write_hdf(xbtusd1, kline_file, "XBTUSD")
+        # the fixed format written by the full fill before
+        trxh19.to_hdf(kline_file, "TRXH19", format='fixed')
+
+        KlineFullFill(tmp).do_all()
+
+        with pandas.HDFStore(kline_file) as store:
+            assert store.get_storer('TRXH19').is_table
+            assert store.get_storer('TRXH19').attrs.fullfill_mark == utc_datetime(2018, 12, 13)
+            assert store.get_storer('XBTUSD').attrs.fullfill_mark == utc_datetime(2016, 5, 5)
+            first = store['XBTUSD']
+
+        write_hdf(xbtusd2, kline_file, "XBTUSD")
+        with patch("monkq.exchange.bitmex.data.kline.fullfill_1m_kline_with_start_end",
+                   wraps=fullfill_1m_kline_with_start_end) as fill:
+            KlineFullFill(tmp).do_all()
+            # only the new klines of XBTUSD are read and full filled
+            assert fill.call_count == 1
+            assert len(fill.call_args[0][0]) == len(xbtusd2) + 1
+
+        with pandas.HDFStore(kline_file) as store:
+            XBTUSD = store['XBTUSD']
+            assert store.get_storer('XBTUSD').attrs.fullfill_mark == utc_datetime(2016, 5, 7)
+
+    expected = fullfill_1m_kline_with_start_end(xbtusd1.append(xbtusd2), utc_datetime(2016, 5, 4, 12, 1),
+                                                utc_datetime(2016, 5, 7))
+    pandas.testing.assert_frame_equal(XBTUSD, expected[XBTUSD.columns])
+    pandas.testing.assert_frame_equal(XBTUSD.iloc[:len(first)], first)
@@ -28,14 +28,20 @@ import tempfile
 from typing import Generator
 from unittest.mock import MagicMock
 
+import pandas
 import pytest
 from monkq.assets.instrument import (
     CallOptionInstrument, FutureInstrument, PerpetualInstrument,
     PutOptionInstrument,
 )
-from monkq.exchange.bitmex.const import INSTRUMENT_FILENAME
+from monkq.exchange.bitmex.const import (
+    FUNDING_FILE_NAME, INSTRUMENT_FILENAME, KLINE_FILE_NAME, KLINE_MMAP_DIR,
+)
 from monkq.exchange.bitmex.data.loader import BitmexDataloader
-from monkq.utils.timefunc import utc_datetime
+from monkq.klinearray import (
+    LazyKlineArrayStore, MemmapKlineStore, convert_kline_hdf,
+)
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
 from tests.tools import get_resource_path
 
 
@@ -163,9 +169,69 @@ def test_bitmex_dataloader_kline_data(exchange: MagicMock, tem_data_dir: str) ->
     kline_df = dataloader.get_kline(instrument.symbol, context.now, 50)
     assert len(kline_df) == 50
     assert kline_df.index[-1] == utc_datetime(2015, 12, 25, 11, 49)
+    kline_array = dataloader.get_kline_array(instrument.symbol, datetime_to_ns(context.now), 50)
+    assert (kline_array == kline_df.values).all()
 
     context.now = utc_datetime(2016, 1, 1, 11, 12)
 
     assert dataloader.get_last_price(instrument.symbol, context.now) == 0
 
     dataloader.all_data(instrument.symbol)
+
+    assert dataloader.cache_stats()['tables'].keys() == {instrument.symbol}
+
+
+def test_bitmex_dataloader_cache_size(tem_data_dir: str) -> None:
+    dataloader = BitmexDataloader(tem_data_dir, cache_size=1, pinned=['XBTZ15'])
+    timestamp = utc_datetime(2015, 12, 25, 11, 49)
+
+    assert dataloader.get_last_price('XBTZ15', timestamp) == 453.5
+    dataloader.get_last_price('XBTN15', timestamp)
+    dataloader.get_last_price('XBUZ15', timestamp)
+
+    stats = dataloader.cache_stats()
+    assert stats['tables'].keys() == {'XBTZ15', 'XBUZ15'}
+    assert stats['evictions'] == 1
+
+
+def test_bitmex_dataloader_funding_rates(tem_data_dir: str) -> None:
+    dataloader = BitmexDataloader(tem_data_dir)
+    assert dataloader.funding_rates(['XBTUSD']) == {}
+
+    frame = pandas.DataFrame({'fundingRate': [0.001, -0.002], 'fundingRateDaily': [0.003, -0.006]},
+                             index=pandas.DatetimeIndex([utc_datetime(2018, 1, 1, 4), utc_datetime(2018, 1, 1, 12)]))
+    frame.to_hdf(os.path.join(tem_data_dir, FUNDING_FILE_NAME), 'XBTUSD', format='table')
+    rates = dataloader.funding_rates(['XBTUSD', 'ETHUSD'])
+    assert list(rates) == ['XBTUSD']
+    assert rates['XBTUSD'].tolist() == [0.001, -0.002]
+    assert rates['XBTUSD'].index[1] == utc_datetime(2018, 1, 1, 12)
+
+
+def test_bitmex_dataloader_memmap_kline(tem_data_dir: str) -> None:
+    kline_file = os.path.join(tem_data_dir, KLINE_FILE_NAME)
+    assert isinstance(BitmexDataloader(tem_data_dir)._kline_store, LazyKlineArrayStore)
+
+    convert_kline_hdf(kline_file, os.path.join(tem_data_dir, KLINE_MMAP_DIR))
+    dataloader = BitmexDataloader(tem_data_dir)
+    assert isinstance(dataloader._kline_store, MemmapKlineStore)
+    assert dataloader.get_last_price('XBTZ15', utc_datetime(2015, 12, 25, 11, 49)) == 453.5
+
+    # the kline data changed after the conversion
+    os.utime(kline_file, ns=(0, 0))
+    assert isinstance(BitmexDataloader(tem_data_dir)._kline_store, LazyKlineArrayStore)
+
+
+def test_bitmex_dataloader_range(tem_data_dir: str) -> None:
+    start = utc_datetime(2015, 12, 25, 11)
+    dataloader = BitmexDataloader(tem_data_dir, start=start, end=utc_datetime(2015, 12, 25, 12))
+    timestamp = utc_datetime(2015, 12, 25, 11, 49)
+
+    assert dataloader.get_last_price('XBTZ15', timestamp) == 453.5
+    assert len(dataloader.all_data('XBTZ15')) == 61
+
+    # asking for more bars than loaded reloads the kline data
+    kline_df = dataloader.get_kline('XBTZ15', timestamp, 100)
+    assert len(kline_df) == 100
+    assert kline_df.index[-1] == timestamp
+    assert len(dataloader.get_kline_array('XBTZ15', datetime_to_ns(timestamp), 200)) == 200
+    assert len(dataloader.all_data('XBTZ15')) == 212
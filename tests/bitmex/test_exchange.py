@@ -23,20 +23,28 @@
 #
 
 import json
+import os
 from asyncio import AbstractEventLoop
 from typing import Generator
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+import numpy
 import pandas
 import pytest
 from asynctest import CoroutineMock
-from monkq.assets.instrument import FutureInstrument
+from monkq.assets.account import FutureAccount
+from monkq.assets.instrument import FutureInstrument, PerpetualInstrument
+from monkq.assets.order import FutureLimitOrder
+from monkq.assets.positions import FuturePosition
+from monkq.assets.trade import Trade
+from monkq.exchange.bitmex.const import FUNDING_FILE_NAME
 from monkq.exchange.bitmex.exchange import (
     BitmexExchange, BitmexSimulateExchange, bitmex_info,
 )
+from monkq.klinearray import CLOSE
 from monkq.tradecounter import TradeCounter
 from monkq.utils.id import gen_unique_id
-from monkq.utils.timefunc import utc_datetime
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
 
 from ..tools import get_resource_path
 
@@ -125,20 +133,39 @@ async def test_bitmex_exchange_simulate(tem_data_dir: str, instrument: FutureIns
     trade_counter = TradeCounter(MagicMock())
     context.trade_counter = trade_counter
     context.settings.DATA_DIR = tem_data_dir
+    context.settings.START_TIME = utc_datetime(2016, 10, 3, 12)
+    context.settings.END_TIME = utc_datetime(2016, 10, 4)
+    context.settings.DATA_WARMUP = 1000
     sim_exchange = BitmexSimulateExchange(context, 'bitmex', {"START_WALLET_BALANCE": 1000000})
 
     await sim_exchange.setup()
     instrument = instrument
     context.now = utc_datetime(2016, 10, 3, 12, 30)
+    context.now_ns = datetime_to_ns(context.now)
     assert await sim_exchange.get_last_price(instrument) == 63744.0
+    # the prices of a bar are looked up once
+    with patch.object(sim_exchange._data, 'get_last_price', wraps=sim_exchange._data.get_last_price) as get_price:
+        assert sim_exchange.last_price(instrument) == 63744.0
+        get_price.assert_not_called()
+        context.now = utc_datetime(2016, 10, 3, 12, 31)
+        context.now_ns = datetime_to_ns(context.now)
+        assert sim_exchange.last_price(instrument) == sim_exchange.last_price(instrument)
+        get_price.assert_called_once_with(instrument.symbol, context.now)
+        context.now = utc_datetime(2016, 10, 3, 12, 30)
+        context.now_ns = datetime_to_ns(context.now)
+    bar = sim_exchange.last_bar(instrument)
+    assert bar is not None and bar[CLOSE] == 63744.0
 
     assert sim_exchange.exchange_info() == bitmex_info
 
+    assert sim_exchange.price_version() == context.now_ns
+    orders_version = sim_exchange.orders_version()
     order_id = await sim_exchange.place_limit_order(account, instrument, 10, 100, 'order_text')
 
     market_order_id = await sim_exchange.place_market_order(account, instrument, 100, 'order_text2')
 
     await sim_exchange.cancel_order(account, order_id)
+    assert sim_exchange.orders_version() == orders_version + 3
 
     open_orders = await sim_exchange.open_orders(account)
 
@@ -156,6 +183,44 @@ async def test_bitmex_exchange_simulate(tem_data_dir: str, instrument: FutureIns
 
     assert kline.index[-1] == utc_datetime(2016, 10, 3, 12, 30)
 
+    kline_array = await sim_exchange.get_kline(instrument, raw=True)
+    numpy.testing.assert_array_equal(kline_array, kline.values)
+    assert not kline_array.flags.writeable
+    numpy.testing.assert_array_equal(sim_exchange.get_kline_array(instrument, 10), kline.values[-10:])
+
     sim_exchange.match_open_orders()
 
     sim_exchange.all_data(instrument)
+
+
+def test_bitmex_exchange_simulate_funding(tem_data_dir: str) -> None:
+    frame = pandas.DataFrame({'fundingRate': [0.001, 0.002], 'fundingRateDaily': [0.003, 0.006]},
+                             index=pandas.DatetimeIndex([utc_datetime(2016, 10, 3, 12, 30),
+                                                         utc_datetime(2016, 10, 3, 20, 30)]))
+    frame.to_hdf(os.path.join(tem_data_dir, FUNDING_FILE_NAME), 'XBJZ16', format='table')
+    context = MagicMock()
+    context.trade_counter = TradeCounter(MagicMock())
+    context.settings.DATA_DIR = tem_data_dir
+    context.settings.START_TIME = utc_datetime(2016, 10, 3, 12)
+    context.settings.END_TIME = utc_datetime(2016, 10, 4)
+    context.settings.DATA_WARMUP = 1000
+    sim_exchange = BitmexSimulateExchange(context, 'bitmex', {})
+    # the test data has no perpetual contract, take one of the futures as one
+    instrument = PerpetualInstrument(exchange=sim_exchange, symbol='XBJZ16')
+    sim_exchange._data.instruments['XBJZ16'] = instrument
+    account = FutureAccount(exchange=sim_exchange, position_cls=FuturePosition, wallet_balance=10000)
+
+    context.now = utc_datetime(2016, 10, 3, 12, 29)
+    context.now_ns = datetime_to_ns(context.now)
+    assert instrument.funding_rate == 0.001
+    order = FutureLimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument, quantity=1, price=100)
+    order.deal(Trade(order, 100, 1, gen_unique_id()))
+    wallet_balance = account.wallet_balance
+    sim_exchange.match_open_orders()
+    assert account.wallet_balance == wallet_balance
+
+    context.now = utc_datetime(2016, 10, 3, 12, 30)
+    context.now_ns = datetime_to_ns(context.now)
+    assert instrument.funding_rate == 0.002
+    sim_exchange.match_open_orders()
+    assert account.wallet_balance == pytest.approx(wallet_balance - instrument.last_price * 0.001)
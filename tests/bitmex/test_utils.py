@@ -21,9 +21,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import gzip
+
+import numpy
+import pandas
 from monkq.assets.const import SIDE
 from monkq.const import TICK_DIRECTION
-from monkq.exchange.bitmex.data.utils import read_trade_tar
+from monkq.exchange.bitmex.data.utils import (
+    TIMESTAMP_FORMAT, classify_df, map_category, parse_timestamps,
+    read_trade_tar,
+)
 from tests.tools import get_resource_path
 
 
@@ -37,3 +44,45 @@ def test_read_trade_tar() -> None:
     assert df['tickDirection'][1] == TICK_DIRECTION.ZERO_MINUS_TICK.value
     assert df['tickDirection'][2] == TICK_DIRECTION.PLUS_TICK.value
     assert df['tickDirection'][3] == TICK_DIRECTION.ZERO_PLUS_TICK.value
+
+    with gzip.open(path, 'rt') as f:
+        timestamps = pandas.read_csv(f, usecols=['timestamp'])['timestamp']
+    expected = pandas.to_datetime(timestamps, format=TIMESTAMP_FORMAT, utc=True)
+    assert (df['timestamp'].values == expected.values).all()
+    assert str(df['timestamp'].dt.tz) == 'UTC'
+
+
+def test_parse_timestamps() -> None:
+    values = numpy.array(['2018-12-05D00:00:25.948313000', '2018-12-05D23:59:59.999999999'], dtype=object)
+    parsed = parse_timestamps(values)
+    assert list(parsed) == [pandas.Timestamp('2018-12-05 00:00:25.948313', tz='UTC'),
+                            pandas.Timestamp('2018-12-05 23:59:59.999999999', tz='UTC')]
+
+    # a shorter fraction is parsed by pandas
+    values = numpy.array(['2018-12-05D00:00:25.948313000', '2018-12-05D00:00:26.5'], dtype=object)
+    assert list(parse_timestamps(values)) == [pandas.Timestamp('2018-12-05 00:00:25.948313', tz='UTC'),
+                                              pandas.Timestamp('2018-12-05 00:00:26.5', tz='UTC')]
+    assert len(parse_timestamps(numpy.array([], dtype=object))) == 0
+
+
+def test_map_category() -> None:
+    column = pandas.Series(['Buy', 'Sell', None, 'Other', 'Buy'], dtype='category')
+    values = map_category(column, {'Buy': SIDE.BUY.value, 'Sell': SIDE.SELL.value}, SIDE.UNKNOWN.value)
+    assert values.tolist() == [SIDE.BUY.value, SIDE.SELL.value, SIDE.UNKNOWN.value,
+                               SIDE.UNKNOWN.value, SIDE.BUY.value]
+    assert values.dtype == numpy.float64
+
+
+def test_classify_df() -> None:
+    df = pandas.DataFrame({'symbol': ['XBTUSD', 'ETHUSD', 'XBTUSD', None, 'ADAZ18', 'ETHUSD'],
+                           'price': numpy.arange(6.)},
+                          index=pandas.date_range('2018-01-01', periods=6, freq='S', tz='utc'))
+    out = classify_df(df, 'symbol')
+    assert list(out) == ['XBTUSD', 'ETHUSD', 'ADAZ18']
+    for symbol, part in out.items():
+        expected = df[df['symbol'] == symbol]
+        del expected['symbol']
+        pandas.testing.assert_frame_equal(part, expected)
+
+    assert classify_df(df, 'symbol', delete_column=False)['ETHUSD']['symbol'].tolist() == ['ETHUSD', 'ETHUSD']
+    assert classify_df(df.iloc[:0], 'symbol') == {}
@@ -33,6 +33,7 @@ from monkq.exception import SettingError
 from monkq.exchange.bitmex.exchange import BitmexSimulateExchange
 from monkq.stat import Statistic
 from monkq.tradecounter import TradeCounter
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
 
 
 def test_context_load_default() -> None:
@@ -122,3 +123,16 @@ def test_context_load_accounts_error() -> None:
 
 def test_context_load_exchanges_error() -> None:
     pass
+
+
+def test_context_now_ns() -> None:
+    settings = Setting()
+    context = Context(settings)
+    assert context.now == settings.START_TIME  # type:ignore
+    assert context.now_ns == datetime_to_ns(settings.START_TIME)  # type:ignore
+
+    context.now_ns = datetime_to_ns(utc_datetime(2018, 1, 2, 3, 4))
+    assert context.now == utc_datetime(2018, 1, 2, 3, 4)
+
+    context.now = utc_datetime(2018, 2, 1)
+    assert context.now_ns == datetime_to_ns(utc_datetime(2018, 2, 1))
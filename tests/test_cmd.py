@@ -25,7 +25,12 @@ import os
 import tempfile
 from unittest.mock import patch
 
+import pytest
 from monkq.__main__ import cmd_main
+from monkq.exception import CommandError
+from monkq.exchange.bitmex.const import KLINE_MMAP_DIR
+from monkq.exchange.bitmex.data.download import DownloadManifest
+from monkq.klinearray import MemmapKlineStore
 
 
 def test_download() -> None:
@@ -33,10 +38,44 @@ def test_download() -> None:
         with tempfile.TemporaryDirectory() as tem_dir:
             cmd_main.main(['download', '--kind', 'trade', '--dst_dir', tem_dir], standalone_mode=False)
 
-            downloader.assert_called_with('trade', 'hdf', tem_dir)
+            downloader.assert_called_with('trade', 'hdf', tem_dir, 1)
             obj = downloader('trade', 'hdf', os.path.join(tem_dir, 'csv#trade'))
             obj.do_all.assert_called()
 
+            cmd_main.main(['download', '--kind', 'quote', '--dst_dir', tem_dir, '-w', '4'], standalone_mode=False)
+            downloader.assert_called_with('quote', 'hdf', tem_dir, 4)
+
+    with patch("monkq.__main__.BitMexKlineTransform") as transform, patch("monkq.__main__.KlineFullFill") as fullfill:
+        with tempfile.TemporaryDirectory() as tem_dir:
+            cmd_main.main(['download', '--kind', 'kline', '--dst_dir', tem_dir, '-w', '4'], standalone_mode=False)
+            transform.assert_called_with(tem_dir, tem_dir, 4)
+            transform().do_all.assert_called()
+            fullfill.assert_called_with(tem_dir, 4)
+            fullfill().do_all.assert_called()
+
+
+def test_verify() -> None:
+    with tempfile.TemporaryDirectory() as tem_dir:
+        with open(os.path.join(tem_dir, '20180101.csv.gz'), 'wb') as f:
+            f.write(b'trades')
+        DownloadManifest(tem_dir).add('20180101.csv.gz')
+        cmd_main.main(['verify', '--dst_dir', tem_dir], standalone_mode=False)
+
+        with open(os.path.join(tem_dir, '20180101.csv.gz'), 'wb') as f:
+            f.write(b'trade')
+        with pytest.raises(CommandError):
+            cmd_main.main(['verify', '--dst_dir', tem_dir], standalone_mode=False)
+
+
+def test_cachekline(tem_data_dir: str) -> None:
+    cmd_main.main(['cachekline', '--data_dir', tem_data_dir], standalone_mode=False)
+
+    assert MemmapKlineStore.available(os.path.join(tem_data_dir, KLINE_MMAP_DIR))
+
+    with tempfile.TemporaryDirectory() as tem_dir:
+        with pytest.raises(CommandError):
+            cmd_main.main(['cachekline', '--data_dir', tem_dir], standalone_mode=False)
+
 
 def test_startstrategy() -> None:
     with tempfile.TemporaryDirectory() as tem_dir:
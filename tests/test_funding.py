@@ -0,0 +1,107 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from unittest.mock import MagicMock
+
+import pandas
+import pytest
+from monkq.assets.account import FutureAccount
+from monkq.assets.instrument import PerpetualInstrument
+from monkq.assets.order import FutureLimitOrder
+from monkq.assets.positions import FuturePosition
+from monkq.assets.trade import Trade
+from monkq.exchange.base import BaseExchange, BaseSimExchange
+from monkq.funding import FundingSchedule
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
+
+
+def funding_series(start: int, rates: list) -> pandas.Series:
+    index = pandas.date_range(utc_datetime(2018, 1, 1, start), periods=len(rates), freq='8H')
+    return pandas.Series(rates, index=index)
+
+
+def test_funding_schedule_rate() -> None:
+    schedule = FundingSchedule({'XBTUSD': funding_series(4, [0.001, 0.002, -0.003])})
+    assert schedule.rate('XBTUSD', datetime_to_ns(utc_datetime(2018, 1, 1))) == 0.001
+    # the rate of the funding at 12:00 is known from 04:00
+    assert schedule.rate('XBTUSD', datetime_to_ns(utc_datetime(2018, 1, 1, 4))) == 0.002
+    assert schedule.rate('XBTUSD', datetime_to_ns(utc_datetime(2018, 1, 1, 13))) == -0.003
+    assert schedule.rate('XBTUSD', datetime_to_ns(utc_datetime(2018, 1, 3))) == -0.003
+    assert schedule.rate('ETHUSD', datetime_to_ns(utc_datetime(2018, 1, 1))) == 0
+
+    empty = FundingSchedule({})
+    assert empty.due(datetime_to_ns(utc_datetime(2018, 1, 1))) == slice(0, 0)
+    assert empty.accrue([MagicMock()], datetime_to_ns(utc_datetime(2018, 1, 1))) == 0
+
+
+def test_funding_schedule_due() -> None:
+    schedule = FundingSchedule({'XBTUSD': funding_series(4, [0.001, 0.002, 0.003]),
+                                'ETHUSD': funding_series(12, [0.01])})
+    assert list(schedule.rows) == ['XBTUSD', 'ETHUSD']
+    assert schedule.rates.tolist() == [[0.001, 0.002, 0.003], [0, 0.01, 0]]
+
+    assert schedule.due(datetime_to_ns(utc_datetime(2018, 1, 1, 4))) == slice(0, 1)
+    assert schedule.due(datetime_to_ns(utc_datetime(2018, 1, 1, 4, 1))) == slice(1, 1)
+    # a clock stepping over several fundings gets all of them
+    assert schedule.due(datetime_to_ns(utc_datetime(2018, 1, 2))) == slice(1, 3)
+
+    late = FundingSchedule({'XBTUSD': funding_series(4, [0.001, 0.002, 0.003])})
+    assert late.due(datetime_to_ns(utc_datetime(2018, 1, 1, 13))) == slice(2, 2)
+
+
+def test_funding_accrue() -> None:
+    exchange = MagicMock(BaseSimExchange)
+    exchange.orders_version.return_value = None
+    exchange.price_version.return_value = None
+    exchange.last_price.return_value = 100
+    exchange.funding_rate.return_value = 0.001
+    xbt = PerpetualInstrument(exchange=exchange, symbol='XBTUSD')
+    eth = PerpetualInstrument(exchange=exchange, symbol='ETHUSD')
+    assert xbt.funding_rate == 0.001
+    # the exchanges without the funding history
+    live: BaseExchange = BaseExchange(MagicMock(), 'live', {})
+    assert PerpetualInstrument(exchange=live, symbol='XBTUSD').funding_rate == 0  # type: ignore
+    assert PerpetualInstrument(exchange=None, symbol='XBTUSD').funding_rate == 0
+    schedule = FundingSchedule({'XBTUSD': funding_series(4, [0.001, 0.002]),
+                                'ETHUSD': funding_series(4, [0.01, 0.02])})
+
+    long_account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+    short_account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+    for account, instrument, quantity in ((long_account, xbt, 10), (long_account, eth, -5), (short_account, xbt, -10)):
+        order = FutureLimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument,
+                                 quantity=quantity, price=100)
+        order.deal(Trade(order, 100, quantity, gen_unique_id()))
+    # positions without a funding history are skipped
+    long_account.positions[MagicMock()]
+
+    balances = [long_account.wallet_balance, short_account.wallet_balance]
+    assert schedule.accrue([long_account, short_account], datetime_to_ns(utc_datetime(2018, 1, 1))) == 0
+    paid = schedule.accrue([long_account, short_account], datetime_to_ns(utc_datetime(2018, 1, 1, 4)))
+    # the long pays 1000 * 0.001 and gets 500 * 0.01 on the short, the short gets 1000 * 0.001
+    assert long_account.wallet_balance == pytest.approx(balances[0] - 1 + 5)
+    assert short_account.wallet_balance == pytest.approx(balances[1] + 1)
+    assert paid == pytest.approx(-5)
+
+    schedule.accrue([long_account, short_account], datetime_to_ns(utc_datetime(2018, 1, 2)))
+    assert short_account.wallet_balance == pytest.approx(balances[1] + 3)
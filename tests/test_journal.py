@@ -0,0 +1,115 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import pickle
+from unittest.mock import MagicMock
+
+import numpy
+import pytest
+from monkq.assets.instrument import Instrument
+from monkq.assets.order import LimitOrder, MarketOrder, StopMarketOrder
+from monkq.assets.trade import Trade
+from monkq.journal import OrderJournal, TradeJournal
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
+
+
+def make_order(symbol: str, quantity: float, price: float) -> LimitOrder:
+    instrument = Instrument(exchange=None, symbol=symbol, taker_fee=0.001)
+    return LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument,
+                      quantity=quantity, price=price)
+
+
+def test_trade_journal() -> None:
+    journal = TradeJournal(capacity=2)
+    trades = []
+    for i in range(5):
+        order = make_order(['XBTUSD', 'ETHUSD'][i % 2], 1 if i % 2 else -1, 100 + i)
+        trade = Trade(order, order.price, order.quantity, gen_unique_id(), utc_datetime(2018, 1, 1, i))
+        journal.append(trade, 0)
+        trades.append(trade)
+
+    assert len(journal) == 5
+    assert len(journal._rows) == 8
+    assert journal.strings == ['XBTUSD', 'ETHUSD']
+    assert journal.rows['symbol'].tolist() == [0, 1, 0, 1, 0]
+    with pytest.raises(ValueError):
+        journal.rows['exec_price'][0] = 1
+
+    frame = journal.to_frame()
+    assert [row.to_dict() for _, row in frame.iterrows()] == [trade.to_dict() for trade in trades]
+
+    # a trade without time takes the time it is collected at
+    journal.append(Trade(trades[0].order, 1, 1, gen_unique_id()), datetime_to_ns(utc_datetime(2018, 2, 1)))
+    assert journal.to_frame()['trade_datetime'].iloc[-1] == utc_datetime(2018, 2, 1)
+
+    loaded = pickle.loads(pickle.dumps(journal))
+    assert len(loaded._rows) == len(loaded) == 6
+    numpy.testing.assert_array_equal(loaded.rows, journal.rows)
+    loaded.append(trades[1], 0)
+    assert loaded.rows['symbol'][-1] == 1
+
+
+def test_order_journal() -> None:
+    journal = OrderJournal()
+    assert journal.to_frame().empty
+
+    limit_order = make_order('XBTUSD', 10, 100)
+    market_order = MarketOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=limit_order.instrument,
+                               quantity=-10, text='close')
+    stop_order = StopMarketOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=limit_order.instrument,
+                                 quantity=-10, stop_price=90)
+    for order in (limit_order, market_order, stop_order):
+        journal.append(order, datetime_to_ns(utc_datetime(2018, 1, 1)))
+
+    frame = journal.to_frame()
+    assert frame['order_id'].tolist() == [limit_order.order_id, market_order.order_id, stop_order.order_id]
+    assert frame['order_type'].tolist() == ['limit', 'market', 'stop_market']
+    assert frame['price'][0] == 100 and numpy.isnan(frame['price'][1])
+    assert frame['text'].tolist() == ['', 'close', '']
+    assert frame['symbol'].tolist() == ['XBTUSD'] * 3
+    assert (frame['submit_datetime'] == utc_datetime(2018, 1, 1)).all()
+    assert frame['state'].tolist() == ['not_traded'] * 3
+    assert journal.submitted == 3
+
+
+def test_order_journal_states() -> None:
+    journal = OrderJournal()
+    order = make_order('XBTUSD', 10, 100)
+    order.submit_datetime = utc_datetime(2018, 1, 1)
+    journal.append(order, datetime_to_ns(utc_datetime(2018, 1, 1)))
+    order.deal(Trade(order, 100, 4, gen_unique_id()))
+    journal.append(order, datetime_to_ns(utc_datetime(2018, 1, 2)))
+    journal.clear()
+    journal.append(order, datetime_to_ns(utc_datetime(2018, 1, 3)), cancelled=True)
+    order.deal(Trade(order, 100, 6, gen_unique_id()))
+    journal.append(order, datetime_to_ns(utc_datetime(2018, 1, 4)))
+
+    frame = journal.to_frame()
+    assert frame['state'].tolist() == ['cancelled', 'full_traded']
+    assert frame['traded_quantity'].tolist() == [4, 10]
+    assert frame['update_datetime'].tolist() == [utc_datetime(2018, 1, 3), utc_datetime(2018, 1, 4)]
+    assert (frame['submit_datetime'] == utc_datetime(2018, 1, 1)).all()
+    # the order is counted once, the rows dropped by clear included
+    assert journal.submitted == 1
+    assert pickle.loads(pickle.dumps(journal)).submitted == 1
@@ -0,0 +1,206 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import datetime
+import os
+import tempfile
+
+import numpy as np
+import pandas
+import pytest
+from monkq.exception import DataError
+from monkq.klinearray import (
+    CLOSE, KLINE_COLUMNS, MANIFEST_FILE_NAME, ONE_MINUTE_NS, KlineArray,
+    LazyKlineArrayStore, MemmapKlineStore, convert_kline_hdf,
+    normalize_kline_frame, read_kline_range,
+)
+from monkq.utils.dataframe import kline_count_window
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
+from tests.tools import get_resource_path, random_kline_data
+
+
+def test_kline_array() -> None:
+    df = normalize_kline_frame(random_kline_data(100, utc_datetime(2018, 1, 1)))
+    kline = KlineArray.from_frame(df)
+
+    assert kline.length == 100
+    assert kline.start_ns == datetime_to_ns(df.index[0])
+    assert kline.step_ns == ONE_MINUTE_NS
+    assert np.shares_memory(kline.values, df.values)
+    assert not kline.values.flags.writeable
+
+    last = datetime_to_ns(utc_datetime(2018, 1, 1))
+    assert kline.index_of(last) == 99
+    assert kline.last_price(last) == df.iloc[-1]['close']
+    # not an exact minute uses the bar before
+    assert kline.last_price(last - 30 * 10 ** 9) == df.iloc[-2]['close']
+    bar = kline.bar(last)
+    assert bar is not None and bar[CLOSE] == df.iloc[-1]['close']
+
+    assert kline.last_price(last + ONE_MINUTE_NS) is None
+    assert kline.last_price(kline.start_ns - 1) is None
+    assert kline.bar(last + ONE_MINUTE_NS) is None
+
+
+@pytest.mark.parametrize('minute,second,count', [
+    (0, 0, 10), (0, 30, 10), (58, 0, 200), (-10, 0, 50), (0, 0, 1),
+    (5, 0, 10), (-98, 0, 5), (-101, 0, 5), (-99, 30, 5),
+])
+def test_kline_array_window(minute: int, second: int, count: int) -> None:
+    df = normalize_kline_frame(random_kline_data(100, utc_datetime(2018, 1, 1)))
+    kline = KlineArray.from_frame(df)
+    timestamp = utc_datetime(2018, 1, 1) + datetime.timedelta(minutes=minute, seconds=second)
+
+    window = kline.window(datetime_to_ns(timestamp), count)
+
+    expected = kline_count_window(df, timestamp, count)
+    np.testing.assert_array_equal(window, expected.values)
+    assert not window.flags.writeable
+    if len(window):
+        assert np.shares_memory(window, kline.values)
+
+
+def test_normalize_kline_frame() -> None:
+    df = random_kline_data(10, utc_datetime(2018, 1, 1))
+    gap = df.drop(df.index[3:5])
+
+    normalized = normalize_kline_frame(gap)
+
+    assert list(normalized.columns) == KLINE_COLUMNS
+    assert len(normalized) == 10
+    assert normalized.index.freq == 'T'
+    assert np.isnan(normalized.iloc[3]['close'])
+    assert normalized.iloc[5]['close'] == df.iloc[5]['close']
+
+
+def test_lazy_kline_array_store() -> None:
+    store = LazyKlineArrayStore(get_resource_path('test_table.hdf'))
+
+    kline = store.get_array('XBTZ15')
+    assert store.get_array('XBTZ15') is kline
+    assert store.cached_table == ['XBTZ15']
+
+    df = store.get('XBTZ15')
+    assert list(df.columns) == KLINE_COLUMNS
+    assert np.shares_memory(kline.values, df.values)
+
+    origin = pandas.read_hdf(get_resource_path('test_table.hdf'), 'XBTZ15')
+    timestamp = utc_datetime(2015, 12, 25, 11, 49)
+    assert kline.last_price(datetime_to_ns(timestamp)) == origin.loc[timestamp]['close']
+
+    with pytest.raises(DataError):
+        store.get_array("XBTUSD")
+
+
+def test_memmap_kline_store() -> None:
+    hdf_path = get_resource_path('test_table.hdf')
+    with tempfile.TemporaryDirectory() as tem_dir:
+        assert not MemmapKlineStore.available(tem_dir)
+        tables = convert_kline_hdf(hdf_path, tem_dir)
+        assert 'XBTZ15' in tables
+        assert MemmapKlineStore.available(tem_dir)
+        assert os.path.isfile(os.path.join(tem_dir, 'XBTZ15.npy'))
+        assert os.path.isfile(os.path.join(tem_dir, MANIFEST_FILE_NAME))
+
+        store = MemmapKlineStore(tem_dir)
+        assert store.is_fresh(hdf_path)
+        assert store.cached_table == []
+
+        kline = store.get_array('XBTZ15')
+        assert isinstance(kline.values, np.memmap)
+        assert not kline.values.flags.writeable
+        assert store.get_array('XBTZ15') is kline
+        assert store.cached_table == ['XBTZ15']
+        assert store.stats()['tables'] == {'XBTZ15': kline.values.nbytes}
+        assert store.stats()['hits'] == 1
+
+        expected = LazyKlineArrayStore(hdf_path).get('XBTZ15')
+        df = store.get('XBTZ15')
+        pandas.testing.assert_frame_equal(df, expected)
+        assert np.shares_memory(df.values, kline.values)
+
+        timestamp = utc_datetime(2015, 12, 25, 11, 49)
+        assert kline.last_price(datetime_to_ns(timestamp)) == expected.loc[timestamp]['close']
+        pandas.testing.assert_frame_equal(kline_count_window(df, timestamp, 30),
+                                          kline_count_window(expected, timestamp, 30))
+
+        with pytest.raises(DataError):
+            store.get_array("XBTUSD")
+
+
+def test_lazy_kline_array_store_evict() -> None:
+    store = LazyKlineArrayStore(get_resource_path('test_table.hdf'), max_bytes=1, pinned=['XBTZ15'])
+
+    kline = store.get_array('XBTN15')
+    store.get_array('XBTZ15')
+    store.get_array('XBUZ15')
+    assert store.cached_table == ['XBTZ15', 'XBUZ15']
+    assert 'XBTN15' not in store._arrays
+    assert store.get_array('XBTN15') is not kline
+    assert store.stats()['misses'] == 4
+
+
+@pytest.mark.parametrize('table', [False, True])
+@pytest.mark.parametrize('start,end', [
+    (None, None), (utc_datetime(2018, 1, 1, 0, 30), None), (None, utc_datetime(2018, 1, 1, 1, 0, 30)),
+    (utc_datetime(2018, 1, 1, 0, 30, 30), utc_datetime(2018, 1, 1, 1)),
+    (utc_datetime(2017, 1, 1), utc_datetime(2017, 1, 2)), (utc_datetime(2019, 1, 1), None),
+])
+def test_read_kline_range(table: bool, start: datetime.datetime, end: datetime.datetime) -> None:
+    df = random_kline_data(120, utc_datetime(2018, 1, 1, 1, 59))
+    gap = df.drop(df.index[50:55])
+    start_ns = None if start is None else datetime_to_ns(start)
+    end_ns = None if end is None else datetime_to_ns(end)
+    with tempfile.TemporaryDirectory() as tem_dir:
+        hdf_path = os.path.join(tem_dir, 'kline.hdf')
+        df.to_hdf(hdf_path, 'full', format='table' if table else 'fixed')
+        gap.to_hdf(hdf_path, 'gap', format='table' if table else 'fixed')
+
+        for key, frame in (('full', df), ('gap', gap)):
+            result = read_kline_range(hdf_path, key, start_ns, end_ns)
+            expected = frame.loc[start:end]  # type: ignore
+            assert list(result.index) == list(expected.index)
+            np.testing.assert_array_equal(result.values, expected.values)
+
+
+def test_lazy_kline_array_store_range() -> None:
+    hdf_path = get_resource_path('test_table.hdf')
+    start = utc_datetime(2015, 12, 25, 10)
+    end = utc_datetime(2015, 12, 25, 11, 50)
+    store = LazyKlineArrayStore(hdf_path, start_ns=datetime_to_ns(start), end_ns=datetime_to_ns(end))
+
+    kline = store.get_array('XBTZ15')
+    assert kline.length == 111
+    origin = pandas.read_hdf(hdf_path, 'XBTZ15')
+    expected = origin.loc[start:end][KLINE_COLUMNS]  # type: ignore
+    np.testing.assert_array_equal(store.get('XBTZ15').values, expected.values)
+    assert store.get('XBTZ15').index.freq == 'T'
+
+    assert not store.ensure_start(datetime_to_ns(start))
+    assert store.get_array('XBTZ15') is kline
+    assert store.ensure_start(datetime_to_ns(start) - ONE_MINUTE_NS * 60)
+    assert store.cached_table == []
+    assert store.get_array('XBTZ15').length == 171
+
+    with pytest.raises(DataError):
+        store.get("XBTUSD")
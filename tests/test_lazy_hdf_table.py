@@ -57,3 +57,40 @@ def test_lazy_hdf_table() -> None:
 
     with pytest.raises(DataError):
         store.get("XBTUSD")
+
+
+def test_lazy_hdf_table_lru() -> None:
+    store = LazyHDFTableStore(get_resource_path('test_table.hdf'))
+    size = store.get('XBTZ15').memory_usage(index=True).sum()
+    store.get('XBTN15')
+    assert store.stats()['tables']['XBTZ15'] == size
+    assert store.stats()['max_bytes'] is None
+
+    # the budget only holds the newest table
+    store = LazyHDFTableStore(get_resource_path('test_table.hdf'), max_bytes=int(size))
+    store.get('XBTZ15')
+    store.get('XBTN15')
+    assert store.cached_table == ['XBTN15']
+    store.get('XBTZ15')
+    assert store.cached_table == ['XBTZ15']
+
+    stats = store.stats()
+    assert stats['misses'] == 3
+    assert stats['evictions'] == 2
+    assert stats['total_bytes'] == size
+
+    store = LazyHDFTableStore(get_resource_path('test_table.hdf'), max_bytes=1, pinned=['XBTZ15'])
+    store.get('XBTZ15')
+    store.get('XBTN15')
+    store.get('XBUZ15')
+    assert store.cached_table == ['XBTZ15', 'XBUZ15']
+    store.get('XBTZ15')
+    assert store.stats()['hits'] == 1
+    assert store.stats()['pinned'] == ['XBTZ15']
+
+    store.unpin('XBTZ15')
+    assert store.cached_table == []
+    store.pin('XBTN15')
+    store.get('XBTN15')
+    store.get('XBUZ15')
+    assert store.cached_table == ['XBTN15', 'XBUZ15']
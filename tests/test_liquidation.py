@@ -0,0 +1,131 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from unittest.mock import MagicMock
+
+import numpy
+import pytest
+from monkq.assets.account import FutureAccount
+from monkq.assets.instrument import FutureInstrument
+from monkq.assets.order import FutureLimitOrder
+from monkq.assets.positions import FuturePosition
+from monkq.assets.trade import Trade
+from monkq.exchange.base import BaseSimExchange
+from monkq.liquidation import LiquidationEngine, LiquidationIndex
+from monkq.tradecounter import TradeCounter
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
+
+
+def make_bar(low: float, high: float) -> numpy.ndarray:
+    # open, high, low, close, volume, turnover
+    return numpy.array([low, high, low, high, 1., 1.])
+
+
+def test_liquidation_index() -> None:
+    index = LiquidationIndex(MagicMock())
+    longs = [MagicMock() for _ in range(4)]
+    shorts = [MagicMock() for _ in range(3)]
+    for position, price in zip(longs, [8., 6., 9., 7.]):
+        index.add(position, price, True)
+    for position, price in zip(shorts, [12., 14., 13.]):
+        index.add(position, price, False)
+    assert index.long_prices == [6., 7., 8., 9.]
+    assert index.short_prices == [12., 13., 14.]
+    assert len(index) == 7
+
+    index.remove(longs[3], 7., True)
+    assert index.long_positions == [longs[1], longs[0], longs[2]]
+
+    assert index.reached(10, 11) == []
+    assert index.reached(numpy.nan, numpy.nan) == []
+    assert index.reached(numpy.nan, 13) == []
+    assert len(index) == 6
+    assert index.reached(8, 13) == [(longs[0], 8.), (longs[2], 9.), (shorts[0], 12.), (shorts[2], 13.)]
+    assert index.long_prices == [6.]
+    assert index.short_positions == [shorts[1]]
+
+
+def test_liquidation_engine() -> None:
+    exchange = MagicMock(BaseSimExchange)
+    exchange.orders_version.return_value = None
+    exchange.price_version.return_value = None
+    exchange.last_price.return_value = 10
+    instrument = FutureInstrument(exchange=exchange, symbol='TRXH19', taker_fee=0.0025, init_margin_rate=0.05,
+                                  maint_margin_rate=0.025)
+    stat = MagicMock()
+    trade_counter = TradeCounter(stat)
+    exchange.get_open_orders.side_effect = lambda account: list(trade_counter.open_orders())
+    engine = LiquidationEngine(exchange, trade_counter)
+    exchange.positions_changed.side_effect = engine.positions_changed
+
+    long_account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+    short_account = FutureAccount(exchange=exchange, position_cls=FuturePosition, wallet_balance=10000)
+    for account, quantity in ((long_account, 100), (short_account, -100)):
+        order = FutureLimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument,
+                                 quantity=quantity, price=10)
+        order.deal(Trade(order, 10, quantity, gen_unique_id()))
+        account.positions[instrument].set_leverage(5)
+
+    take_profit = FutureLimitOrder(account=long_account, order_id=gen_unique_id(), instrument=instrument,
+                                   quantity=-100, price=12)
+    short_take_profit = FutureLimitOrder(account=short_account, order_id=gen_unique_id(), instrument=instrument,
+                                         quantity=100, price=8)
+    trade_counter.submit_order(take_profit)
+    trade_counter.submit_order(short_take_profit)
+
+    long_position = long_account.positions[instrument]
+    short_position = short_account.positions[instrument]
+    assert long_position.liq_price == pytest.approx(800 / 0.9725 / 100)
+    assert short_position.liq_price == pytest.approx(1200 / 1.0275 / 100)
+
+    exchange.last_bar.return_value = make_bar(9, 11)
+    engine.check(datetime_to_ns(utc_datetime(2018, 1, 1)))
+    assert long_position.quantity == 100 and short_position.quantity == -100
+
+    # a bar without trades liquidates nothing
+    exchange.last_bar.return_value = make_bar(numpy.nan, numpy.nan)
+    engine.check(datetime_to_ns(utc_datetime(2018, 1, 1)))
+    assert long_position.quantity == 100 and short_position.quantity == -100
+
+    exchange.last_bar.return_value = make_bar(8, 11)
+    engine.check(datetime_to_ns(utc_datetime(2018, 1, 1, 0, 1)))
+    assert long_position.quantity == 0
+    assert short_position.quantity == -100
+    # the liquidation closes at the liquidation price and cancels the orders of the position
+    liq_trade = stat.collect_trade.call_args[0][0]
+    assert liq_trade.exec_price == pytest.approx(800 / 0.9725 / 100)
+    assert liq_trade.order.text == 'liquidation'
+    assert liq_trade.trade_datetime == utc_datetime(2018, 1, 1, 0, 1)
+    liq_value = 800 / 0.9725
+    assert long_account.wallet_balance == pytest.approx(10000 - 2.5 - (1000 - liq_value) - liq_value * 0.0025)
+    assert list(trade_counter.open_orders()) == [short_take_profit]
+
+    exchange.last_bar.return_value = make_bar(11, 12)
+    engine.check(datetime_to_ns(utc_datetime(2018, 1, 1, 0, 2)))
+    assert short_position.quantity == 0
+    assert len(trade_counter.open_orders()) == 0
+
+    exchange.last_bar.return_value = make_bar(1, 100)
+    engine.check(datetime_to_ns(utc_datetime(2018, 1, 1, 0, 3)))
+    assert stat.collect_trade.call_count == 2
@@ -0,0 +1,109 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import math
+
+import numpy
+import pandas
+import pytest
+from monkq.analyse import metrics
+from monkq.utils.timefunc import utc_datetime
+
+
+@pytest.fixture()
+def capital() -> pandas.Series:
+    index = pandas.DatetimeIndex([utc_datetime(2018, 1, day) for day in range(1, 5)])
+    return pandas.Series([100., 110., 99., 121.], index=index)
+
+
+@pytest.fixture()
+def trades() -> pandas.DataFrame:
+    return pandas.DataFrame({
+        'trade_datetime': [utc_datetime(2018, 1, 1), utc_datetime(2018, 1, 1, 12),
+                           utc_datetime(2018, 1, 2), utc_datetime(2018, 1, 3)],
+        'symbol': ['XBTUSD', 'ETHUSD', 'XBTUSD', 'ETHUSD'],
+        'exec_quantity': [10., 1., -10., -1.],
+        'exec_price': [100., 10., 110., 12.],
+    })
+
+
+def test_capital_metrics(capital: pandas.Series) -> None:
+    rets = metrics.returns(capital)
+    expected = numpy.array([0.1, -0.1, 121 / 99 - 1])
+    assert rets.values == pytest.approx(expected)
+    assert metrics.periods_per_year(capital.index) == 365
+    assert metrics.total_return(capital) == pytest.approx(0.21)
+    assert metrics.annual_return(capital) == pytest.approx(1.21 ** (365 / 3) - 1)
+    assert metrics.volatility(rets, 365) == pytest.approx(expected.std(ddof=1) * math.sqrt(365))
+    assert metrics.sharpe_ratio(rets, 365) == pytest.approx(expected.mean() / expected.std(ddof=1) * math.sqrt(365))
+    assert metrics.sortino_ratio(rets, 365) == pytest.approx(expected.mean() / math.sqrt(0.01 / 3) * math.sqrt(365))
+    assert metrics.max_drawdown(capital) == pytest.approx(0.1)
+    assert metrics.period_win_rate(rets) == pytest.approx(2 / 3)
+
+
+def test_trade_metrics(capital: pandas.Series, trades: pandas.DataFrame) -> None:
+    assert metrics.turnover(trades, capital) == pytest.approx(2122 / 107.5 / (3 / 365))
+    # a position is open from the first day to the third day
+    assert metrics.exposure(trades, capital.index[0], capital.index[-1]) == pytest.approx(2 / 3)
+    assert metrics.exposure(trades.iloc[:0], capital.index[0], capital.index[-1]) == 0
+    assert list(metrics.closed_pnl(trades)) == pytest.approx([100., 2.])
+    assert metrics.win_rate(trades) == 1
+    assert math.isnan(metrics.win_rate(trades.iloc[:2]))
+
+
+def test_closed_pnl() -> None:
+    trades = pandas.DataFrame({
+        'trade_datetime': [utc_datetime(2018, 1, 1, hour) for hour in range(5)],
+        'symbol': ['XBTUSD'] * 5,
+        'exec_quantity': [10., 10., -5., -25., 10.],
+        'exec_price': [100., 110., 120., 90., 100.],
+    })
+    # the average open price of the long position is 105, the last trade
+    # closes the short opened by the reversing trade at 90
+    assert list(metrics.closed_pnl(trades)) == pytest.approx([75., 15 * -15., 10 * -10.])
+    assert list(metrics.closed_pnl(trades).index) == [2, 3, 4]
+    assert metrics.win_rate(trades) == pytest.approx(1 / 3)
+
+
+def test_rolling_metrics(capital: pandas.Series) -> None:
+    rets = metrics.returns(capital)
+    sharpe = metrics.rolling_sharpe_ratio(rets, 2, 365)
+    assert math.isnan(sharpe.iloc[0])
+    assert sharpe.iloc[-1] == pytest.approx(metrics.sharpe_ratio(rets.iloc[1:], 365))
+    sortino = metrics.rolling_sortino_ratio(rets, 2, 365)
+    assert sortino.iloc[-1] == pytest.approx(metrics.sortino_ratio(rets.iloc[1:], 365))
+    volatility = metrics.rolling_volatility(rets, '2D', 365)
+    assert volatility.iloc[-1] == pytest.approx(metrics.volatility(rets.iloc[1:], 365))
+    assert metrics.rolling_drawdown(capital, 2).values == pytest.approx([0, 0, 0.1, 0])
+
+
+def test_summary(capital: pandas.Series, trades: pandas.DataFrame) -> None:
+    summary = metrics.summary(capital, trades)
+    assert summary['end_capital'] == 121
+    assert summary['max_drawdown'] == pytest.approx(0.1)
+    assert summary['trades'] == 4
+    assert summary['win_rate'] == 1
+    assert summary['period_win_rate'] == pytest.approx(2 / 3)
+    assert summary['exposure'] == pytest.approx(2 / 3)
+    assert 'turnover' not in metrics.summary(capital)
+    assert 'win_rate' not in metrics.summary(capital)
@@ -1,8 +1,10 @@
 import os
 import pickle
+import sys
 import tempfile
 from typing import Generator
 
+import pandas
 import pytest
 from monkq.__main__ import cmd_main
 from monkq.config import SETTING_MODULE
@@ -105,6 +107,9 @@ def start_strategy_condition(tem_data_dir: str) -> Generator[str, None, None]:
                 yield tem_dir
 
     os.environ.pop(SETTING_MODULE)
+    # the next project has modules with the same names
+    sys.modules.pop('manage', None)
+    sys.modules.pop('strategy', None)
 
 
 def test_run_1m_backtest(start_strategy_condition: str) -> None:
@@ -123,9 +128,82 @@ def test_run_1m_backtest(start_strategy_condition: str) -> None:
     assert pytest.approx(daily_capital[1]['bitmex_account'], 98721.99024999999)
     assert daily_capital[1]['timestamp'] == utc_datetime(2015, 6, 2)
 
-    assert len(obj['orders']) == 1
-    order = obj['orders'][0]
-    assert order.instrument.symbol == "XBTZ15"
-    assert len(obj['trades']) == 1
-    trade = obj['trades'][0]
-    assert trade.order.instrument.symbol == "XBTZ15"
+    orders = obj['orders'].to_frame()
+    # the order is recorded when it is submitted and when it is traded
+    assert len(orders) == 2
+    assert orders['order_id'][0] == orders['order_id'][1]
+    assert orders['state'].tolist() == ['not_traded', 'full_traded']
+    assert orders['traded_quantity'][1] == orders['quantity'][1]
+    assert obj['orders'].submitted == 1
+    assert orders['symbol'][0] == "XBTZ15"
+    trades = obj['trades'].to_frame()
+    assert len(trades) == 1
+    assert trades['symbol'][0] == "XBTZ15"
+    assert trades['order_id'][0] == orders['order_id'][0]
+
+
+def test_stream_1m_backtest(start_strategy_condition: str) -> None:
+    from manage import cmd_main as strategy_cmd
+    from monkq.analyse import Analyser
+
+    report_file = os.path.join(start_strategy_condition, 'result.hdf')
+    settings_file = [name for name in os.listdir('.') if name.endswith('_settings.py')][0]
+    with open(settings_file, 'a') as f:
+        f.write('STATISTIC = "monkq.stat.StreamStatistic"\n')
+        f.write('REPORT_FILE = r"{}"\n'.format(report_file))
+        f.write('REPORT_FLUSH_FREQ = "30D"\n')
+
+    strategy_cmd.main(['runstrategy'], standalone_mode=False)
+
+    analyser = Analyser(report_file)
+    assert analyser.settings.REPORT_FLUSH_FREQ == '30D'
+    accounts_info = analyser.accounts_info
+    assert accounts_info.index[1] == utc_datetime(2015, 6, 2)
+    assert accounts_info.index[-1] == utc_datetime(2015, 12, 1)
+    assert accounts_info.index.is_monotonic_increasing
+    assert len(analyser.orders) == 1
+    assert analyser.trades['symbol'].tolist() == ['XBTZ15']
+    assert analyser.trades['order_id'][0] == analyser.orders['order_id'][0]
+    assert analyser.table('trades', ['exec_quantity'])['exec_quantity'].tolist() == [100]
+
+    summary = analyser.summary()
+    assert summary['end_capital'] == accounts_info['bitmex_account'].iloc[-1]
+    assert summary['trades'] == 1
+    assert 0 < summary['exposure'] <= 1
+
+
+def test_sweep_1m_backtest(start_strategy_condition: str) -> None:
+    from manage import cmd_main as strategy_cmd
+
+    output = os.path.join(start_strategy_condition, 'sweep.csv')
+    strategy_cmd.main(['sweep', '-p', 'COLLECT_FREQ=24H,48H', '-w', '2', '-o', output], standalone_mode=False)
+
+    result = pandas.read_csv(output)
+    assert list(result['COLLECT_FREQ']) == ['24H', '48H']
+    assert list(result['trades']) == [1, 1]
+    assert result['end_capital'][0] == pytest.approx(result['end_capital'][1])
+
+    with open(os.path.join(start_strategy_condition, 'result_0.pkl'), 'rb') as f:
+        obj = pickle.load(f)
+    assert obj['daily_capital'][1]['timestamp'] == utc_datetime(2015, 6, 2)
+    assert obj['settings'].COLLECT_FREQ == '24H'
+
+
+def test_walkforward_1m_backtest(start_strategy_condition: str) -> None:
+    from manage import cmd_main as strategy_cmd
+
+    output = os.path.join(start_strategy_condition, 'walkforward.csv')
+    capital = os.path.join(start_strategy_condition, 'capital.csv')
+    strategy_cmd.main(['walkforward', '--train', '30D', '--test', '60D', '-w', '2', '-o', output,
+                       '--capital', capital], standalone_mode=False)
+
+    result = pandas.read_csv(output, parse_dates=['test_start'])
+    assert list(result['test_start']) == [utc_datetime(2015, 7, 1), utc_datetime(2015, 8, 30),
+                                          utc_datetime(2015, 10, 29)]
+    assert list(result['trades']) == [1, 1, 1]
+
+    daily_capital = pandas.read_csv(capital, parse_dates=['timestamp'])
+    assert daily_capital['timestamp'].iloc[0] == utc_datetime(2015, 7, 1)
+    assert daily_capital['timestamp'].iloc[-1] == utc_datetime(2015, 12, 1)
+    assert daily_capital['timestamp'].is_monotonic_increasing
+    assert daily_capital['bitmex_account'][0] == 100000
@@ -27,6 +27,7 @@ from monkq.base_strategy import BaseStrategy
 from monkq.config import Setting
 from monkq.const import RUN_TYPE
 from monkq.runner import Runner
+from monkq.ticker import BarClock
 from monkq.utils.timefunc import utc_datetime
 
 from .utils import over_written_settings
@@ -65,3 +66,26 @@ def test_runner(tem_data_dir: str) -> None:
         runner = Runner(settings)
 
         runner.run()
+
+
+def test_runner_bar_clock(tem_data_dir: str) -> None:
+    settings = Setting()
+    custom_settings = {
+        "STRATEGY": TestStrategy,
+        "START_TIME": utc_datetime(2018, 1, 1),
+        "END_TIME": utc_datetime(2018, 1, 2),
+        "RUN_TYPE": RUN_TYPE.BACKTEST,
+        "FREQUENCY": "1m",
+        "DATA_DIR": tem_data_dir,
+        "TICKER": BarClock,
+        "REPORT_FILE": os.path.join(tem_data_dir, 'result.pkl')
+    }
+
+    with over_written_settings(settings, **custom_settings):
+        runner = Runner(settings)
+        assert isinstance(runner.ticker, BarClock)
+
+        runner.run()
+
+        assert runner.context.now == utc_datetime(2018, 1, 2)
+        assert runner.stat.daily_capital[-1]['timestamp'] == utc_datetime(2018, 1, 2)
@@ -5,9 +5,14 @@ from typing import Generator
 from unittest.mock import MagicMock
 
 import pytest
+from monkq.assets.instrument import Instrument
+from monkq.assets.order import LimitOrder
+from monkq.assets.trade import Trade
 from monkq.config import Setting
-from monkq.stat import Statistic
-from monkq.utils.timefunc import utc_datetime
+from monkq.report import HDF_STRING_SIZES, load_report
+from monkq.stat import Statistic, StreamStatistic
+from monkq.utils.id import gen_unique_id
+from monkq.utils.timefunc import datetime_to_ns, utc_datetime
 
 
 class PickleMock():
@@ -23,6 +28,7 @@ def statistic_context(settings: Setting) -> Generator[PickleMock, None, None]:
     accounts = {"account1": account1, "account2": account2}
     context = MagicMock()
     context.now = utc_datetime(2018, 1, 1)
+    context.now_ns = datetime_to_ns(context.now)
     context.accounts = accounts
     context.settings = settings
     with tempfile.TemporaryDirectory() as tmp:
@@ -38,18 +44,95 @@ def test_statistic(statistic_context: MagicMock) -> None:
 
     assert stat.daily_capital == [{"timestamp": utc_datetime(2018, 1, 1), "account1": 2000, "account2": 5000}]
 
-    order = PickleMock()
-    stat.collect_order(order)  # type:ignore
+    instrument = Instrument(exchange=None, symbol='XBTUSD', taker_fee=0.001)
+    order = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument, quantity=10, price=100)
+    stat.collect_order(order)
 
-    assert order in stat.order_collections
+    assert len(stat.order_collections) == 1
+    assert stat.order_collections.rows[0]['order_id'] == order.order_id.encode()
 
-    trade = PickleMock()
-    stat.collect_trade(trade)  # type:ignore
+    trade = Trade(order, 100, 10, gen_unique_id(), utc_datetime(2018, 1, 1, 0, 1))
+    stat.collect_trade(trade)
 
-    assert trade in stat.trade_collections
+    assert len(stat.trade_collections) == 1
 
     stat.report()
 
     with open(stat.report_file, 'rb') as f:
         obj = pickle.load(f)
     assert obj['daily_capital'] == [{"timestamp": utc_datetime(2018, 1, 1), "account1": 2000, "account2": 5000}]
+    assert obj['orders'].to_frame()['order_id'].tolist() == [order.order_id]
+    trades = obj['trades'].to_frame()
+    assert trades.iloc[0].to_dict() == trade.to_dict()
+
+
+@pytest.mark.parametrize('ext', ['.hdf', '.parquet'])
+def test_stream_statistic(statistic_context: MagicMock, ext: str) -> None:
+    if ext == '.parquet':
+        pytest.importorskip('pyarrow')
+    report_file = statistic_context.settings.REPORT_FILE.replace('.pkl', ext)
+    statistic_context.settings.REPORT_FILE = report_file
+    statistic_context.settings.REPORT_FLUSH_FREQ = '1D'
+    stat = StreamStatistic(statistic_context)
+
+    instrument = Instrument(exchange=None, symbol='XBTUSD', taker_fee=0.001)
+    order = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument, quantity=10, price=100)
+    stat.collect_order(order)
+    stat.collect_trade(Trade(order, 100, 10, gen_unique_id(), utc_datetime(2018, 1, 1, 0, 1)))
+    stat.freq_collect_account()
+
+    # not flushed in the first day
+    assert len(stat.order_collections) == 1
+    assert load_report(report_file).orders().empty
+
+    statistic_context.now = utc_datetime(2018, 1, 2)
+    statistic_context.now_ns = datetime_to_ns(statistic_context.now)
+    stat.freq_collect_account()
+
+    assert len(stat.order_collections) == 0
+    assert stat.order_collections.total == 1
+    report = load_report(report_file)
+    assert report.orders()['order_id'].tolist() == [order.order_id]
+    assert report.trades()['trade_datetime'].tolist() == [utc_datetime(2018, 1, 1, 0, 1)]
+    assert len(report.capital()) == 2
+
+    second = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument,
+                        quantity=-10, price=200, text='close')
+    stat.collect_order(second)
+    stat.collect_account_info()
+    stat.report()
+
+    report = load_report(report_file)
+    orders = report.orders()
+    assert orders['order_id'].tolist() == [order.order_id, second.order_id]
+    assert orders['text'].tolist() == ['', 'close']
+    capital = report.capital()
+    assert capital.index.tolist() == [utc_datetime(2018, 1, 1), utc_datetime(2018, 1, 2), utc_datetime(2018, 1, 2)]
+    assert capital['account1'].tolist() == [2000, 2000, 2000]
+    assert isinstance(report.settings, Setting)
+
+    assert report.trades(['symbol', 'exec_price']).columns.tolist() == ['symbol', 'exec_price']
+    assert report.orders(['price'])['price'].tolist() == [100, 200]
+    assert report.capital(['account2']).columns.tolist() == ['account2']
+
+
+def test_stream_statistic_long_strings(statistic_context: MagicMock) -> None:
+    report_file = statistic_context.settings.REPORT_FILE.replace('.pkl', '.hdf')
+    statistic_context.settings.REPORT_FILE = report_file
+    stat = StreamStatistic(statistic_context)
+
+    instrument = Instrument(exchange=None, symbol='XBTUSD' * 10, taker_fee=0.001)
+    long_text = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument,
+                           quantity=10, price=100, text='a' * 300)
+    # a character of 3 bytes across the width of the column
+    wide_text = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument,
+                           quantity=10, price=100, text='a' + '\u4e2d' * 100)
+    short_text = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=instrument,
+                            quantity=10, price=100, text='short')
+    for order in (long_text, wide_text, short_text):
+        stat.collect_order(order)
+    stat.report()
+
+    orders = load_report(report_file).orders()
+    assert orders['text'].tolist() == ['a' * HDF_STRING_SIZES['text'], 'a' + '\u4e2d' * 42, 'short']
+    assert orders['symbol'].tolist() == [('XBTUSD' * 10)[:HDF_STRING_SIZES['symbol']]] * 3
@@ -0,0 +1,122 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import os
+
+import pytest
+from monkq.base_strategy import BaseStrategy
+from monkq.config import Setting
+from monkq.exception import CommandError, SettingError
+from monkq.runner import Runner
+from monkq.sweep import Sweep, parameter_grid, parse_params, sweep_settings
+from monkq.ticker import BarClock
+from monkq.utils.timefunc import utc_datetime
+
+from .utils import over_written_settings
+
+
+class SweepStrategy(BaseStrategy):
+    __test__ = False
+
+    async def setup(self) -> None:
+        self.is_order = False
+
+    async def handle_bar(self) -> None:
+        if self.is_order:
+            return
+        exchange = self.context.exchanges['bitmex']
+        account = self.context.accounts['bitmex_account']
+        instrument = await exchange.get_instrument('XBTZ15')
+        await exchange.place_market_order(account, instrument, self.context.settings.ORDER_SIZE)  # type: ignore
+        self.is_order = True
+
+
+def sweep_custom_settings(tem_data_dir: str) -> dict:
+    return {
+        "STRATEGY": SweepStrategy,
+        "START_TIME": utc_datetime(2015, 6, 1),
+        "END_TIME": utc_datetime(2015, 6, 5),
+        "DATA_DIR": tem_data_dir,
+        "TICKER": BarClock,
+        "COLLECT_FREQ": "24H",
+        "ORDER_SIZE": 0,
+        "REPORT_FILE": os.path.join(tem_data_dir, 'result.pkl')
+    }
+
+
+def test_parameter_grid() -> None:
+    assert parameter_grid({'A': [1, 2], 'B': ['x', 'y']}) == [
+        {'A': 1, 'B': 'x'}, {'A': 1, 'B': 'y'}, {'A': 2, 'B': 'x'}, {'A': 2, 'B': 'y'}]
+    assert parameter_grid({}) == [{}]
+
+    assert parse_params(['A=1,2.5', 'B= x ,None']) == {'A': [1, 2.5], 'B': ['x', None]}
+    with pytest.raises(CommandError):
+        parse_params(['A'])
+    with pytest.raises(CommandError):
+        parse_params(['A='])
+
+
+def test_sweep_settings() -> None:
+    settings = Setting()
+    settings.REPORT_FILE = '/tmp/result.pkl'  # type: ignore
+    run_settings = sweep_settings(settings, {'ORDER_SIZE': 10}, 3)
+    assert run_settings.ORDER_SIZE == 10  # type: ignore
+    assert run_settings.REPORT_FILE == '/tmp/result_3.pkl'  # type: ignore
+    assert not hasattr(settings, 'ORDER_SIZE')
+    assert settings.REPORT_FILE == '/tmp/result.pkl'  # type: ignore
+
+    with pytest.raises(SettingError):
+        sweep_settings(settings, {'order_size': 10}, 0)
+
+
+def test_runner_share_data(tem_data_dir: str) -> None:
+    settings = Setting()
+    with over_written_settings(settings, **sweep_custom_settings(tem_data_dir)):
+        template = Runner(settings)
+        template.preload()
+        template_data = template.context.exchanges['bitmex']._data  # type: ignore
+        assert template_data._kline_store.cached_table
+
+        runner = Runner(settings)
+        runner.share_data(template)
+        data = runner.context.exchanges['bitmex']._data  # type: ignore
+        assert data._kline_store is template_data._kline_store
+        assert data is not template_data
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sweep(tem_data_dir: str, workers: int) -> None:
+    settings = Setting()
+    with over_written_settings(settings, **sweep_custom_settings(tem_data_dir)):
+        result = Sweep(settings, {'ORDER_SIZE': [100, 1000], 'COLLECT_FREQ': ['4H', '24H']}, workers).run()
+
+    assert list(result['ORDER_SIZE']) == [100, 100, 1000, 1000]
+    assert list(result['COLLECT_FREQ']) == ['4H', '24H', '4H', '24H']
+    assert list(result['orders']) == [1, 1, 1, 1]
+    assert list(result['trades']) == [1, 1, 1, 1]
+    assert list(result['start_capital']) == [100000] * 4
+    assert result['end_capital'][0] == result['end_capital'][1]
+    assert result['end_capital'][0] != result['end_capital'][2]
+    for index, report_file in enumerate(result['report_file']):
+        assert report_file == os.path.join(tem_data_dir, 'result_{}.pkl'.format(index))
+        assert os.path.exists(report_file)
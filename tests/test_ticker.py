@@ -27,7 +27,8 @@ import pytest
 from dateutil.relativedelta import relativedelta
 from dateutil.tz import tzutc
 from monkq.exception import SettingError
-from monkq.ticker import FrequencyTicker
+from monkq.ticker import BarClock, FrequencyTicker
+from monkq.utils.timefunc import datetime_to_ns
 
 start_time = datetime.datetime(2018, 1, 1, tzinfo=tzutc())
 end_time = datetime.datetime(2018, 1, 3, tzinfo=tzutc())
@@ -60,3 +61,28 @@ def test_timer_aware_timezone() -> None:
 def test_timer_timeexception() -> None:
     with pytest.raises(SettingError):
         FrequencyTicker(start_time=end_time, end_time=start_time, frequency='1m')
+
+
+def test_bar_clock() -> None:
+    clock = BarClock(start_time=start_time, end_time=end_time, frequency='1m')
+    assert len(clock) == 2 * 24 * 60 + 1
+    point = start_time
+    for tick in clock.timer():
+        assert tick == point
+        point += relativedelta(minutes=+1)
+    assert point == end_time + relativedelta(minutes=+1)
+
+    ticks = list(clock.timer_ns())
+    assert ticks[0] == datetime_to_ns(start_time)
+    assert ticks[-1] == datetime_to_ns(end_time)
+    assert all(isinstance(tick, int) for tick in ticks)
+
+
+def test_bar_clock_1d() -> None:
+    clock = BarClock(start_time=start_time, end_time=end_time, frequency='1d')
+    assert list(clock.timer()) == [start_time, start_time + relativedelta(days=+1), end_time]
+
+
+def test_bar_clock_frequency() -> None:
+    with pytest.raises(SettingError):
+        BarClock(start_time=start_time, end_time=end_time, frequency='5m')
@@ -22,24 +22,39 @@
 # SOFTWARE.
 #
 
+from typing import Dict, Type
 from unittest.mock import MagicMock, call
 
+import numpy
 import pytest
-from monkq.assets.order import LimitOrder, MarketOrder
-from monkq.tradecounter import TradeCounter
+from monkq.assets.order import (
+    ORDER_T, LimitOrder, MarketOrder, StopLimitOrder, StopMarketOrder,
+)
+from monkq.exception import ImpossibleError
+from monkq.tradecounter import ArrayOrderBook, BatchTradeCounter, TradeCounter
 from monkq.utils.id import gen_unique_id
 from monkq.utils.timefunc import utc_datetime
 
 
-def test_trader_counter() -> None:
+def make_bar(low: float, high: float) -> numpy.ndarray:
+    # open, high, low, close, volume, turnover
+    return numpy.array([low, high, low, high, 1., 1.])
+
+
+COUNTER_CLASSES = [TradeCounter, BatchTradeCounter]
+
+
+@pytest.mark.parametrize('counter_cls', COUNTER_CLASSES)
+def test_trader_counter(counter_cls: Type[TradeCounter]) -> None:
     stat = MagicMock()
     exchange = MagicMock()
     account = MagicMock()
     account.exchange = exchange
 
-    trade_counter = TradeCounter(stat)
+    trade_counter = counter_cls(stat)
 
     exchange.last_price.return_value = 20.
+    exchange.last_bar.return_value = make_bar(15, 25)
 
     order1 = LimitOrder(account=account, order_id=gen_unique_id(), instrument=MagicMock(), quantity=100, price=10)
     order2 = LimitOrder(account=account, order_id=gen_unique_id(), instrument=MagicMock(), quantity=200, price=20)
@@ -56,11 +71,168 @@ def test_trader_counter() -> None:
     assert len(trade_counter.open_orders()) == 2
     trade_counter.match(utc_datetime(2018, 1, 1))
 
+    # the limit order waits for the next bar
+    assert len(order2.trades) == 0
+    assert len(order3.trades) == 1
+    assert order3.trades[0].exec_price == 20.
+    assert len(trade_counter.open_orders()) == 1
+
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 1))
+
     assert len(order2.trades) == 1
+    assert order2.trades[0].exec_price == 20
     assert len(order3.trades) == 1
     assert len(trade_counter.open_orders()) == 0
     trades = []
-    trades.extend(order2.trades)
     trades.extend(order3.trades)
+    trades.extend(order2.trades)
     trade_calls = [call(t) for t in trades]
     account.deal.assert_has_calls(trade_calls)
+    # the orders are recorded when submitted, cancelled and traded
+    assert stat.collect_order.call_args_list == [call(order1), call(order2), call(order3),
+                                                 call(order1, cancelled=True), call(order3), call(order2)]
+
+
+@pytest.mark.parametrize('counter_cls', COUNTER_CLASSES)
+def test_trader_counter_limit_order_cross(counter_cls: Type[TradeCounter]) -> None:
+    exchange = MagicMock()
+    account = MagicMock()
+    account.exchange = exchange
+    instrument = MagicMock()
+    trade_counter = counter_cls(MagicMock())
+
+    def limit_order(quantity: float, price: float) -> LimitOrder:
+        order = LimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument,
+                           quantity=quantity, price=price)
+        trade_counter.submit_order(order)
+        return order
+
+    buy_low = limit_order(10, 90)
+    buy_high = limit_order(10, 98)
+    sell_low = limit_order(-10, 102)
+    sell_high = limit_order(-10, 110)
+
+    exchange.last_bar.return_value = None
+    trade_counter.match(utc_datetime(2018, 1, 1))
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 1))
+    assert len(trade_counter.open_orders()) == 4
+
+    exchange.last_bar.return_value = make_bar(numpy.nan, numpy.nan)
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 2))
+    assert len(trade_counter.open_orders()) == 4
+
+    exchange.last_bar.return_value = make_bar(99, 101)
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 3))
+    assert len(trade_counter.open_orders()) == 4
+
+    exchange.last_bar.return_value = make_bar(98, 102)
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 4))
+    assert set(order.order_id for order in trade_counter.open_orders()) == {buy_low.order_id, sell_high.order_id}
+    assert buy_high.trades[0].exec_price == 98
+    assert buy_high.trades[0].exec_quantity == 10
+    assert sell_low.trades[0].exec_price == 102
+    assert sell_low.trades[0].exec_quantity == -10
+
+    # the new order is in the range already, but it has to wait for the next bar
+    exchange.last_bar.return_value = make_bar(80, 120)
+    buy_new = limit_order(10, 100)
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 5))
+    assert set(order.order_id for order in trade_counter.open_orders()) == {buy_new.order_id}
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 6))
+    assert len(trade_counter.open_orders()) == 0
+    assert len(buy_low.trades) == len(sell_high.trades) == len(buy_new.trades) == 1
+
+
+@pytest.mark.parametrize('counter_cls,book_size', [(TradeCounter, 9), (BatchTradeCounter, 8)])
+def test_trader_counter_cancel_limit_order(counter_cls: Type[TradeCounter], book_size: int) -> None:
+    exchange = MagicMock()
+    account = MagicMock()
+    account.exchange = exchange
+    instrument = MagicMock()
+    trade_counter = counter_cls(MagicMock())
+    exchange.last_bar.return_value = make_bar(0, 1000)
+
+    orders = []
+    for i in range(40):
+        order = LimitOrder(account=account, order_id=gen_unique_id(), instrument=instrument,
+                           quantity=1, price=100 + i)
+        trade_counter.submit_order(order)
+        orders.append(order)
+
+    for order in orders[:32]:
+        trade_counter.cancel_order(order.order_id)
+    book = trade_counter._book(orders[0])
+    # the heaps drop the stale entries once they are the most
+    assert len(book) == book_size
+    assert len(trade_counter.open_orders()) == 8
+
+    trade_counter.match(utc_datetime(2018, 1, 1))
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 1))
+    assert len(trade_counter.open_orders()) == 0
+    assert len(book) == 0
+    assert all(len(order.trades) == 0 for order in orders[:32])
+    assert all(len(order.trades) == 1 for order in orders[32:])
+
+
+def test_batch_trade_counter_instruments() -> None:
+    exchange = MagicMock()
+    account = MagicMock()
+    account.exchange = exchange
+    xbt = MagicMock()
+    xbt.symbol = 'XBTUSD'
+    eth = MagicMock()
+    eth.symbol = 'ETHUSD'
+    bars = {'XBTUSD': make_bar(90, 110), 'ETHUSD': make_bar(190, 210)}
+    exchange.last_bar.side_effect = lambda instrument: bars[instrument.symbol]
+    trade_counter = BatchTradeCounter(MagicMock())
+
+    xbt_buy = LimitOrder(account=account, order_id=gen_unique_id(), instrument=xbt, quantity=1, price=100)
+    eth_buy = LimitOrder(account=account, order_id=gen_unique_id(), instrument=eth, quantity=1, price=100)
+    eth_sell = LimitOrder(account=account, order_id=gen_unique_id(), instrument=eth, quantity=-1, price=200)
+    for order in (xbt_buy, eth_buy, eth_sell):
+        trade_counter.submit_order(order)
+
+    trade_counter.match(utc_datetime(2018, 1, 1))
+    assert len(trade_counter.open_orders()) == 3
+    trade_counter.match(utc_datetime(2018, 1, 1, 0, 1))
+    # each order is checked against the bar of its own instrument
+    assert list(trade_counter.open_orders()) == [eth_buy]
+    assert xbt_buy.trades[0].exec_price == 100
+    assert eth_sell.trades[0].exec_price == 200
+
+
+def test_array_order_book() -> None:
+    book = ArrayOrderBook(MagicMock(), MagicMock())
+    open_orders: Dict[str, ORDER_T] = {}
+
+    def push(price: float, quantity: float) -> LimitOrder:
+        order = LimitOrder(account=MagicMock(), order_id=gen_unique_id(), instrument=book.instrument,
+                           quantity=quantity, price=price)
+        open_orders[order.order_id] = order
+        book.push(order, 0, 0)
+        return order
+
+    orders = [push(100 + i, 1 if i % 2 else -1) for i in range(16)]
+    assert len(book.prices) == 16
+    for order in orders[:10]:
+        open_orders.pop(order.order_id)
+        book.discard(order.order_id, open_orders)
+    # full with most of the slots dead, so it is compacted instead of grown
+    new_order = push(50, 1)
+    assert len(book.prices) == 16
+    assert len(book.order_ids) == 7
+    assert len(book) == 7
+
+    crossed = book.crossed(open_orders, 1, 105, 112)
+    # buys at or above 105 and sells at or below 112
+    assert crossed == [order.order_id for order in orders[10:13]] + [orders[13].order_id, orders[15].order_id]
+    assert new_order.order_id not in crossed
+    assert book.crossed(open_orders, 1, 105, 112) == []
+    assert len(book) == 2
+
+
+@pytest.mark.parametrize('order_cls', [StopLimitOrder, StopMarketOrder])
+def test_trader_counter_unsupported_order(order_cls: type) -> None:
+    trade_counter = TradeCounter(MagicMock())
+    with pytest.raises(ImpossibleError):
+        trade_counter.submit_order(order_cls(account=MagicMock(), order_id=gen_unique_id(), instrument=MagicMock()))
@@ -0,0 +1,116 @@
+#
+# MIT License
+#
+# Copyright (c) 2018 WillQ
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import datetime
+import os
+from typing import List
+
+import pytest
+from monkq.config import Setting
+from monkq.exception import SettingError
+from monkq.stat import DAILY_STAT_TYPE
+from monkq.utils.timefunc import utc_datetime
+from monkq.walkforward import (
+    WalkForward, Window, chain_capital, rolling_windows,
+)
+
+from .test_sweep import sweep_custom_settings
+from .utils import over_written_settings
+
+DAY = datetime.timedelta(days=1)
+
+
+def test_rolling_windows() -> None:
+    start = utc_datetime(2018, 1, 1)
+    windows = rolling_windows(start, start + 10 * DAY, 3 * DAY, 3 * DAY)
+    assert windows == [
+        Window(start, start + 3 * DAY, start + 3 * DAY, start + 6 * DAY),
+        Window(start + 3 * DAY, start + 6 * DAY, start + 6 * DAY, start + 9 * DAY),
+        Window(start + 6 * DAY, start + 9 * DAY, start + 9 * DAY, start + 10 * DAY),
+    ]
+    windows = rolling_windows(start, start + 10 * DAY, 3 * DAY, 3 * DAY, 5 * DAY)
+    assert [window.test_start for window in windows] == [start + 3 * DAY, start + 8 * DAY]
+
+    assert rolling_windows(start, start + 10 * DAY, datetime.timedelta(0), 5 * DAY) == [
+        Window(start, start, start, start + 5 * DAY),
+        Window(start + 5 * DAY, start + 5 * DAY, start + 5 * DAY, start + 10 * DAY),
+    ]
+    assert rolling_windows(start, start + 10 * DAY, 10 * DAY, DAY) == []
+
+    with pytest.raises(SettingError):
+        rolling_windows(start, start + 10 * DAY, DAY, datetime.timedelta(0))
+
+
+def test_chain_capital() -> None:
+    start = utc_datetime(2018, 1, 1)
+    curves: List[List[DAILY_STAT_TYPE]] = [
+        [{'a': 100.0, 'timestamp': start}, {'a': 110.0, 'timestamp': start + DAY}],
+        [{'a': 100.0, 'timestamp': start + DAY}, {'a': 90.0, 'timestamp': start + 2 * DAY}],
+        [],
+        [{'a': 100.0, 'timestamp': start + 3 * DAY}, {'a': 200.0, 'timestamp': start + 4 * DAY}],
+    ]
+    assert chain_capital(curves) == [
+        {'a': 100.0, 'timestamp': start},
+        {'a': 110.0, 'timestamp': start + DAY},
+        {'a': pytest.approx(99.0), 'timestamp': start + 2 * DAY},
+        {'a': pytest.approx(99.0), 'timestamp': start + 3 * DAY},
+        {'a': pytest.approx(198.0), 'timestamp': start + 4 * DAY},
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_walk_forward(tem_data_dir: str, workers: int) -> None:
+    settings = Setting()
+    with over_written_settings(settings, **sweep_custom_settings(tem_data_dir)):
+        walk_forward = WalkForward(settings, 2 * DAY, DAY, params={'ORDER_SIZE': [100, 1000]},
+                                   metric='max_drawdown', minimize=True, workers=workers)
+        result = walk_forward.run()
+
+    assert list(result['test_start']) == [utc_datetime(2015, 6, 3), utc_datetime(2015, 6, 4)]
+    assert list(result['test_end']) == [utc_datetime(2015, 6, 4), utc_datetime(2015, 6, 5)]
+    assert set(result['ORDER_SIZE']) <= {100, 1000}
+    assert list(result['trades']) == [1, 1]
+    for index, report_file in enumerate(result['report_file']):
+        assert report_file == os.path.join(tem_data_dir, 'result_test_{}.pkl'.format(index))
+    assert os.path.exists(os.path.join(tem_data_dir, 'result_train_3.pkl'))
+
+    capital = walk_forward.daily_capital
+    assert capital[0]['timestamp'] == utc_datetime(2015, 6, 3)
+    assert capital[-1]['timestamp'] == utc_datetime(2015, 6, 5)
+    assert capital[0]['bitmex_account'] == 100000
+    assert capital[-1]['bitmex_account'] == pytest.approx(
+        result['end_capital'][0] * result['end_capital'][1] / 100000)
+
+
+def test_walk_forward_without_params(tem_data_dir: str) -> None:
+    settings = Setting()
+    with over_written_settings(settings, **sweep_custom_settings(tem_data_dir)):
+        with pytest.raises(SettingError):
+            WalkForward(settings, 4 * DAY, DAY)
+        walk_forward = WalkForward(settings, datetime.timedelta(0), 2 * DAY, workers=1)
+        result = walk_forward.run()
+
+    assert len(result) == 2
+    assert 'ORDER_SIZE' not in result
+    assert not os.path.exists(os.path.join(tem_data_dir, 'result_train_0.pkl'))
+    assert walk_forward.daily_capital[-1]['timestamp'] == utc_datetime(2015, 6, 5)
@@ -33,7 +33,9 @@ import pytest
 import pytz
 from monkq.utils.csv import CsvFileDefaultDict, CsvZipDefaultDict
 from monkq.utils.filefunc import assure_dir, make_writable
-from monkq.utils.timefunc import is_aware_datetime
+from monkq.utils.timefunc import (
+    datetime_to_ns, is_aware_datetime, ns_to_datetime, utc_datetime,
+)
 
 
 def test_assure_home() -> None:
@@ -97,6 +99,15 @@ def test_aware_datetime() -> None:
     assert is_aware_datetime(d2)
 
 
+def test_datetime_ns_convert() -> None:
+    d1 = utc_datetime(2018, 1, 1, 12, 30, 15, 123456)
+    assert datetime_to_ns(d1) == 1514809815123456000
+    assert ns_to_datetime(datetime_to_ns(d1)) == d1
+
+    d2 = datetime.datetime(2018, 1, 1, 20, 30, tzinfo=pytz.timezone('Asia/Shanghai'))
+    assert ns_to_datetime(datetime_to_ns(d2)) == d2
+
+
 def test_make_writeable() -> None:
     with tempfile.TemporaryDirectory() as tmp:
         filename = os.path.join(tmp, 'test')